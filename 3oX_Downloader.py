@@ -1,23 +1,29 @@
-import os, certifi
-os.environ["SSL_CERT_FILE"] = certifi.where()
-
-import yt_dlp
+import logging
+import os
 import sys
-import json
-from pathlib import Path
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, 
     QHBoxLayout, QLabel, QLineEdit, QPushButton, 
     QRadioButton, QButtonGroup, QFileDialog, QProgressBar,
     QMessageBox, QFrame, QGroupBox, QDialog, QSpinBox,
-    QComboBox, QCheckBox, QScrollArea
+    QComboBox, QCheckBox, QScrollArea, QListWidget, QListWidgetItem, QMenu
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize, QRect
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal, QSize, QRect
 from PyQt5.QtGui import (
     QFont, QIcon, QPixmap, QPainter, QPainterPath,
     QColor, QPen
 )
 
+from descargador import (
+    ColaDescargas, precargar_yt_dlp, precargar_ffmpeg, cargar_configuracion, guardar_configuracion, CONFIG_FILE, CARPETA_POR_DEFECTO,
+    ESTADO_EN_COLA, ESTADO_EXTRAYENDO, ESTADO_DESCARGANDO, ESTADO_POSTPROCESANDO,
+    ESTADO_COMPLETADO, ESTADO_FALLIDO, ESTADO_OMITIDO, ESTADO_CANCELADO, configurar_registro, ARCHIVO_LOG,
+    ClienteServicio, ColaRemota, iniciar_servicio
+)
+from descargador.config import DIRECTORIO_DATOS
+
+log = logging.getLogger('descargador.gui')
+
 def resource_path(relative_path):
     try:
         base_path = sys._MEIPASS
@@ -25,6 +31,20 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+ETIQUETAS_ESTADO = {
+    ESTADO_EN_COLA: "En cola",
+    ESTADO_EXTRAYENDO: "Extrayendo",
+    ESTADO_DESCARGANDO: "Descargando",
+    ESTADO_POSTPROCESANDO: "Procesando",
+    ESTADO_COMPLETADO: "Completado",
+    ESTADO_FALLIDO: "Fallido",
+    ESTADO_OMITIDO: "Omitido",
+    ESTADO_CANCELADO: "Cancelado",
+}
+
+# Solo se muestran las prioridades distintas de la normal
+ETIQUETAS_PRIORIDAD = {1: "Alta", -1: "Baja"}
+
 class DiagonalGroupBox(QGroupBox):
     def __init__(self, title="", parent=None):
         super().__init__(title, parent)
@@ -81,7 +101,7 @@ class ConfigDialog(QDialog):
         super().__init__(parent)
         self.parent_window = parent
         self.setWindowTitle("Configuracion")
-        self.setFixedSize(620, 990)
+        self.setFixedSize(620, 1160)
         self.init_ui()
         
     def init_ui(self):
@@ -114,6 +134,19 @@ class ConfigDialog(QDialog):
         self.hilos_spin.setFixedHeight(40)
         hilos_layout.addWidget(self.hilos_spin)
         
+        simultaneas_label = QLabel("Descargas simultaneas:")
+        simultaneas_label.setFont(QFont("Segoe UI", 10))
+        simultaneas_label.setStyleSheet("color: #cdd6f4;")
+        hilos_layout.addWidget(simultaneas_label)
+        
+        self.simultaneas_spin = QSpinBox()
+        self.simultaneas_spin.setMinimum(1)
+        self.simultaneas_spin.setMaximum(10)
+        self.simultaneas_spin.setValue(self.parent_window.config.get('descargas_simultaneas', 3))
+        self.simultaneas_spin.setFont(QFont("Segoe UI", 11))
+        self.simultaneas_spin.setFixedHeight(40)
+        hilos_layout.addWidget(self.simultaneas_spin)
+        
         hilos_group.setLayout(hilos_layout)
         layout.addWidget(hilos_group)
         
@@ -146,6 +179,36 @@ class ConfigDialog(QDialog):
         ffmpeg_input_layout.addWidget(ffmpeg_btn)
         
         ffmpeg_layout.addLayout(ffmpeg_input_layout)
+        
+        temporal_label = QLabel("Carpeta temporal rapida para descargas en curso (vacio = directo al destino):")
+        temporal_label.setFont(QFont("Segoe UI", 10))
+        temporal_label.setStyleSheet("color: #cdd6f4;")
+        ffmpeg_layout.addWidget(temporal_label)
+        
+        temporal_input_layout = QHBoxLayout()
+        temporal_input_layout.setSpacing(10)
+        
+        self.temporal_input = QLineEdit()
+        self.temporal_input.setText(self.parent_window.config.get('carpeta_temporal', ''))
+        self.temporal_input.setFont(QFont("Segoe UI", 10))
+        self.temporal_input.setFixedHeight(40)
+        self.temporal_input.setCursorPosition(0)
+        temporal_input_layout.addWidget(self.temporal_input)
+        
+        temporal_btn = QPushButton("Examinar")
+        temporal_btn.setFixedSize(120, 40)
+        temporal_btn.setFont(QFont("Segoe UI", 10, QFont.Bold))
+        temporal_btn.clicked.connect(self.seleccionar_temporal)
+        temporal_input_layout.addWidget(temporal_btn)
+        
+        ffmpeg_layout.addLayout(temporal_input_layout)
+        
+        self.audio_original_check = QCheckBox("Mantener el audio original cuando sea posible (m4a, opus, webm)")
+        self.audio_original_check.setFont(QFont("Segoe UI", 10))
+        self.audio_original_check.setStyleSheet("color: #cdd6f4;")
+        self.audio_original_check.setChecked(self.parent_window.config.get('audio_original', False))
+        ffmpeg_layout.addWidget(self.audio_original_check)
+        
         ffmpeg_group.setLayout(ffmpeg_layout)
         layout.addWidget(ffmpeg_group)
         
@@ -270,16 +333,31 @@ class ConfigDialog(QDialog):
         if carpeta:
             self.ffmpeg_input.setText(carpeta)
     
+    def seleccionar_temporal(self):
+        carpeta = QFileDialog.getExistingDirectory(
+            self, "Seleccionar carpeta temporal", self.temporal_input.text()
+        )
+        if carpeta:
+            self.temporal_input.setText(carpeta)
+    
     def guardar_config(self):
         self.parent_window.config['hilos'] = self.hilos_spin.value()
+        self.parent_window.config['descargas_simultaneas'] = self.simultaneas_spin.value()
+        ffmpeg_anterior = self.parent_window.config.get('ffmpeg_path', '')
         self.parent_window.config['ffmpeg_path'] = self.ffmpeg_input.text()
         self.parent_window.config['limite_enabled'] = self.limite_check.isChecked()
         self.parent_window.config['limite_mbps'] = self.limite_spin.value()
         self.parent_window.config['cookies_browser'] = self.cookies_combo.currentText()
         self.parent_window.config['tema'] = self.tema_combo.currentText()
+        self.parent_window.config['audio_original'] = self.audio_original_check.isChecked()
+        self.parent_window.config['carpeta_temporal'] = self.temporal_input.text().strip()
         
         self.parent_window.guardar_configuracion()
+        self.parent_window.audio_radio.setText(self.parent_window.texto_audio())
         self.parent_window.aplicar_tema()
+        self.parent_window.gestor.aplicar_configuracion()
+        if self.ffmpeg_input.text() != ffmpeg_anterior:
+            precargar_ffmpeg(self.ffmpeg_input.text(), forzar=True)
         
         QMessageBox.information(self, "Configuracion", 
                               "Configuracion guardada exitosamente")
@@ -393,298 +471,70 @@ class ConfigDialog(QDialog):
             }
         """)
 
-class DescargadorThread(QThread):
-    progreso = pyqtSignal(str)
-    completado = pyqtSignal(str)
-    error = pyqtSignal(str)
+class GestorDescargas(QObject):
+    """Conecta la cola de descargas con la interfaz mediante senales de Qt"""
+    trabajo_actualizado = pyqtSignal(int)
     
-    def __init__(self, url, carpeta, formato, calidad, config):
-        super().__init__()
-        self.url = url
-        self.carpeta = carpeta
-        self.formato = formato
-        self.calidad = calidad
-        self.config = config
-    
-    def get_opciones_base(self):
-        """Retorna opciones base mejoradas para evitar error 403"""
-        opciones = {
-            'outtmpl': f'{self.carpeta}/%(title)s.%(ext)s',
-            'quiet': False,
-            'no_warnings': False,
-            'concurrent_fragment_downloads': self.config.get('hilos', 16),
-            'nocheckcertificate': True,
-            'no_check_certificate': True,
-            'prefer_insecure': False,
-            'extractor_retries': 5,
-            'fragment_retries': 5,
-            'retries': 10,
-            'sleep_interval': 1,
-            'max_sleep_interval': 5,
-            'skip_unavailable_fragments': True,
-            'geo_bypass': True,
-            'geo_bypass_country': 'US',
-            'allow_unplayable_formats': False,
-            'extract_flat': False,
-            'cachedir': os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'),
-            'merge_output_format': 'mp4',
-        }
-        
-        ffmpeg_path = self.config.get('ffmpeg_path', '')
-        if ffmpeg_path:
-            ffmpeg_exe = os.path.join(ffmpeg_path, 'ffmpeg.exe')
-            if os.path.exists(ffmpeg_exe):
-                opciones['ffmpeg_location'] = ffmpeg_path
-                print(f"[INFO] FFmpeg encontrado en: {ffmpeg_path}")
-            else:
-                print(f"[WARNING] No se encontro ffmpeg.exe en: {ffmpeg_path}")
-                print(f"[INFO] Buscando ffmpeg en PATH del sistema...")
-                try:
-                    import subprocess
-                    result = subprocess.run(['ffmpeg', '-version'], capture_output=True, timeout=2)
-                    if result.returncode == 0:
-                        print(f"[INFO] FFmpeg encontrado en PATH del sistema")
-                except:
-                    print(f"[WARNING] FFmpeg no encontrado. Los videos pueden estar corruptos.")
-        else:
-            print(f"[INFO] Ruta de FFmpeg no configurada - intentando usar PATH del sistema")
-        
-        opciones['http_headers'] = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
-        
-        cookies_browser = self.config.get('cookies_browser', 'Ninguno')
-        cookies_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cookies.txt')
-        
-        if os.path.exists(cookies_file):
-            print(f"[INFO] Usando archivo de cookies: {cookies_file}")
-            opciones['cookiefile'] = cookies_file
-        elif cookies_browser != 'Ninguno':
-            try:
-                browser = cookies_browser.lower()
-                print(f"[INFO] Extrayendo cookies de {browser}...")
-                opciones['cookiesfrombrowser'] = (browser,)
-                print(f"[INFO] Cookies configuradas - yt-dlp usara clientes compatibles automaticamente")
-            except Exception as e:
-                print(f"[WARNING] No se pudieron configurar cookies: {e}")
+    def __init__(self, config, parent=None):
+        super().__init__(parent)
+        # La cola avisa desde sus hilos; la senal lleva el aviso al hilo de la interfaz
+        al_actualizar = lambda t: self.trabajo_actualizado.emit(t.id)
+        cliente = None
+        if config.get('usar_servicio', True):
+            cliente = ClienteServicio.conectar()
+            if cliente is None and config.get('iniciar_servicio', False):
+                cliente = iniciar_servicio()
+        # Con el servicio en marcha la ventana solo muestra y encola: las descargas siguen al cerrarla
+        self.remoto = cliente is not None
+        if self.remoto:
+            log.info("Usando el servicio de descargas en segundo plano")
+            self.cola = ColaRemota(cliente, al_actualizar=al_actualizar)
         else:
-            print(f"[INFO] Sin cookies - usando clientes por defecto")
-        
-        return opciones
+            self.cola = ColaDescargas(config, al_actualizar=al_actualizar)
     
-    def configurar_plataforma(self, opciones):
-        """Configura opciones especificas segun la plataforma"""
-        url_lower = self.url.lower()
-        
-        if 'youtube.com' in url_lower or 'youtu.be' in url_lower:
-            cookies_browser = self.config.get('cookies_browser', 'Ninguno')
-            cookies_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cookies.txt')
-            
-            if cookies_browser == 'Ninguno' and not os.path.exists(cookies_file):
-                print("[INFO] Sin cookies - usando clientes android/ios")
-                opciones['extractor_args'] = {
-                    'youtube': {
-                        'player_client': ['android_creator', 'ios', 'web'],
-                    }
-                }
-            else:
-                print("[INFO] Con cookies - dejando que yt-dlp elija los mejores clientes")
-            
-            opciones['http_headers']['Origin'] = 'https://www.youtube.com'
-            opciones['http_headers']['Referer'] = 'https://www.youtube.com/'
-            
-        elif 'tiktok.com' in url_lower:
-            opciones['http_headers']['Referer'] = 'https://www.tiktok.com/'
-            opciones['http_headers']['Origin'] = 'https://www.tiktok.com'
-            
-        elif 'twitter.com' in url_lower or 'x.com' in url_lower:
-            opciones['http_headers']['Referer'] = 'https://twitter.com/'
-            opciones['http_headers']['Origin'] = 'https://twitter.com'
-            
-        elif 'facebook.com' in url_lower or 'fb.watch' in url_lower:
-            opciones['http_headers']['Referer'] = 'https://www.facebook.com/'
-            opciones['http_headers']['Origin'] = 'https://www.facebook.com'
-            
-        elif 'pornhub.com' in url_lower:
-            opciones['http_headers']['Referer'] = 'https://www.pornhub.com/'
-            opciones['http_headers']['Origin'] = 'https://www.pornhub.com'
-            opciones['http_headers']['Age-Gate'] = '1'
-            opciones['age_limit'] = 18
-            if self.formato == "video":
-                opciones['format'] = 'best[ext=mp4]/best'
-        
-        return opciones
+    @property
+    def trabajos(self):
+        return self.cola.trabajos
     
-    def construir_formato_video(self):
-        """Construye la cadena de formato segun las opciones seleccionadas"""
-        
-        if 'pornhub.com' in self.url.lower():
-            return 'best[ext=mp4]/best'
-        
-        resolucion = self.calidad.get('resolucion', 'Mejor disponible')
-        fps = self.calidad.get('fps', 'Mejor disponible')
-        audio_codec = self.calidad.get('audio_codec', 'Mejor disponible')
-        audio_canales = self.calidad.get('audio_canales', 'Mejor disponible')
-        
-        video_filters = []
-        
-        if resolucion != "Mejor disponible":
-            height_map = {
-                "8K (4320p)": 4320,
-                "5K (2880p)": 2880,
-                "4K (2160p)": 2160,
-                "2K (1440p)": 1440,
-                "Full HD (1080p)": 1080,
-                "HD (720p)": 720,
-                "SD (480p)": 480,
-                "360p": 360,
-                "240p": 240,
-                "144p": 144
-            }
-            height = height_map.get(resolucion, 0)
-            if height > 0:
-                video_filters.append(f"height<={height}")
-        
-        if fps == "60 FPS":
-            video_filters.append("fps>=60")
-        elif fps == "30 FPS":
-            video_filters.append("fps<=30")
-        
-        audio_filters = []
-        
-        if audio_codec == "Opus (mejor calidad)":
-            audio_filters.append("acodec=opus")
-        elif audio_codec == "AAC (compatible)":
-            audio_filters.append("acodec=aac")
-        
-        if audio_canales == "5.1 Surround":
-            audio_filters.append("channels>=6")
-        elif audio_canales == "Stereo":
-            audio_filters.append("channels=2")
-        
-        if video_filters:
-            video_selector = f"bv*[{']['.join(video_filters)}]"
-        else:
-            video_selector = "bv*"
-        
-        if audio_filters:
-            audio_selector = f"ba*[{']['.join(audio_filters)}]"
-        else:
-            audio_selector = "ba*"
-        
-        formato = f"{video_selector}+{audio_selector}/{video_selector}+ba/bv*+{audio_selector}/bv*+ba/b"
-        
-        print(f"[DEBUG] Formato construido: {formato}")
-        print(f"[DEBUG] Resolucion: {resolucion}")
-        print(f"[DEBUG] FPS: {fps}")
-        print(f"[DEBUG] Codec: {audio_codec}")
-        print(f"[DEBUG] Canales: {audio_canales}")
-        
-        return formato
+    def agregar(self, url, carpeta, formato, calidad):
+        return self.cola.agregar(url, carpeta, formato, calidad)
     
-    def run(self):
-        try:
-            self.progreso.emit("Obteniendo informacion del video...")
-            
-            opciones = self.get_opciones_base()
-            
-            if self.config.get('limite_enabled', False):
-                limite_bytes = self.config.get('limite_mbps', 10) * 125000
-                opciones['ratelimit'] = limite_bytes
-            
-            def progress_hook(d):
-                if d['status'] == 'downloading':
-                    try:
-                        percent = d.get('_percent_str', '0%')
-                        speed = d.get('_speed_str', 'N/A')
-                        eta = d.get('_eta_str', 'N/A')
-                        self.progreso.emit(f"Descargando: {percent} | Velocidad: {speed} | Tiempo: {eta}")
-                    except:
-                        self.progreso.emit("Descargando...")
-                elif d['status'] == 'finished':
-                    self.progreso.emit("Procesando archivo...")
-            
-            opciones['progress_hooks'] = [progress_hook]
-            
-            if self.formato == "audio":
-                opciones['format'] = 'bestaudio/best'
-                opciones['postprocessors'] = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }]
-            else:
-                formato_str = self.construir_formato_video()
-                opciones['format'] = formato_str
-                
-                opciones['postprocessors'] = [{
-                    'key': 'FFmpegVideoConvertor',
-                    'preferedformat': 'mp4',
-                }, {
-                    'key': 'FFmpegFixupM4a',
-                }, {
-                    'key': 'FFmpegFixupM3u8',
-                }]
-            
-            opciones = self.configurar_plataforma(opciones)
-            
-            self.progreso.emit("Iniciando descarga...")
-            
-            print(f"[DEBUG] Formato final: {opciones.get('format')}")
-            print(f"[DEBUG] URL: {self.url}")
-            print(f"[DEBUG] Cookies: {opciones.get('cookiesfrombrowser', 'Archivo' if opciones.get('cookiefile') else 'No')}")
-            print(f"[DEBUG] Clientes: {opciones.get('extractor_args', {}).get('youtube', {}).get('player_client', 'Por defecto')}")
-            
-            with yt_dlp.YoutubeDL(opciones) as ydl:
-                info = ydl.extract_info(self.url, download=True)
-                titulo = info.get('title', 'Video')
-                self.completado.emit(titulo)
-            
-        except Exception as e:
-            error_msg = str(e)
-            print(f"[ERROR] {error_msg}")
-            
-            if '403' in error_msg or 'Forbidden' in error_msg:
-                error_msg = (
-                    "Error 403: Acceso denegado\n\n"
-                    "Soluciones:\n"
-                    "1. Actualiza yt-dlp: pip install --upgrade yt-dlp\n"
-                    "2. Configura cookies del navegador en Configuracion\n"
-                    "3. O exporta cookies.txt manualmente\n\n"
-                    f"Error tecnico: {error_msg[:150]}"
-                )
-            elif '429' in error_msg:
-                error_msg = "Demasiadas solicitudes\n\nEspera 5-10 minutos e intenta de nuevo"
-            elif 'Sign in' in error_msg.lower() or 'login' in error_msg.lower():
-                error_msg = "Video privado o requiere inicio de sesion\n\nNo se puede descargar"
-            elif 'unavailable' in error_msg.lower():
-                error_msg = "Video no disponible\n\nPuede haber sido eliminado o es privado"
-            elif 'format' in error_msg.lower():
-                error_msg = (
-                    "Formato no disponible\n\n"
-                    "Intenta:\n"
-                    "- Cambiar la calidad\n"
-                    "- Actualizar yt-dlp: pip install --upgrade yt-dlp\n"
-                    "- Verificar que el video sea publico\n\n"
-                    f"Error: {error_msg[:150]}"
-                )
-            else:
-                error_msg = f"Error: {error_msg[:250]}"
-            
-            self.error.emit(error_msg)
+    def procesar_cola(self):
+        self.cola.procesar_cola()
+    
+    def aplicar_configuracion(self):
+        self.cola.aplicar_configuracion()
+    
+    def cambiar_prioridad(self, id_trabajo, prioridad):
+        self.cola.cambiar_prioridad(id_trabajo, prioridad=prioridad)
+    
+    def cancelar(self, id_trabajo):
+        return self.cola.cancelar(id_trabajo)
+    
+    def reanudar(self):
+        return self.cola.reanudar()
+    
+    @property
+    def metricas(self):
+        return self.cola.metricas
+    
+    def num_activos(self):
+        return self.cola.num_activos()
+    
+    def limpiar_terminados(self):
+        return self.cola.limpiar_terminados()
+    
+    def cerrar(self):
+        self.cola.cerrar()
 
 class DescargadorVideos(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.config_file = Path.home() / ".3ox_downloader_config.json"
+        self.config_file = CONFIG_FILE
         self.cargar_configuracion()
-        self.descargando = False
+        self.gestor = GestorDescargas(self.config, self)
+        self.gestor.trabajo_actualizado.connect(self.actualizar_trabajo)
+        self.items_cola = {}
         self.init_ui()
         self.aplicar_tema()
 
@@ -705,30 +555,19 @@ class DescargadorVideos(QMainWindow):
             btn.setEnabled(True)
         
     def cargar_configuracion(self):
-        self.config = {
-            'hilos': 16,
-            'ffmpeg_path': '',
-            'limite_enabled': False,
-            'limite_mbps': 10,
-            'cookies_browser': 'Ninguno',
-            'tema': 'Azul'
-        }
-        
-        if self.config_file.exists():
-            try:
-                with open(self.config_file, 'r') as f:
-                    loaded_config = json.load(f)
-                    self.config.update(loaded_config)
-            except:
-                pass
+        self.config = cargar_configuracion(self.config_file)
     
     def guardar_configuracion(self):
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=4)
+            guardar_configuracion(self.config, self.config_file)
         except Exception as e:
             QMessageBox.warning(self, "Error", f"No se pudo guardar la configuracion: {e}")
     
+    def texto_audio(self):
+        if self.config.get('audio_original', False):
+            return "Solo audio (original o MP3)"
+        return "Solo audio (MP3)"
+    
     def get_tema_colores(self):
         temas = {
             'Azul': ('#89b4fa', '#74c7ec', '#5ea3d4'),
@@ -978,7 +817,7 @@ class DescargadorVideos(QMainWindow):
         
     def init_ui(self):
         self.setWindowTitle("3oX Downloader")
-        self.setFixedSize(850, 950)
+        self.setFixedSize(850, 1080)
 
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -1018,7 +857,7 @@ class DescargadorVideos(QMainWindow):
         main_layout.addWidget(url_group)
         
         opciones_group = DiagonalGroupBox("Opciones de Descarga")
-        opciones_group.setFixedHeight(290)
+        opciones_group.setFixedHeight(260)
         opciones_container = QVBoxLayout()
         opciones_container.setContentsMargins(0, 0, 0, 0)
         
@@ -1067,7 +906,7 @@ class DescargadorVideos(QMainWindow):
         self.tipo_group.addButton(self.video_radio)
         tipo_layout.addWidget(self.video_radio)
         
-        self.audio_radio = QRadioButton("Solo audio (MP3)")
+        self.audio_radio = QRadioButton(self.texto_audio())
         self.audio_radio.setFont(QFont("Segoe UI", 10))
         self.audio_radio.toggled.connect(self.toggle_opciones_video)
         self.tipo_group.addButton(self.audio_radio)
@@ -1177,7 +1016,7 @@ class DescargadorVideos(QMainWindow):
         carpeta_layout.setContentsMargins(15, 15, 15, 15)
         
         self.carpeta_input = QLineEdit()
-        self.carpeta_input.setText(str(Path.home() / "Downloads" / "Videos"))
+        self.carpeta_input.setText(CARPETA_POR_DEFECTO)
         self.carpeta_input.setFont(QFont("Segoe UI", 11))
         carpeta_layout.addWidget(self.carpeta_input)
         
@@ -1190,6 +1029,34 @@ class DescargadorVideos(QMainWindow):
         carpeta_group.setLayout(carpeta_layout)
         main_layout.addWidget(carpeta_group)
         
+        cola_group = DiagonalGroupBox("Cola de Descargas")
+        cola_layout = QVBoxLayout()
+        cola_layout.setContentsMargins(15, 15, 15, 15)
+        cola_layout.setSpacing(8)
+        
+        self.cola_list = QListWidget()
+        self.cola_list.setFont(QFont("Segoe UI", 9))
+        self.cola_list.setFixedHeight(90)
+        self.cola_list.itemDoubleClicked.connect(self.mostrar_detalle_trabajo)
+        self.cola_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.cola_list.customContextMenuRequested.connect(self.menu_trabajo)
+        cola_layout.addWidget(self.cola_list)
+        
+        botones_cola = QHBoxLayout()
+        limpiar_btn = QPushButton("Limpiar terminadas")
+        limpiar_btn.setObjectName("small_btn")
+        limpiar_btn.clicked.connect(self.limpiar_cola)
+        botones_cola.addWidget(limpiar_btn)
+        
+        metricas_btn = QPushButton("Metricas")
+        metricas_btn.setObjectName("small_btn")
+        metricas_btn.clicked.connect(self.mostrar_metricas)
+        botones_cola.addWidget(metricas_btn)
+        cola_layout.addLayout(botones_cola)
+        
+        cola_group.setLayout(cola_layout)
+        main_layout.addWidget(cola_group)
+        
         config_btn = QPushButton("Configuracion")
         config_btn.setObjectName("small_btn")
         config_btn.setFont(QFont("Segoe UI", 12, QFont.Bold))
@@ -1222,6 +1089,10 @@ class DescargadorVideos(QMainWindow):
         footer.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(footer)
     
+    def closeEvent(self, event):
+        self.gestor.cerrar()
+        super().closeEvent(event)
+    
     def get_selected_radio_text(self, button_group):
         """Obtiene el texto del RadioButton seleccionado"""
         checked_button = button_group.checkedButton()
@@ -1241,13 +1112,8 @@ class DescargadorVideos(QMainWindow):
             self.carpeta_input.setText(carpeta)
     
     def iniciar_descarga(self):
-        if self.descargando:
-            QMessageBox.warning(self, "Descarga en progreso", 
-                              "Ya hay una descarga en curso. Por favor espera.")
-            return
-        
-        url = self.url_input.text().strip()
-        if not url:
+        urls = self.url_input.text().split()
+        if not urls:
             QMessageBox.critical(self, "Error", "Por favor ingresa una URL valida.")
             return
         
@@ -1264,52 +1130,142 @@ class DescargadorVideos(QMainWindow):
             'audio_canales': self.get_selected_radio_text(self.audio_canales_group)
         }
         
-        self.descargando = True
-        self.descargar_btn.setEnabled(False)
-        self.progress_bar.setMaximum(0)
-        self.progress_bar.setValue(0)
+        for url in urls:
+            self.gestor.agregar(url, carpeta, formato, opciones_calidad)
         
-        self.thread = DescargadorThread(url, carpeta, formato, opciones_calidad, self.config)
-        self.thread.progreso.connect(self.actualizar_progreso)
-        self.thread.completado.connect(self.descarga_completada)
-        self.thread.error.connect(self.descarga_fallida)
-        self.thread.start()
+        self.url_input.clear()
+        self.status_label.setText(f"{len(urls)} descarga(s) agregada(s) a la cola")
     
-    def actualizar_progreso(self, mensaje):
-        self.status_label.setText(mensaje)
+    def actualizar_trabajo(self, id_trabajo):
+        trabajo = self.gestor.trabajos.get(id_trabajo)
+        if trabajo is None:
+            return
+        
+        item = self.items_cola.get(id_trabajo)
+        if item is None:
+            item = QListWidgetItem()
+            item.setData(Qt.UserRole, id_trabajo)
+            self.cola_list.addItem(item)
+            self.items_cola[id_trabajo] = item
+        
+        nombre = trabajo.titulo or trabajo.url
+        texto = f"[{ETIQUETAS_ESTADO[trabajo.estado]}] {nombre}"
+        if trabajo.padre is not None:
+            texto = "    " + texto
+        if trabajo.prioridad in ETIQUETAS_PRIORIDAD and not trabajo.terminado():
+            texto += f" (prioridad {ETIQUETAS_PRIORIDAD[trabajo.prioridad].lower()})"
+        if trabajo.mensaje and not trabajo.terminado():
+            texto += f"  -  {trabajo.mensaje}"
+        item.setText(texto)
+        item.setToolTip(trabajo.error or trabajo.url)
+        
+        if trabajo.estado == ESTADO_COMPLETADO:
+            item.setForeground(QColor("#a6e3a1"))
+            self.status_label.setText(f"Completado: {nombre}")
+        elif trabajo.estado == ESTADO_FALLIDO:
+            item.setForeground(QColor("#f38ba8"))
+            self.status_label.setText(f"Error en la descarga: {trabajo.mensaje}")
+        elif trabajo.estado == ESTADO_OMITIDO:
+            item.setForeground(QColor("#6c7086"))
+            self.status_label.setText(f"Omitido: {trabajo.mensaje}")
+        elif trabajo.estado == ESTADO_CANCELADO:
+            item.setForeground(QColor("#6c7086"))
+            self.status_label.setText(f"Cancelado: {nombre}")
+        
+        self.actualizar_barra()
     
-    def descarga_completada(self, titulo):
-        self.progress_bar.setMaximum(100)
-        self.progress_bar.setValue(100)
-        self.descargando = False
-        self.descargar_btn.setEnabled(True)
-        self.status_label.setText("Descarga completada exitosamente")
-        
-        QMessageBox.information(
-            self, "Descarga completada",
-            f"Video descargado exitosamente!\n\n{titulo}\n\nUbicacion: {self.carpeta_input.text()}"
-        )
+    def actualizar_barra(self):
+        """Porcentaje conjunto de las descargas en curso que informan su tamano"""
+        if self.gestor.num_activos() == 0:
+            self.progress_bar.setMaximum(100)
+            self.progress_bar.setValue(0)
+            return
         
-        self.url_input.clear()
-        self.progress_bar.setValue(0)
-        self.status_label.setText("")
+        descargado = total = 0
+        for trabajo in list(self.gestor.trabajos.values()):
+            if trabajo.terminado() or not trabajo.progreso or not trabajo.progreso.get('total'):
+                continue
+            descargado += trabajo.progreso['descargado']
+            total += trabajo.progreso['total']
+        
+        if total:
+            self.progress_bar.setMaximum(100)
+            self.progress_bar.setValue(int(descargado * 100 / total))
+        else:
+            self.progress_bar.setMaximum(0)
     
-    def descarga_fallida(self, error):
-        self.progress_bar.setMaximum(100)
-        self.progress_bar.setValue(0)
-        self.descargando = False
-        self.descargar_btn.setEnabled(True)
-        self.status_label.setText("Error en la descarga")
+    def mostrar_detalle_trabajo(self, item):
+        trabajo = self.gestor.trabajos.get(item.data(Qt.UserRole))
+        if trabajo is None:
+            return
         
-        QMessageBox.critical(
-            self, "Error",
-            f"No se pudo descargar el video.\n\n{error}"
-        )
+        if trabajo.estado == ESTADO_FALLIDO:
+            QMessageBox.critical(
+                self, "Error",
+                f"No se pudo descargar el video.\n\n{trabajo.error}"
+            )
+        elif trabajo.estado == ESTADO_COMPLETADO:
+            QMessageBox.information(
+                self, "Descarga completada",
+                f"Video descargado exitosamente!\n\n{trabajo.titulo}\n\nUbicacion: {trabajo.carpeta}"
+            )
+    
+    def menu_trabajo(self, posicion):
+        item = self.cola_list.itemAt(posicion)
+        trabajo = self.gestor.trabajos.get(item.data(Qt.UserRole)) if item else None
+        if trabajo is None or trabajo.terminado():
+            return
+        
+        menu = QMenu(self)
+        for prioridad, etiqueta in ((1, "Alta"), (0, "Normal"), (-1, "Baja")):
+            accion = menu.addAction(f"Prioridad {etiqueta.lower()}")
+            accion.setCheckable(True)
+            accion.setChecked(trabajo.prioridad == prioridad)
+            accion.triggered.connect(lambda _, p=prioridad: self.gestor.cambiar_prioridad(trabajo.id, p))
+        menu.addSeparator()
+        cancelar = menu.addAction("Cancelar")
+        cancelar.triggered.connect(lambda: self.gestor.cancelar(trabajo.id))
+        menu.exec_(self.cola_list.mapToGlobal(posicion))
+    
+    def reanudar_trabajos(self):
+        """Retoma las descargas que quedaron a medias al cerrar la aplicacion"""
+        reanudados = self.gestor.reanudar()
+        if reanudados:
+            self.status_label.setText(f"{len(reanudados)} descarga(s) pendiente(s) reanudada(s)")
+    
+    def mostrar_metricas(self):
+        metricas = self.gestor.metricas
+        texto = metricas.resumen()
+        try:
+            DIRECTORIO_DATOS.mkdir(parents=True, exist_ok=True)
+            metricas.exportar(DIRECTORIO_DATOS / "metricas.json")
+            metricas.exportar(DIRECTORIO_DATOS / "metricas.prom")
+            texto += f"\n\nExportadas a {DIRECTORIO_DATOS / 'metricas.json'} y metricas.prom"
+        except OSError as e:
+            log.warning("No se pudieron exportar las metricas: %s", e)
+        QMessageBox.information(self, "Metricas", texto)
+    
+    def limpiar_cola(self):
+        for id_trabajo in self.gestor.limpiar_terminados():
+            item = self.items_cola.pop(id_trabajo, None)
+            if item is not None:
+                self.cola_list.takeItem(self.cola_list.row(item))
 
 def main():
+    if '--servicio' in sys.argv[1:]:
+        # El ejecutable empaquetado arranca asi el servicio (ver iniciar_servicio)
+        from descargador.cli import main as main_cli
+        sys.exit(main_cli(sys.argv[1:]))
+    config = cargar_configuracion()
+    configurar_registro(config.get('nivel_log', 'INFO'), archivo=ARCHIVO_LOG if config.get('log_archivo', True) else None)
     app = QApplication(sys.argv)
     ventana = DescargadorVideos()
     ventana.show()
+    # yt_dlp y la deteccion de FFmpeg se hacen cuando la ventana ya esta en pantalla; con el servicio no hacen falta
+    if not ventana.gestor.remoto:
+        QTimer.singleShot(0, precargar_yt_dlp)
+        QTimer.singleShot(0, lambda: precargar_ffmpeg(ventana.config.get('ffmpeg_path', '')))
+    QTimer.singleShot(0, ventana.reanudar_trabajos)
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
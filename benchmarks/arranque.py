@@ -0,0 +1,131 @@
+"""Benchmark de arranque de 3oX Downloader
+
+Mide, en procesos nuevos (arranque en frio):
+  - importacion: tiempo de importar el script de la GUI (PyQt5 + descargador)
+  - primer_pintado: desde que se lanza el proceso hasta que la ventana se pinta
+  - yt_dlp: lo que tarda la carga en segundo plano de yt_dlp
+  - cli: tiempo de importar el modo linea de comandos
+
+Uso:
+    python benchmarks/arranque.py -n 5 --offscreen --presupuesto-ms 1500
+
+Con --presupuesto-ms el proceso termina con codigo 1 si la mediana del
+primer pintado supera el presupuesto, para detectar regresiones.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DIRECTORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_GUI = os.path.join(DIRECTORIO_APP, '3oX_Downloader.py')
+
+def medir_gui():
+    """Se ejecuta en el proceso hijo: importa la GUI, muestra la ventana y espera el primer pintado"""
+    sys.path.insert(0, DIRECTORIO_APP)
+    inicio = time.perf_counter()
+    spec = importlib.util.spec_from_file_location('tresox_gui', SCRIPT_GUI)
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    importacion = time.perf_counter() - inicio
+    
+    from PyQt5.QtCore import QObject, QEvent, QTimer
+    
+    app = gui.QApplication(sys.argv[:1])
+    ventana = gui.DescargadorVideos()
+    resultado = {'importacion': importacion}
+    
+    class FiltroPintado(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and 'primer_pintado' not in resultado:
+                resultado['primer_pintado'] = time.time()
+                QTimer.singleShot(0, app.quit)
+            return False
+    
+    filtro = FiltroPintado()
+    ventana.installEventFilter(filtro)
+    ventana.show()
+    QTimer.singleShot(30000, app.quit)
+    app.exec_()
+    
+    from descargador import nucleo
+    inicio = time.perf_counter()
+    nucleo.precargar_yt_dlp().join()
+    resultado['yt_dlp'] = time.perf_counter() - inicio
+    print(json.dumps(resultado))
+
+def medir_cli():
+    sys.path.insert(0, DIRECTORIO_APP)
+    inicio = time.perf_counter()
+    import descargador.cli
+    print(json.dumps({'cli': time.perf_counter() - inicio,
+                      'pyqt5_importado': 'PyQt5' in sys.modules}))
+
+def lanzar(modo, env):
+    lanzado = time.time()
+    salida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--hijo', modo],
+        capture_output=True, text=True, env=env, timeout=120
+    )
+    if salida.returncode != 0:
+        raise RuntimeError(f"La medicion '{modo}' fallo:\n{salida.stderr}")
+    datos = json.loads(salida.stdout.strip().splitlines()[-1])
+    if 'primer_pintado' in datos:
+        datos['primer_pintado'] = datos['primer_pintado'] - lanzado
+    return datos
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de 3oX Downloader")
+    parser.add_argument('-n', '--repeticiones', type=int, default=5)
+    parser.add_argument('--offscreen', action='store_true',
+                        help="Usar la plataforma 'offscreen' de Qt (equipos sin pantalla)")
+    parser.add_argument('--presupuesto-ms', type=float,
+                        help="Maximo aceptable para la mediana del primer pintado")
+    parser.add_argument('--sin-gui', action='store_true', help="Medir solo el modo linea de comandos")
+    parser.add_argument('--hijo', choices=['gui', 'cli'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.hijo == 'gui':
+        return medir_gui()
+    if args.hijo == 'cli':
+        return medir_cli()
+    
+    env = dict(os.environ)
+    if args.offscreen:
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+    
+    muestras = {}
+    for _ in range(args.repeticiones):
+        modos = ['cli'] if args.sin_gui else ['cli', 'gui']
+        for modo in modos:
+            for clave, valor in lanzar(modo, env).items():
+                if isinstance(valor, bool):
+                    if valor:
+                        raise RuntimeError("El modo linea de comandos importo PyQt5")
+                    continue
+                muestras.setdefault(clave, []).append(valor * 1000)
+    
+    resumen = {
+        clave: {
+            'mediana_ms': round(statistics.median(valores), 1),
+            'min_ms': round(min(valores), 1),
+            'max_ms': round(max(valores), 1),
+        }
+        for clave, valores in muestras.items()
+    }
+    print(json.dumps(resumen, indent=4))
+    
+    if args.presupuesto_ms and 'primer_pintado' in resumen:
+        mediana = resumen['primer_pintado']['mediana_ms']
+        if mediana > args.presupuesto_ms:
+            print(f"[ERROR] Primer pintado {mediana} ms supera el presupuesto de {args.presupuesto_ms} ms",
+                  file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
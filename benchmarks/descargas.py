@@ -0,0 +1,212 @@
+"""Benchmark de descargas sin red
+
+Levanta servidor_medios en 127.0.0.1 y descarga sus medios con el mismo
+Descargador que usan la GUI y la linea de comandos (construccion de opciones,
+hooks, postprocesado) y el yt-dlp instalado. Por cada ejecucion reporta:
+  - MiB/s de la transferencia y tiempo de extraccion
+  - latencia de los fragmentos en el servidor (mediana y p95)
+  - tiempo de merge (video + audio) y del resto del postprocesado
+  - decision de contenedor (remux o recodificacion) y tiempo total
+
+Uso:
+    python benchmarks/descargas.py --escenarios hls,dash --hilos 1,4,16 -n 3
+    python benchmarks/descargas.py --escenarios progresivo --limite-mbps 0,50
+    python benchmarks/descargas.py --escenarios remux,recodificar --json resultados.json
+
+Sin FFmpeg los medios son bytes aleatorios y solo se ejecutan los escenarios
+que no necesitan merge ni postprocesado.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+DIRECTORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_APP)
+
+from servidor_medios import ServidorMedios, generar_medios, ARCHIVOS_MEDIOS
+from descargador.afinador import AfinadorFragmentos
+from descargador.bitacora import configurar_registro
+from descargador.config import CONFIG_POR_DEFECTO
+from descargador.ffmpeg import buscar_ffmpeg
+from descargador.hosts import LimitadorHosts
+from descargador.metricas import Metricas, percentil
+from descargador.nucleo import Descargador, categoria_error
+from descargador.plataformas import RegistroPlataformas
+
+# modos del servidor, medio, formato ('video'/'audio') y si necesita medios reales
+ESCENARIOS = {
+    'progresivo': {'modos': 'normal', 'medio': 'progresivo', 'formato': 'video', 'ffmpeg': False},
+    'hls': {'modos': 'normal', 'medio': 'hls', 'formato': 'video', 'ffmpeg': False},
+    'dash': {'modos': 'normal', 'medio': 'dash', 'formato': 'video', 'ffmpeg': False},
+    # El servidor frena cada conexion: aqui se nota repartir el mp4 en rangos
+    'progresivo_lento': {'modos': 'lento=1024', 'medio': 'progresivo', 'formato': 'video', 'ffmpeg': False,
+                         'config': {'conexiones_por_archivo': 1}},
+    'progresivo_rangos': {'modos': 'lento=1024', 'medio': 'progresivo', 'formato': 'video', 'ffmpeg': False,
+                          'config': {'conexiones_por_archivo': 8}},
+    'hls_lento': {'modos': 'lento=1024', 'medio': 'hls', 'formato': 'video', 'ffmpeg': False},
+    'hls_429': {'modos': '429=1', 'medio': 'hls', 'formato': 'video', 'ffmpeg': False},
+    'hls_cortes': {'modos': 'corte=1', 'medio': 'hls', 'formato': 'video', 'ffmpeg': False},
+    'dash_cortes': {'modos': 'corte=1', 'medio': 'dash', 'formato': 'video', 'ffmpeg': False},
+    # HLS (.ts) termina en remux a mp4; el mkv con mpeg2 + mp2 obliga a recodificar
+    'remux': {'modos': 'normal', 'medio': 'hls', 'formato': 'video', 'ffmpeg': True},
+    'recodificar': {'modos': 'normal', 'medio': 'recodificar', 'formato': 'video', 'ffmpeg': True},
+    'audio_mp3': {'modos': 'normal', 'medio': 'progresivo', 'formato': 'audio', 'ffmpeg': True},
+    # El AAC del mp4 se copia a m4a en lugar de recodificarse
+    'audio_original': {'modos': 'normal', 'medio': 'progresivo', 'formato': 'audio', 'ffmpeg': True,
+                       'config': {'audio_original': True}},
+}
+
+def lista_enteros(texto):
+    return [int(valor) for valor in texto.split(',') if valor.strip()]
+
+def ejecutar(servidor, nombre, escenario, config, afinador, directorio_estado):
+    """Una descarga completa; retorna un diccionario con las medidas"""
+    url = servidor.url(escenario['modos'], ARCHIVOS_MEDIOS[escenario['medio']])
+    carpeta = tempfile.mkdtemp(prefix='descarga_', dir=directorio_estado)
+    metricas = Metricas()
+    descargador = Descargador(
+        url, carpeta, escenario['formato'], {}, config,
+        # Limitador propio por ejecucion: reemplaza las esperas fijas y reacciona a los 429 como en la app
+        limitador_hosts=LimitadorHosts(tasa_maxima=1000, archivo=Path(carpeta) / '.hosts.json'),
+        plataformas=RegistroPlataformas(archivo=None),
+        afinador=afinador,
+        metricas=metricas,
+    )
+    servidor.reiniciar()
+    error = None
+    inicio = time.perf_counter()
+    try:
+        descargador.descargar()
+    except Exception as e:
+        error = f"{categoria_error(str(e))}: {str(e).splitlines()[0]}"
+    total = time.perf_counter() - inicio
+    peticiones = servidor.reiniciar()
+    shutil.rmtree(carpeta, ignore_errors=True)
+    
+    fases = metricas.instantanea()['fases']
+    transferencia = fases.get('transferencia', {})
+    latencias = [p['segundos'] * 1000 for p in peticiones if p['fragmento'] and p['resultado'] == 200]
+    postproceso = sum(valores['segundos'] for fase, valores in fases.items()
+                      if fase.startswith('postproceso:') and fase != 'postproceso:Merger')
+    return {
+        'escenario': nombre,
+        'hilos': config['hilos'],
+        'limite_mbps': config['limite_mbps'] if config['limite_enabled'] else 0,
+        'error': error,
+        'total_s': round(total, 3),
+        'extraccion_s': fases.get('extraccion', {}).get('segundos'),
+        'transferencia_s': transferencia.get('segundos'),
+        'bytes': transferencia.get('bytes', 0),
+        'mib_s': round(transferencia['bytes'] / transferencia['segundos'] / 1048576, 2)
+                 if transferencia.get('bytes') and transferencia.get('segundos') else None,
+        'fragmentos': len(latencias),
+        'fragmento_p50_ms': percentil(latencias, 0.5),
+        'fragmento_p95_ms': percentil(latencias, 0.95),
+        'respuestas_429': sum(1 for p in peticiones if p['resultado'] == 429),
+        'cortes': sum(1 for p in peticiones if p['resultado'] == 'corte'),
+        'merge_s': fases.get('postproceso:Merger', {}).get('segundos'),
+        'postproceso_s': round(postproceso, 3),
+        'contenedor': (descargador.decision_contenedor or {}).get('accion'),
+    }
+
+def resumir(filas):
+    """Mediana de cada medida por combinacion de escenario, hilos y limite"""
+    grupos = {}
+    for fila in filas:
+        grupos.setdefault((fila['escenario'], fila['hilos'], fila['limite_mbps']), []).append(fila)
+    resumen = []
+    for (escenario, hilos, limite), grupo in grupos.items():
+        correctas = [fila for fila in grupo if fila['error'] is None]
+        
+        def mediana(clave):
+            valores = [fila[clave] for fila in correctas if fila[clave] is not None]
+            return round(statistics.median(valores), 3) if valores else None
+        
+        resumen.append({
+            'escenario': escenario, 'hilos': hilos, 'limite_mbps': limite,
+            'ok': f"{len(correctas)}/{len(grupo)}",
+            'mib_s': mediana('mib_s'),
+            'frag_p50_ms': mediana('fragmento_p50_ms'),
+            'frag_p95_ms': mediana('fragmento_p95_ms'),
+            'merge_s': mediana('merge_s'),
+            'postproc_s': mediana('postproceso_s'),
+            'total_s': mediana('total_s'),
+            'contenedor': next((fila['contenedor'] for fila in correctas if fila['contenedor']), None),
+        })
+    return resumen
+
+def imprimir_tabla(resumen):
+    columnas = ['escenario', 'hilos', 'limite_mbps', 'ok', 'mib_s', 'frag_p50_ms', 'frag_p95_ms',
+                'merge_s', 'postproc_s', 'total_s', 'contenedor']
+    texto = [[str(fila[c]) if fila[c] is not None else '-' for c in columnas] for fila in resumen]
+    anchos = [max([len(c)] + [len(t[i]) for t in texto]) for i, c in enumerate(columnas)]
+    print("  ".join(c.ljust(a) for c, a in zip(columnas, anchos)))
+    for t in texto:
+        print("  ".join(v.ljust(a) for v, a in zip(t, anchos)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de descargas contra un servidor local")
+    parser.add_argument('--escenarios', default='progresivo,hls,dash',
+                        help=f"Separados por comas: {', '.join(ESCENARIOS)}")
+    parser.add_argument('-n', '--repeticiones', type=int, default=3)
+    parser.add_argument('--hilos', type=lista_enteros, default=[CONFIG_POR_DEFECTO['hilos']],
+                        help="Fragmentos simultaneos a comparar, p. ej. 1,4,16")
+    parser.add_argument('--limite-mbps', type=lista_enteros, default=[0],
+                        help="Limites de velocidad a comparar (0 = sin limite)")
+    parser.add_argument('--autoajuste', action='store_true',
+                        help="Usar el ajuste automatico de fragmentos en lugar de --hilos fijo")
+    parser.add_argument('--duracion', type=int, default=30, help="Segundos de cada medio sintetico")
+    parser.add_argument('--medios', help="Carpeta de medios (se generan una vez y se reutilizan)")
+    parser.add_argument('--ffmpeg', default='', help="Carpeta o binario de FFmpeg")
+    parser.add_argument('--json', help="Guardar todas las ejecuciones en este archivo")
+    parser.add_argument('--detalle', action='store_true', help="Mostrar la salida de yt-dlp y los mensajes de depuracion")
+    args = parser.parse_args()
+    
+    desconocidos = [e for e in args.escenarios.split(',') if e not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+    
+    # Sin archivo de registro: el benchmark no debe tocar los datos del usuario
+    configurar_registro('DEBUG' if args.detalle else 'WARNING', archivo=None)
+    directorio_estado = tempfile.mkdtemp(prefix='3ox_bench_')
+    ffmpeg = buscar_ffmpeg(args.ffmpeg)
+    medios = args.medios or os.path.join(tempfile.gettempdir(), '3ox_bench_medios')
+    reales = generar_medios(medios, args.duracion, ffmpeg)
+    servidor = ServidorMedios(medios).iniciar()
+    afinador = AfinadorFragmentos(archivo=Path(directorio_estado) / 'fragmentos.json') if args.autoajuste else None
+    
+    filas = []
+    try:
+        for nombre in args.escenarios.split(','):
+            escenario = ESCENARIOS[nombre]
+            if escenario['ffmpeg'] and not reales:
+                print(f"[WARNING] '{nombre}' necesita FFmpeg y medios reales; se omite", file=sys.stderr)
+                continue
+            for hilos in args.hilos:
+                for limite in args.limite_mbps:
+                    config = dict(CONFIG_POR_DEFECTO, hilos=hilos, ffmpeg_path=args.ffmpeg,
+                                  limite_enabled=limite > 0, limite_mbps=limite or CONFIG_POR_DEFECTO['limite_mbps'],
+                                  autoajuste_hilos=args.autoajuste, **escenario.get('config', {}))
+                    for repeticion in range(args.repeticiones):
+                        fila = ejecutar(servidor, nombre, escenario, config, afinador, directorio_estado)
+                        print(f"[INFO] {nombre} hilos={hilos} limite={limite} #{repeticion + 1}: "
+                              f"{fila['error'] or str(fila['mib_s'] or '-') + ' MiB/s'}", file=sys.stderr)
+                        filas.append(fila)
+    finally:
+        servidor.shutdown()
+        shutil.rmtree(directorio_estado, ignore_errors=True)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'medios_reales': reales, 'ejecuciones': filas, 'resumen': resumir(filas)}, f, indent=4)
+    imprimir_tabla(resumir(filas))
+    return 1 if any(fila['error'] for fila in filas) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
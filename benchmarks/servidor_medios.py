@@ -0,0 +1,305 @@
+"""Servidor HTTP local con medios sinteticos para los benchmarks de descarga
+
+Sirve un video progresivo, una lista HLS y un manifiesto DASH generados en una
+carpeta local, sin tocar la red. Con FFmpeg los medios son reales (testsrc2 y
+un tono de 440 Hz) y permiten medir merge y postprocesado; sin FFmpeg son bytes
+aleatorios con manifiestos validos, suficientes para medir la transferencia.
+
+Las rutas llevan delante los modos de fallo, separados por comas:
+  /normal/progresivo.mp4
+  /lento=512/hls/video.m3u8      512 KiB/s por conexion
+  /429=2/hls/video.m3u8          los dos primeros intentos de cada fragmento responden 429
+  /corte=1/dash/manifest.mpd     el primer intento de cada fragmento se corta a la mitad
+  /lento=1024,corte=1/hls/video.m3u8
+
+'429' y 'corte' solo afectan a los fragmentos (.ts, .m4s), que es donde yt-dlp
+reintenta; 'lento' afecta a todo lo que se sirve.
+
+Uso independiente:
+    python benchmarks/servidor_medios.py --directorio /tmp/medios --puerto 8000
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TIPOS = {
+    '.mp4': 'video/mp4',
+    '.mkv': 'video/x-matroska',
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.mpd': 'application/dash+xml',
+    '.ts': 'video/mp2t',
+    '.m4s': 'video/iso.segment',
+}
+EXTENSIONES_FRAGMENTO = ('.ts', '.m4s')
+DURACION_SEGMENTO = 2
+TAMANO_BLOQUE = 64 * 1024
+
+ARCHIVOS_MEDIOS = {
+    'progresivo': 'progresivo.mp4',
+    'recodificar': 'recodificar.mkv',
+    'hls': 'hls/video.m3u8',
+    'dash': 'dash/manifest.mpd',
+}
+
+def generar_con_ffmpeg(ffmpeg, directorio, duracion):
+    """Medios reales: mp4 (mpeg4 + aac), mkv que no cabe en mp4 (mpeg2 + mp2), HLS y DASH con audio aparte"""
+    def correr(*args):
+        subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', *args], check=True)
+    
+    origen = [
+        '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={duracion}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duracion}',
+    ]
+    progresivo = os.path.join(directorio, ARCHIVOS_MEDIOS['progresivo'])
+    correr(*origen, '-c:v', 'mpeg4', '-b:v', '4M', '-g', str(30 * DURACION_SEGMENTO),
+           '-c:a', 'aac', '-b:a', '128k', progresivo)
+    correr(*origen, '-c:v', 'mpeg2video', '-b:v', '4M', '-c:a', 'mp2',
+           os.path.join(directorio, ARCHIVOS_MEDIOS['recodificar']))
+    
+    os.makedirs(os.path.join(directorio, 'hls'), exist_ok=True)
+    correr('-i', progresivo, '-c', 'copy', '-f', 'hls', '-hls_time', str(DURACION_SEGMENTO),
+           '-hls_playlist_type', 'vod', '-hls_segment_filename', os.path.join(directorio, 'hls', 'seg%03d.ts'),
+           os.path.join(directorio, ARCHIVOS_MEDIOS['hls']))
+    
+    os.makedirs(os.path.join(directorio, 'dash'), exist_ok=True)
+    correr('-i', progresivo, '-map', '0:v', '-map', '0:a', '-c', 'copy', '-f', 'dash',
+           '-seg_duration', str(DURACION_SEGMENTO), '-use_template', '1', '-use_timeline', '0',
+           '-adaptation_sets', 'id=0,streams=v id=1,streams=a',
+           os.path.join(directorio, ARCHIVOS_MEDIOS['dash']))
+
+def generar_sinteticos(directorio, duracion, kbps=4000):
+    """Bytes aleatorios con manifiestos validos; sirven para medir transferencia, no merge ni postprocesado"""
+    bytes_segmento = kbps * 125 * DURACION_SEGMENTO
+    segmentos = max(1, duracion // DURACION_SEGMENTO)
+    
+    with open(os.path.join(directorio, ARCHIVOS_MEDIOS['progresivo']), 'wb') as f:
+        for _ in range(segmentos):
+            f.write(os.urandom(bytes_segmento))
+    
+    os.makedirs(os.path.join(directorio, 'hls'), exist_ok=True)
+    lineas = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{DURACION_SEGMENTO}',
+              '#EXT-X-MEDIA-SEQUENCE:0', '#EXT-X-PLAYLIST-TYPE:VOD']
+    for i in range(segmentos):
+        with open(os.path.join(directorio, 'hls', f'seg{i:03d}.ts'), 'wb') as f:
+            f.write(os.urandom(bytes_segmento))
+        lineas += [f'#EXTINF:{DURACION_SEGMENTO}.0,', f'seg{i:03d}.ts']
+    lineas.append('#EXT-X-ENDLIST')
+    with open(os.path.join(directorio, ARCHIVOS_MEDIOS['hls']), 'w') as f:
+        f.write('\n'.join(lineas) + '\n')
+    
+    # Una sola representacion con video y audio: sin FFmpeg no se puede hacer merge
+    os.makedirs(os.path.join(directorio, 'dash'), exist_ok=True)
+    with open(os.path.join(directorio, 'dash', 'init-stream0.m4s'), 'wb') as f:
+        f.write(os.urandom(1024))
+    for i in range(1, segmentos + 1):
+        with open(os.path.join(directorio, 'dash', f'chunk-stream0-{i:05d}.m4s'), 'wb') as f:
+            f.write(os.urandom(bytes_segmento))
+    with open(os.path.join(directorio, ARCHIVOS_MEDIOS['dash']), 'w') as f:
+        f.write(f'''<?xml version="1.0" encoding="utf-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{segmentos * DURACION_SEGMENTO}S" minBufferTime="PT{DURACION_SEGMENTO}S" profiles="urn:mpeg:dash:profile:isoff-live:2011">
+  <Period id="0" start="PT0S">
+    <AdaptationSet id="0" contentType="video" mimeType="video/mp4" segmentAlignment="true">
+      <Representation id="0" codecs="avc1.64001f,mp4a.40.2" bandwidth="{kbps * 1000}" width="1280" height="720" frameRate="30">
+        <SegmentTemplate timescale="1" duration="{DURACION_SEGMENTO}" startNumber="1" initialization="init-stream0.m4s" media="chunk-stream0-$Number%05d$.m4s"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+''')
+
+def generar_medios(directorio, duracion=30, ffmpeg=None):
+    """Genera los medios si faltan; retorna True si son reales (hechos con FFmpeg)"""
+    marca = os.path.join(directorio, '.generado')
+    if os.path.exists(marca):
+        with open(marca) as f:
+            tipo, _, generada = f.read().strip().partition(' ')
+        # Se regeneran si cambia la duracion o si ahora hay FFmpeg y antes no
+        if generada == str(duracion) and (tipo == 'ffmpeg' or ffmpeg is None):
+            return tipo == 'ffmpeg'
+    
+    os.makedirs(directorio, exist_ok=True)
+    reales = ffmpeg is not None
+    if reales:
+        try:
+            generar_con_ffmpeg(ffmpeg, directorio, duracion)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"[WARNING] No se pudieron generar medios con FFmpeg ({e}); se usan bytes aleatorios")
+            reales = False
+    if not reales:
+        generar_sinteticos(directorio, duracion)
+    
+    with open(marca, 'w') as f:
+        f.write(f"{'ffmpeg' if reales else 'sinteticos'} {duracion}")
+    return reales
+
+def leer_modos(texto):
+    """'lento=512,429=2' -> {'lento': 512, '429': 2}; 'normal' -> {}"""
+    modos = {}
+    for parte in texto.split(','):
+        nombre, _, valor = parte.partition('=')
+        if nombre and nombre != 'normal':
+            modos[nombre] = int(valor or 1)
+    return modos
+
+def leer_rango(cabecera, tamano):
+    """(inicio, fin) de una cabecera Range 'bytes=a-b', o None si no hay rango valido"""
+    coincidencia = re.fullmatch(r'bytes=(\d*)-(\d*)', (cabecera or '').strip())
+    if coincidencia is None:
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio:
+        if not fin:
+            return None
+        inicio, fin = max(0, tamano - int(fin)), tamano - 1
+    else:
+        inicio, fin = int(inicio), min(int(fin) if fin else tamano - 1, tamano - 1)
+    if inicio > fin:
+        return None
+    return inicio, fin
+
+class ManejadorMedios(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, formato, *args):
+        pass
+    
+    def do_HEAD(self):
+        self.servir(enviar_cuerpo=False)
+    
+    def do_GET(self):
+        self.servir(enviar_cuerpo=True)
+    
+    def servir(self, enviar_cuerpo):
+        inicio = time.monotonic()
+        ruta = self.path.split('?', 1)[0].lstrip('/')
+        texto_modos, _, relativo = ruta.partition('/')
+        modos = leer_modos(texto_modos)
+        archivo = self.server.resolver(relativo)
+        if archivo is None:
+            self.responder_vacio(404)
+            return
+        
+        extension = os.path.splitext(archivo)[1].lower()
+        es_fragmento = extension in EXTENSIONES_FRAGMENTO
+        intento = self.server.contar_intento(texto_modos, relativo) if enviar_cuerpo else 0
+        
+        if es_fragmento and intento <= modos.get('429', 0):
+            self.responder_vacio(429, {'Retry-After': '1'})
+            self.server.registrar(relativo, es_fragmento, time.monotonic() - inicio, 0, 429)
+            return
+        
+        tamano = os.path.getsize(archivo)
+        rango = leer_rango(self.headers.get('Range'), tamano)
+        desde, hasta = rango if rango else (0, tamano - 1)
+        longitud = hasta - desde + 1
+        
+        self.send_response(206 if rango else 200)
+        self.send_header('Content-Type', TIPOS.get(extension, 'application/octet-stream'))
+        self.send_header('Content-Length', str(longitud))
+        self.send_header('Accept-Ranges', 'bytes')
+        if rango:
+            self.send_header('Content-Range', f'bytes {desde}-{hasta}/{tamano}')
+        self.end_headers()
+        if not enviar_cuerpo:
+            return
+        
+        cortar = es_fragmento and intento <= modos.get('corte', 0)
+        limite = longitud // 2 if cortar else longitud
+        tasa = modos.get('lento', 0) * 1024
+        enviados = 0
+        try:
+            with open(archivo, 'rb') as f:
+                f.seek(desde)
+                while enviados < limite:
+                    bloque = f.read(min(TAMANO_BLOQUE, limite - enviados))
+                    if not bloque:
+                        break
+                    self.wfile.write(bloque)
+                    enviados += len(bloque)
+                    if tasa:
+                        adelanto = enviados / tasa - (time.monotonic() - inicio)
+                        if adelanto > 0:
+                            time.sleep(adelanto)
+        except (BrokenPipeError, ConnectionResetError):
+            cortar = True
+        if cortar:
+            self.close_connection = True
+        self.server.registrar(relativo, es_fragmento, time.monotonic() - inicio, enviados, 'corte' if cortar else 200)
+    
+    def responder_vacio(self, estado, cabeceras=None):
+        self.send_response(estado)
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+class ServidorMedios(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def __init__(self, directorio, puerto=0):
+        super().__init__(('127.0.0.1', puerto), ManejadorMedios)
+        self.directorio = os.path.abspath(directorio)
+        self.lock = threading.Lock()
+        self.intentos = {}
+        self.peticiones = []
+    
+    def url(self, modos, relativo):
+        return f"http://127.0.0.1:{self.server_port}/{modos or 'normal'}/{relativo}"
+    
+    def resolver(self, relativo):
+        """Ruta del archivo dentro de la carpeta de medios, o None"""
+        archivo = os.path.abspath(os.path.join(self.directorio, relativo))
+        if not archivo.startswith(self.directorio + os.sep) or not os.path.isfile(archivo):
+            return None
+        return archivo
+    
+    def contar_intento(self, modos, relativo):
+        with self.lock:
+            clave = (modos, relativo)
+            self.intentos[clave] = self.intentos.get(clave, 0) + 1
+            return self.intentos[clave]
+    
+    def registrar(self, relativo, es_fragmento, segundos, enviados, resultado):
+        with self.lock:
+            self.peticiones.append({
+                'ruta': relativo, 'fragmento': es_fragmento, 'segundos': segundos,
+                'bytes': enviados, 'resultado': resultado,
+            })
+    
+    def reiniciar(self):
+        """Retorna las peticiones registradas y vuelve a contar los intentos desde cero"""
+        with self.lock:
+            peticiones, self.peticiones = self.peticiones, []
+            self.intentos = {}
+            return peticiones
+    
+    def iniciar(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local de medios sinteticos para benchmarks")
+    parser.add_argument('--directorio', required=True, help="Carpeta donde se generan y sirven los medios")
+    parser.add_argument('--puerto', type=int, default=8000)
+    parser.add_argument('--duracion', type=int, default=30, help="Segundos de cada medio")
+    parser.add_argument('--ffmpeg', help="Binario de FFmpeg (por defecto el del PATH)")
+    args = parser.parse_args()
+    
+    reales = generar_medios(args.directorio, args.duracion, args.ffmpeg or shutil.which('ffmpeg'))
+    servidor = ServidorMedios(args.directorio, args.puerto)
+    print(f"Medios {'reales' if reales else 'sinteticos'} en {args.directorio}")
+    for relativo in ARCHIVOS_MEDIOS.values():
+        if servidor.resolver(relativo):
+            print(f"  {servidor.url('normal', relativo)}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
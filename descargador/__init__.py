@@ -0,0 +1,14 @@
+"""Nucleo de 3oX Downloader, usable sin PyQt5 (linea de comandos, servidores, cron)"""
+from .config import cargar_configuracion, guardar_configuracion, CONFIG_FILE, CARPETA_POR_DEFECTO
+from .nucleo import (
+    Descargador, traducir_error, cargar_yt_dlp, precargar_yt_dlp,
+    ESTADO_EN_COLA, ESTADO_EXTRAYENDO, ESTADO_DESCARGANDO, ESTADO_POSTPROCESANDO,
+    ESTADO_COMPLETADO, ESTADO_FALLIDO, ESTADO_OMITIDO, ESTADO_CANCELADO, ESTADOS_TERMINADOS, DescargaOmitida
+)
+from .ffmpeg import obtener_ffmpeg, precargar_ffmpeg
+from .historial import HistorialDescargas
+from .bitacora import configurar_registro, ARCHIVO_LOG
+from .metricas import Metricas
+from .cola import ColaDescargas, TrabajoDescarga
+from .servicio import ServicioDescargas
+from .cliente import ClienteServicio, ColaRemota, iniciar_servicio
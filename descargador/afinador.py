@@ -0,0 +1,125 @@
+"""Ajuste automatico de los fragmentos simultaneos por host y protocolo
+
+Con 'hilos' fijo (16) algunas CDN limitan la velocidad y otras admitirian mas
+conexiones. El afinador mide la velocidad de cada descarga fragmentada (HLS,
+DASH) y elige el numero de fragmentos simultaneos de la siguiente:
+  
+  - arranque: empieza bajo y duplica mientras la velocidad mejore (como el
+    slow start de TCP)
+  - estable: usa el mejor valor medido y de vez en cuando prueba uno un poco
+    mayor o menor; si la velocidad cae mucho (la CDN empezo a limitar) baja a
+    la mitad
+
+yt-dlp fija el numero de hilos al empezar cada archivo fragmentado, asi que el
+nuevo valor se aplica al siguiente archivo: la pista de audio del mismo video,
+el siguiente trabajo o la siguiente entrada de una lista. El mejor valor por
+host se guarda en disco para que la proxima descarga empiece cerca del optimo.
+"""
+import json
+import logging
+import os
+import threading
+
+from .config import DIRECTORIO_DATOS
+from .hosts import host_de
+
+log = logging.getLogger(__name__)
+
+ARCHIVO_ESTADO = DIRECTORIO_DATOS / "fragmentos.json"
+
+# Mejora minima para seguir duplicando en el arranque
+MEJORA_MINIMA = 1.1
+# Caida de velocidad que se considera limitacion de la CDN
+CAIDA_MAXIMA = 0.6
+# Cada cuantas medidas en fase estable se prueba un valor vecino
+PERIODO_PRUEBA = 4
+# Descargas mas cortas no dan una medida fiable
+DURACION_MINIMA = 2.0
+
+def dominio_base(host):
+    """'rr3---sn-abc.googlevideo.com' -> 'googlevideo.com' (las CDN reparten entre muchos hosts)"""
+    partes = host.split('.')
+    if len(partes) > 2 and len(partes[-1]) == 2 and partes[-2] in ('co', 'com', 'net', 'org', 'gob', 'gov'):
+        return '.'.join(partes[-3:])
+    return '.'.join(partes[-2:])
+
+def clave_formato(formato):
+    """Clave host|protocolo de un formato de yt-dlp"""
+    url = formato.get('url') or formato.get('manifest_url') or ''
+    return f"{dominio_base(host_de(url))}|{formato.get('protocol') or ''}"
+
+class AfinadorFragmentos:
+    def __init__(self, inicial=16, maximo=64, archivo=ARCHIVO_ESTADO):
+        self.inicial = max(1, inicial)
+        self.maximo = max(self.inicial, maximo)
+        self.archivo = archivo
+        self.lock = threading.Lock()
+        self.estados = self.leer()
+    
+    def leer(self):
+        try:
+            with open(self.archivo, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def estado(self, clave):
+        estado = self.estados.get(clave)
+        if estado is None:
+            # Arranque bajo: una CDN que limita a pocas conexiones no llega a bloquearnos
+            actual = max(1, self.inicial // 4)
+            estado = {'actual': actual, 'mejor': actual, 'fase': 'arranque', 'medidas': {}, 'muestras': 0}
+            self.estados[clave] = estado
+        return estado
+    
+    def sugerir(self, clave):
+        """Fragmentos simultaneos para la siguiente descarga con esta clave"""
+        with self.lock:
+            return self.estado(clave)['actual']
+    
+    def registrar(self, clave, hilos, velocidad):
+        """Velocidad media (bytes/s) de una descarga completa hecha con 'hilos' fragmentos simultaneos"""
+        with self.lock:
+            estado = self.estado(clave)
+            medidas = estado['medidas']
+            anterior = medidas.get(str(hilos))
+            medidas[str(hilos)] = velocidad if anterior is None else 0.7 * anterior + 0.3 * velocidad
+            estado['muestras'] += 1
+            
+            mejor_previo = estado['mejor']
+            velocidad_mejor_previo = medidas.get(str(mejor_previo), 0)
+            estado['mejor'] = int(max(medidas, key=medidas.get))
+            
+            if estado['fase'] == 'arranque':
+                if hilos == estado['mejor'] and hilos < self.maximo and (
+                        hilos == mejor_previo or velocidad >= velocidad_mejor_previo * MEJORA_MINIMA):
+                    siguiente = min(self.maximo, hilos * 2)
+                else:
+                    estado['fase'] = 'estable'
+                    siguiente = estado['mejor']
+            elif hilos == mejor_previo and velocidad < velocidad_mejor_previo * CAIDA_MAXIMA:
+                siguiente = max(1, hilos // 2)
+                log.info("%s: la velocidad cayo con %s fragmentos, probando con %s", clave, hilos, siguiente)
+            elif estado['muestras'] % PERIODO_PRUEBA == 0:
+                paso = max(1, estado['mejor'] // 4)
+                if (estado['muestras'] // PERIODO_PRUEBA) % 2:
+                    siguiente = min(self.maximo, estado['mejor'] + paso)
+                else:
+                    siguiente = max(1, estado['mejor'] - paso)
+            else:
+                siguiente = estado['mejor']
+            
+            estado['actual'] = siguiente
+            self.guardar()
+            return siguiente
+    
+    def guardar(self):
+        """Llamar con el lock tomado"""
+        try:
+            self.archivo.parent.mkdir(parents=True, exist_ok=True)
+            temporal = self.archivo.with_suffix('.tmp')
+            with open(temporal, 'w') as f:
+                json.dump(self.estados, f, indent=4)
+            os.replace(temporal, self.archivo)
+        except OSError as e:
+            log.warning("No se pudo guardar el ajuste de fragmentos: %s", e)
@@ -0,0 +1,193 @@
+"""Presupuesto de ancho de banda compartido entre todas las descargas
+
+'ratelimit' de yt-dlp limita cada YoutubeDL por separado: con N descargas en
+paralelo se usaba N veces el limite configurado. PresupuestoAncho reparte un
+limite global entre las descargas activas.
+
+La parte de cada descarga no se escribe en 'ratelimit': el descargador de
+fragmentos de yt-dlp copia los params una vez por archivo y cada hilo de
+concurrent_fragment_downloads tendria la parte entera. En su lugar envolver()
+hace que cada lectura de las respuestas HTTP del YoutubeDL gaste de un cubo de
+fichas de su descarga, compartido por todas sus conexiones (fragmentos
+simultaneos o varias conexiones por archivo); los cambios de reparto se
+aplican en la siguiente lectura.
+
+El reparto es por niveles de prioridad (el nivel mas alto se sirve primero) y,
+dentro de cada nivel, proporcional al peso. Una descarga que no usa toda su
+parte (servidor lento o atascada) cede el resto a las demas en el siguiente
+reparto.
+"""
+import threading
+import time
+
+# Ninguna descarga baja de este limite, para que no se quede parada del todo
+MINIMO_BYTES = 32 * 1024
+# Fichas que puede acumular una descarga, en segundos de su cuota
+RAFAGA_SEGUNDOS = 0.25
+# Sin eventos de progreso durante este tiempo la descarga se considera atascada
+ESTANCADO_SEGUNDOS = 5
+INTERVALO_REPARTO = 1.0
+
+def limite_desde_config(config):
+    """Bytes por segundo del limite global, o None si no hay limite"""
+    if not config.get('limite_enabled', False):
+        return None
+    return config.get('limite_mbps', 10) * 125000
+
+class Participacion:
+    """Una descarga activa dentro del presupuesto"""
+    def __init__(self, presupuesto, params, prioridad=0, peso=1.0):
+        self.presupuesto = presupuesto
+        self.params = params
+        self.prioridad = prioridad
+        self.peso = max(0.01, float(peso))
+        self.velocidad = None
+        self.ultimo_informe = time.monotonic()
+        self.cuota = None
+        # Cubo de fichas en bytes que gastan todas las conexiones de la descarga
+        self.fichas = 0.0
+        self.repuesto = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def demanda(self, ahora):
+        """Bytes por segundo que la descarga puede aprovechar; infinito si esta limitada por nosotros"""
+        if ahora - self.ultimo_informe > ESTANCADO_SEGUNDOS:
+            return 0.0
+        if self.velocidad is None or self.cuota is None or self.velocidad >= 0.8 * self.cuota:
+            return float('inf')
+        return self.velocidad * 1.25
+    
+    def informar(self, d):
+        """Llamar desde el progress_hook de yt-dlp"""
+        self.velocidad = d.get('speed')
+        self.ultimo_informe = time.monotonic()
+        self.presupuesto.repartir()
+    
+    def aplicar(self, cuota):
+        self.cuota = None if cuota is None else max(MINIMO_BYTES, cuota)
+    
+    def consumir(self, cantidad):
+        """Gasta cantidad bytes del cubo y retorna los segundos que hay que esperar para no pasarse de la cuota"""
+        with self.lock:
+            cuota = self.cuota
+            ahora = time.monotonic()
+            if cuota is None:
+                self.fichas = 0.0
+                self.repuesto = ahora
+                return 0.0
+            self.fichas = min(cuota * RAFAGA_SEGUNDOS, self.fichas + (ahora - self.repuesto) * cuota)
+            self.repuesto = ahora
+            self.fichas -= cantidad
+            return -self.fichas / cuota if self.fichas < 0 else 0.0
+
+def repartir_nivel(disponible, participantes, ahora):
+    """Reparto proporcional al peso con tope en la demanda de cada uno (water-filling)"""
+    cuotas = {}
+    restantes = list(participantes)
+    while restantes and disponible > 0:
+        por_peso = disponible / sum(p.peso for p in restantes)
+        saciados = [p for p in restantes if p.demanda(ahora) <= por_peso * p.peso]
+        if not saciados:
+            for p in restantes:
+                cuotas[p] = por_peso * p.peso
+            return cuotas, 0.0
+        for p in saciados:
+            cuotas[p] = p.demanda(ahora)
+            disponible -= cuotas[p]
+            restantes.remove(p)
+    for p in restantes:
+        cuotas[p] = 0.0
+    return cuotas, max(0.0, disponible)
+
+class PresupuestoAncho:
+    def __init__(self, limite_bytes=None):
+        self.limite_bytes = limite_bytes
+        self.participantes = []
+        self.lock = threading.Lock()
+        self.ultimo_reparto = 0.0
+    
+    def participar(self, params, prioridad=0, peso=1.0):
+        """Suma la descarga del YoutubeDL con estos params al reparto; envolver() lee de ahi su participacion"""
+        participacion = Participacion(self, params, prioridad, peso)
+        with self.lock:
+            self.participantes.append(participacion)
+        params['participacion_ancho'] = participacion
+        self.repartir(forzar=True)
+        return participacion
+    
+    def abandonar(self, participacion):
+        with self.lock:
+            if participacion in self.participantes:
+                self.participantes.remove(participacion)
+        if participacion.params.get('participacion_ancho') is participacion:
+            del participacion.params['participacion_ancho']
+        self.repartir(forzar=True)
+    
+    def cambiar_limite(self, limite_bytes):
+        with self.lock:
+            self.limite_bytes = limite_bytes
+        self.repartir(forzar=True)
+    
+    def cambiar_prioridad(self, participacion, prioridad=None, peso=None):
+        with self.lock:
+            if prioridad is not None:
+                participacion.prioridad = prioridad
+            if peso is not None:
+                participacion.peso = max(0.01, float(peso))
+        self.repartir(forzar=True)
+    
+    def repartir(self, forzar=False):
+        with self.lock:
+            ahora = time.monotonic()
+            if not forzar and ahora - self.ultimo_reparto < INTERVALO_REPARTO:
+                return
+            self.ultimo_reparto = ahora
+            
+            if self.limite_bytes is None:
+                for p in self.participantes:
+                    p.aplicar(None)
+                return
+            
+            cuotas = {}
+            disponible = float(self.limite_bytes)
+            for prioridad in sorted({p.prioridad for p in self.participantes}, reverse=True):
+                nivel = [p for p in self.participantes if p.prioridad == prioridad]
+                cuotas_nivel, disponible = repartir_nivel(disponible, nivel, ahora)
+                cuotas.update(cuotas_nivel)
+            
+            # Si todos estan limitados por su propia demanda, el sobrante se reparte para que puedan crecer
+            if disponible > 0 and self.participantes:
+                peso_total = sum(p.peso for p in self.participantes)
+                for p in self.participantes:
+                    cuotas[p] += disponible * p.peso / peso_total
+            
+            for p in self.participantes:
+                p.aplicar(cuotas[p])
+
+def limitar_lecturas(respuesta, participacion):
+    """Cada read() de la respuesta espera lo necesario para no pasarse de la cuota de la participacion"""
+    leer_original = respuesta.read
+    
+    def leer(*args, **kwargs):
+        datos = leer_original(*args, **kwargs)
+        espera = participacion.consumir(len(datos)) if datos else 0
+        if espera > 0:
+            time.sleep(espera)
+        return datos
+    
+    respuesta.read = leer
+    return respuesta
+
+def envolver(ydl):
+    """Las respuestas HTTP del YoutubeDL gastan la cuota de la descarga que lo tiene en ese momento"""
+    urlopen_original = ydl.urlopen
+    
+    def urlopen(peticion):
+        respuesta = urlopen_original(peticion)
+        participacion = ydl.params.get('participacion_ancho')
+        if participacion is not None:
+            limitar_lecturas(respuesta, participacion)
+        return respuesta
+    
+    ydl.urlopen = urlopen
+    return ydl
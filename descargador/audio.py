@@ -0,0 +1,171 @@
+"""Modo audio: copiar el audio original cuando se acepta y recodificar solo si hace falta
+
+Antes el modo audio pasaba siempre por FFmpegExtractAudio a mp3 de 192 kbps,
+asi que un Opus o un AAC se recodificaban aunque sirvieran tal cual. Ahora
+AudioPP recibe los contenedores aceptados (solo 'mp3' por defecto, como antes;
+con audio_original tambien m4a, webm, opus y ogg) y:
+  - si el archivo ya es solo audio en un contenedor aceptado no se toca
+  - si el codec cabe en un contenedor aceptado (aac en mp4, opus en mkv) se
+    copia el stream a ese contenedor, sin recodificar
+  - solo en otro caso se recodifica a mp3
+
+Las recodificaciones van a un pool con tantos ffmpeg a la vez como nucleos.
+"""
+import logging
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .ffmpeg import tiene_encoder
+from .contenedor import (
+    codecs_de_info, codecs_con_ffprobe, ACCION_NINGUNA, ACCION_REMUX, ACCION_RECODIFICAR, ETIQUETAS_ACCION
+)
+
+log = logging.getLogger(__name__)
+
+CONTENEDORES_ORIGINAL = ['m4a', 'webm', 'opus', 'ogg', 'mp3']
+# Contenedor al que se copia cada codec cuando el original no se acepta
+CONTENEDOR_NATURAL = {
+    'aac': 'm4a',
+    'mp4a': 'm4a',
+    'opus': 'opus',
+    'vorbis': 'ogg',
+    'mp3': 'mp3',
+}
+# Codecs que admite cada contenedor aceptado (para saber si el original ya sirve)
+CODECS_CONTENEDOR = {
+    'm4a': {'aac', 'mp4a', 'alac', 'mp3'},
+    'webm': {'opus', 'vorbis'},
+    'opus': {'opus'},
+    'ogg': {'vorbis', 'opus'},
+    'mp3': {'mp3'},
+}
+CALIDAD_MP3 = '192k'
+ENCODER_MP3 = 'libmp3lame'
+
+def contenedores_desde_config(config):
+    """Contenedores aceptados en modo audio: solo mp3 salvo que se pida conservar el original"""
+    if config.get('audio_original', False):
+        return list(config.get('audio_contenedores', CONTENEDORES_ORIGINAL))
+    return ['mp3']
+
+def decidir_audio(info, contenedores, ffprobe=None):
+    """Retorna (accion, extension destino, motivo)"""
+    ext = info.get('ext')
+    video, audio = codecs_de_info(info)
+    if video is None and audio is None and ffprobe and info.get('filepath'):
+        try:
+            video, audio = codecs_con_ffprobe(info['filepath'], ffprobe)
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            log.warning("ffprobe no pudo leer los codecs: %s", e)
+    
+    if video is None and ext in contenedores and (audio is None or audio in CODECS_CONTENEDOR.get(ext, ())):
+        return ACCION_NINGUNA, ext, f"{audio or ext} en {ext} se acepta"
+    natural = CONTENEDOR_NATURAL.get(audio)
+    if natural in contenedores:
+        return ACCION_REMUX, natural, f"{audio} copiado a {natural}"
+    return ACCION_RECODIFICAR, 'mp3', f"{audio or 'codec desconocido'} no se acepta"
+
+class PoolRecodificacion:
+    """Ejecuta comandos de ffmpeg con un maximo de procesos simultaneos.
+    
+    Cada trabajador solo lanza y espera su ffmpeg, asi que hilos bastan: el
+    trabajo de CPU ocurre en los procesos de ffmpeg, uno por nucleo.
+    """
+    def __init__(self, trabajadores=None):
+        self.trabajadores = trabajadores or os.cpu_count() or 2
+        self.ejecutor = ThreadPoolExecutor(max_workers=self.trabajadores, thread_name_prefix='recodificacion')
+    
+    @staticmethod
+    def ejecutar(comando):
+        resultado = subprocess.run(comando, capture_output=True, text=True)
+        if resultado.returncode != 0:
+            raise RuntimeError(f"ffmpeg fallo ({resultado.returncode}): {resultado.stderr.strip()[-500:]}")
+    
+    def enviar(self, comando):
+        """Future que termina cuando termina el ffmpeg"""
+        return self.ejecutor.submit(self.ejecutar, comando)
+
+_pool = None
+_lock = threading.Lock()
+
+def obtener_pool(trabajadores=None):
+    """Pool compartido por todas las descargas. trabajadores: 0/None = uno por nucleo"""
+    global _pool
+    trabajadores = trabajadores or os.cpu_count() or 2
+    with _lock:
+        if _pool is None or _pool.trabajadores != trabajadores:
+            # Las recodificaciones en curso en el pool anterior terminan igual
+            if _pool is not None:
+                _pool.ejecutor.shutdown(wait=False)
+            _pool = PoolRecodificacion(trabajadores)
+        return _pool
+
+def comando_audio(ffmpeg, entrada, salida, accion):
+    comando = [ffmpeg, '-y', '-loglevel', 'error', '-i', entrada, '-vn', '-map', '0:a:0']
+    if accion == ACCION_REMUX:
+        comando += ['-c:a', 'copy']
+        if salida.endswith('.m4a'):
+            # El AAC de HLS viene en ADTS; en m4a va sin esas cabeceras
+            comando += ['-bsf:a', 'aac_adtstoasc']
+    else:
+        comando += ['-c:a', ENCODER_MP3, '-b:a', CALIDAD_MP3, '-threads', '1']
+    return comando + [salida]
+
+_clase_pp = None
+
+def crear_pp_audio(ydl, contenedores, ffmpeg=None, trabajadores=None):
+    """Postprocesador de yt-dlp que aplica decidir_audio(). ffmpeg: datos de obtener_ffmpeg()"""
+    global _clase_pp
+    if _clase_pp is None:
+        from yt_dlp.postprocessor import PostProcessor
+        from yt_dlp.utils import PostProcessingError
+        
+        class AudioPP(PostProcessor):
+            def __init__(self, downloader, contenedores, ffmpeg=None, trabajadores=None):
+                super().__init__(downloader)
+                self.contenedores = contenedores
+                self.ffmpeg = ffmpeg
+                self.trabajadores = trabajadores
+            
+            def run(self, info):
+                if self.ffmpeg is None:
+                    self.report_warning("FFmpeg no encontrado: se conserva el audio tal como se descargo")
+                    return [], info
+                accion, destino, motivo = decidir_audio(info, self.contenedores, self.ffmpeg['ffprobe'])
+                self.to_screen(f"{ETIQUETAS_ACCION[accion]} ({motivo})")
+                info['decision_contenedor'] = {'accion': accion, 'motivo': motivo}
+                if accion == ACCION_NINGUNA:
+                    return [], info
+                if accion == ACCION_RECODIFICAR and not tiene_encoder(self.ffmpeg, ENCODER_MP3):
+                    raise PostProcessingError(
+                        f"El FFmpeg de {self.ffmpeg['ruta']} no incluye {ENCODER_MP3}: no se puede pasar a mp3 "
+                        f"({motivo}). Usa una compilacion de FFmpeg con {ENCODER_MP3} o activa audio_original"
+                    )
+                
+                entrada = info['filepath']
+                salida = f"{os.path.splitext(entrada)[0]}.{destino}"
+                if salida == entrada:
+                    salida = f"{os.path.splitext(entrada)[0]}.tmp.{destino}"
+                comando = comando_audio(self.ffmpeg['ruta'], entrada, salida, accion)
+                if accion == ACCION_REMUX:
+                    # Copiar el stream cuesta poco: se hace aqui mismo sin pasar por el pool
+                    PoolRecodificacion.ejecutar(comando)
+                else:
+                    obtener_pool(self.trabajadores).enviar(comando).result()
+                
+                if salida.endswith(f".tmp.{destino}"):
+                    os.replace(salida, entrada)
+                    salida, archivos_borrar = entrada, []
+                else:
+                    archivos_borrar = [entrada]
+                info['filepath'] = salida
+                info['ext'] = destino
+                if accion == ACCION_RECODIFICAR:
+                    info['acodec'] = 'mp3'
+                return archivos_borrar, info
+        
+        _clase_pp = AudioPP
+    
+    return _clase_pp(ydl, contenedores, ffmpeg, trabajadores)
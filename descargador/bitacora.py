@@ -0,0 +1,115 @@
+"""Registro de eventos con niveles, contexto por trabajo y archivo rotativo
+
+Los modulos usan logging.getLogger(__name__) y Descargador un AdaptadorTrabajo
+que agrega trabajo, host y fase a cada registro. configurar_registro() pone un
+QueueHandler en el logger 'descargador': los hilos de descarga solo encolan el
+registro y un hilo aparte lo escribe en la consola y en el archivo rotativo,
+asi una consola lenta no frena las descargas. Con el nivel en INFO los
+log.debug(...) se descartan antes de formatear nada.
+
+La salida de yt-dlp entra al mismo registro mediante LoggerYtDlp (opcion 'logger').
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+from .config import DIRECTORIO_DATOS
+
+RAIZ = 'descargador'
+ARCHIVO_LOG = DIRECTORIO_DATOS / "logs" / "descargador.log"
+FORMATO_ARCHIVO = "%(asctime)s %(levelname)-7s [trabajo=%(trabajo)s host=%(host)s fase=%(fase)s] %(name)s: %(message)s"
+FORMATO_CONSOLA = "[%(levelname)s] %(message)s"
+CONTEXTO_VACIO = {'trabajo': '-', 'host': '-', 'fase': '-'}
+MAX_BYTES = 5 * 1024 * 1024
+COPIAS = 3
+
+class ContextoPorDefecto(logging.Filter):
+    """Completa los campos de contexto en registros emitidos fuera de un trabajo"""
+    def filter(self, record):
+        for campo, valor in CONTEXTO_VACIO.items():
+            if not hasattr(record, campo):
+                setattr(record, campo, valor)
+        return True
+
+class AdaptadorTrabajo(logging.LoggerAdapter):
+    """Agrega el contexto del trabajo a cada registro; extra['fase'] se actualiza al cambiar de estado"""
+    def process(self, msg, kwargs):
+        kwargs['extra'] = {**self.extra, **kwargs.get('extra', {})}
+        return msg, kwargs
+
+class LoggerYtDlp:
+    """Objeto para la opcion 'logger' de yt-dlp"""
+    def __init__(self, log):
+        self.log = log
+    
+    def debug(self, msg):
+        # yt-dlp manda por debug tanto sus mensajes normales como los '[debug] '
+        if msg.startswith('[debug] '):
+            self.log.debug(msg[8:])
+        else:
+            self.log.info(msg)
+    
+    def info(self, msg):
+        self.log.info(msg)
+    
+    def warning(self, msg):
+        self.log.warning(msg)
+    
+    def error(self, msg):
+        self.log.error(msg)
+
+_oyente = None
+_lock = threading.Lock()
+
+def configurar_registro(nivel='INFO', archivo=ARCHIVO_LOG, consola=True):
+    """Activa el registro asincrono. Llamadas posteriores solo cambian el nivel"""
+    global _oyente
+    raiz = logging.getLogger(RAIZ)
+    raiz.setLevel(getattr(logging, str(nivel).upper(), logging.INFO))
+    with _lock:
+        if _oyente is not None:
+            return raiz
+        
+        destinos = []
+        if consola:
+            destino = logging.StreamHandler(sys.stderr)
+            destino.setFormatter(logging.Formatter(FORMATO_CONSOLA))
+            destinos.append(destino)
+        if archivo:
+            try:
+                archivo.parent.mkdir(parents=True, exist_ok=True)
+                destino = logging.handlers.RotatingFileHandler(
+                    archivo, maxBytes=MAX_BYTES, backupCount=COPIAS, encoding='utf-8', delay=True
+                )
+                destino.setFormatter(logging.Formatter(FORMATO_ARCHIVO))
+                destinos.append(destino)
+            except OSError as e:
+                sys.stderr.write(f"[WARNING] No se pudo abrir el archivo de registro {archivo}: {e}\n")
+        for destino in destinos:
+            destino.addFilter(ContextoPorDefecto())
+        
+        cola = queue.SimpleQueue()
+        raiz.addHandler(logging.handlers.QueueHandler(cola))
+        raiz.propagate = False
+        _oyente = logging.handlers.QueueListener(cola, *destinos)
+        _oyente.start()
+        atexit.register(detener_registro)
+    return raiz
+
+def detener_registro():
+    """Escribe lo que quede en la cola y para el hilo del registro"""
+    global _oyente
+    with _lock:
+        if _oyente is not None:
+            _oyente.stop()
+            for destino in _oyente.handlers:
+                destino.close()
+            _oyente = None
+            raiz = logging.getLogger(RAIZ)
+            for handler in list(raiz.handlers):
+                if isinstance(handler, logging.handlers.QueueHandler):
+                    raiz.removeHandler(handler)
+            raiz.propagate = True
@@ -0,0 +1,131 @@
+"""Cache en disco de la informacion extraida por yt-dlp (resultado de extract_info)
+
+Cada entrada se guarda por extractor + URL normalizada. La caducidad es el TTL
+configurado o la expiracion de las URLs firmadas de los formatos, lo que ocurra
+antes. Cuando el tamano total supera el limite se borran las entradas usadas
+hace mas tiempo (LRU).
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from .config import DIRECTORIO_DATOS
+from .plataformas import normalizar_url
+
+# Margen para no usar URLs firmadas que caducan en mitad de la descarga
+MARGEN_EXPIRACION = 300
+
+PATRON_EXPIRACION = re.compile(r'[?&/~;](?:x-)?(?:expire|expires|exp)[=/](\d{9,11})(?!\d)', re.IGNORECASE)
+
+def urls_de_info(info):
+    if info.get('url'):
+        yield info['url']
+    for formato in info.get('formats') or []:
+        for clave in ('url', 'manifest_url', 'fragment_base_url'):
+            if formato.get(clave):
+                yield formato[clave]
+
+def expiracion_urls_firmadas(info):
+    """Menor fecha de expiracion (epoch) encontrada en las URLs de los formatos, o None"""
+    expiraciones = []
+    for url in urls_de_info(info):
+        for valor in PATRON_EXPIRACION.findall(url):
+            expiraciones.append(int(valor))
+    return min(expiraciones) if expiraciones else None
+
+class CacheInfo:
+    def __init__(self, ruta=None, ttl=6 * 3600, max_bytes=200 * 1024 * 1024):
+        self.ruta = ruta or (DIRECTORIO_DATOS / "cache_info.sqlite3")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conexion = None
+    
+    def conectar(self):
+        if self.conexion is None:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            self.conexion = sqlite3.connect(str(self.ruta), check_same_thread=False)
+            self.conexion.execute(
+                "CREATE TABLE IF NOT EXISTS entradas ("
+                " clave TEXT PRIMARY KEY, extractor TEXT, url TEXT, datos BLOB,"
+                " tamano INTEGER, expira REAL, ultimo_uso REAL)"
+            )
+            self.conexion.execute("CREATE INDEX IF NOT EXISTS idx_uso ON entradas (ultimo_uso)")
+        return self.conexion
+    
+    @staticmethod
+    def clave(extractor, url, perfil=""):
+        """perfil distingue extracciones que dan formatos distintos (cookies, clientes)"""
+        texto = f"{extractor}|{normalizar_url(url)}|{perfil}"
+        return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+    
+    def obtener(self, clave):
+        """Retorna el info guardado si sigue vigente, o None"""
+        ahora = time.time()
+        with self.lock:
+            conexion = self.conectar()
+            fila = conexion.execute(
+                "SELECT datos, expira FROM entradas WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is None:
+                return None
+            if fila[1] <= ahora:
+                conexion.execute("DELETE FROM entradas WHERE clave = ?", (clave,))
+                conexion.commit()
+                return None
+            conexion.execute("UPDATE entradas SET ultimo_uso = ? WHERE clave = ?", (ahora, clave))
+            conexion.commit()
+        return json.loads(zlib.decompress(fila[0]).decode('utf-8'))
+    
+    def guardar(self, clave, extractor, url, info):
+        ahora = time.time()
+        expira = ahora + self.ttl
+        expiracion_firmada = expiracion_urls_firmadas(info)
+        if expiracion_firmada is not None:
+            expira = min(expira, expiracion_firmada - MARGEN_EXPIRACION)
+        if expira <= ahora:
+            return False
+        
+        datos = zlib.compress(json.dumps(info).encode('utf-8'))
+        if len(datos) > self.max_bytes:
+            return False
+        
+        with self.lock:
+            conexion = self.conectar()
+            conexion.execute(
+                "INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (clave, extractor, url, datos, len(datos), expira, ahora)
+            )
+            conexion.execute("DELETE FROM entradas WHERE expira <= ?", (ahora,))
+            self.expulsar(conexion)
+            conexion.commit()
+        return True
+    
+    def expulsar(self, conexion):
+        """Borra las entradas menos usadas hasta quedar dentro del limite de tamano"""
+        total = conexion.execute("SELECT COALESCE(SUM(tamano), 0) FROM entradas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for clave, tamano in conexion.execute(
+            "SELECT clave, tamano FROM entradas ORDER BY ultimo_uso ASC"
+        ).fetchall():
+            conexion.execute("DELETE FROM entradas WHERE clave = ?", (clave,))
+            total -= tamano
+            if total <= self.max_bytes:
+                break
+    
+    def invalidar(self, clave):
+        with self.lock:
+            conexion = self.conectar()
+            conexion.execute("DELETE FROM entradas WHERE clave = ?", (clave,))
+            conexion.commit()
+    
+    def cerrar(self):
+        with self.lock:
+            if self.conexion is not None:
+                self.conexion.close()
+                self.conexion = None
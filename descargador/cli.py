@@ -0,0 +1,292 @@
+"""Modo por lotes sin interfaz grafica: nunca importa PyQt5"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+from .bitacora import configurar_registro, ARCHIVO_LOG
+from .cliente import ClienteServicio, ColaRemota, ErrorServicio
+from .config import cargar_configuracion, CONFIG_FILE, CARPETA_POR_DEFECTO
+from .cola import ColaDescargas
+from .historial import HistorialDescargas
+from .nucleo import ESTADO_COMPLETADO, ESTADO_FALLIDO, ESTADO_OMITIDO, ESTADO_CANCELADO
+from .servicio import ServicioDescargas, ARCHIVO_SERVICIO
+
+log = logging.getLogger(__name__)
+
+RESOLUCIONES = {
+    '4320': "8K (4320p)",
+    '2880': "5K (2880p)",
+    '2160': "4K (2160p)",
+    '1440': "2K (1440p)",
+    '1080': "Full HD (1080p)",
+    '720': "HD (720p)",
+    '480': "SD (480p)",
+    '360': "360p",
+    '240': "240p",
+    '144': "144p",
+}
+
+FPS = {'60': "60 FPS", '30': "30 FPS"}
+
+CODECS = {'opus': "Opus (mejor calidad)", 'aac': "AAC (compatible)"}
+
+CANALES = {'5.1': "5.1 Surround", 'stereo': "Stereo"}
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog="3oX-Downloader",
+        description="Descarga videos por lotes sin interfaz grafica. "
+                    "Escribe un evento JSON por linea en la salida estandar."
+    )
+    parser.add_argument('urls', nargs='*', help="URLs a descargar")
+    parser.add_argument('-i', '--archivo', action='append', default=[],
+                        help="Archivo con una URL por linea ('-' para leer de stdin)")
+    parser.add_argument('-o', '--carpeta', default=CARPETA_POR_DEFECTO,
+                        help="Carpeta de destino")
+    parser.add_argument('-a', '--audio', action='store_true', help="Descargar solo audio (MP3)")
+    parser.add_argument('--audio-original', action='store_true',
+                        help="Con --audio, conservar el audio original (m4a, opus, webm) y recodificar solo si hace falta")
+    parser.add_argument('--resolucion', choices=list(RESOLUCIONES), help="Altura maxima del video")
+    parser.add_argument('--fps', choices=list(FPS))
+    parser.add_argument('--codec', choices=list(CODECS), help="Codec de audio preferido")
+    parser.add_argument('--canales', choices=list(CANALES))
+    parser.add_argument('-j', '--simultaneas', type=int, help="Descargas simultaneas")
+    parser.add_argument('--hilos', type=int, help="Fragmentos simultaneos por descarga")
+    parser.add_argument('--conexiones', type=int,
+                        help="Conexiones por rangos para archivos de un solo bloque (1 = desactivado)")
+    parser.add_argument('--limite-mbps', type=float,
+                        help="Limite de velocidad total en Mbps, repartido entre todas las descargas")
+    parser.add_argument('--prioridad', type=int, default=0,
+                        help="Prioridad de estas descargas en el reparto del ancho de banda")
+    parser.add_argument('--peso', type=float, default=1.0,
+                        help="Peso de estas descargas dentro de su prioridad")
+    parser.add_argument('--temporal', metavar='CARPETA',
+                        help="Carpeta rapida (tmpfs, NVMe) para las descargas en curso; al terminar se mueven al destino")
+    parser.add_argument('--ffmpeg', help="Carpeta o binario de FFmpeg (por defecto el de la configuracion)")
+    parser.add_argument('--sin-cache', action='store_true',
+                        help="No reutilizar informacion extraida en descargas anteriores")
+    parser.add_argument('--sin-historial', action='store_true',
+                        help="Descargar aunque el video ya este en el historial")
+    parser.add_argument('--importar-carpeta', action='append', default=[], metavar='CARPETA',
+                        help="Registrar en el historial los videos que ya hay en la carpeta")
+    parser.add_argument('--importar-archivo', action='append', default=[], metavar='ARCHIVO',
+                        help="Registrar en el historial un archivo --download-archive de yt-dlp")
+    parser.add_argument('--reanudar', action='store_true',
+                        help="Reanudar tambien las descargas que quedaron a medias en ejecuciones anteriores")
+    parser.add_argument('--metricas', metavar='RUTA',
+                        help="Guardar al terminar los tiempos por fase (texto de Prometheus si termina en .prom, JSON si no)")
+    parser.add_argument('--nivel-log', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="Detalle de los mensajes en stderr y en el archivo de registro (por defecto el de la configuracion)")
+    parser.add_argument('--servicio', action='store_true',
+                        help="Quedarse en segundo plano atendiendo trabajos por HTTP (ver servicio.py)")
+    parser.add_argument('--puerto', type=int, help="Puerto del servicio (por defecto servicio_puerto, 8765)")
+    parser.add_argument('--socket', metavar='RUTA', help="Atender tambien en este socket Unix")
+    parser.add_argument('--remoto', action='store_true',
+                        help="Encolar las URLs en el servicio en marcha en lugar de descargarlas aqui")
+    parser.add_argument('--sin-esperar', action='store_true',
+                        help="Con --remoto, salir al encolar sin esperar a que terminen")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help="Archivo de configuracion")
+    return parser
+
+def leer_urls(args):
+    urls = list(args.urls)
+    archivos = list(args.archivo)
+    
+    if not urls and not archivos and not sys.stdin.isatty():
+        archivos.append('-')
+    
+    for archivo in archivos:
+        if archivo == '-':
+            lineas = sys.stdin.read().splitlines()
+        else:
+            with open(archivo, 'r', encoding='utf-8') as f:
+                lineas = f.read().splitlines()
+        for linea in lineas:
+            linea = linea.strip()
+            if linea and not linea.startswith('#'):
+                urls.append(linea)
+    
+    return urls
+
+def calidad_desde_args(args):
+    return {
+        'resolucion': RESOLUCIONES.get(args.resolucion, 'Mejor disponible'),
+        'fps': FPS.get(args.fps, 'Mejor disponible'),
+        'audio_codec': CODECS.get(args.codec, 'Mejor disponible'),
+        'audio_canales': CANALES.get(args.canales, 'Mejor disponible'),
+    }
+
+class SalidaEventos:
+    """Escribe eventos JSON (uno por linea) de forma segura desde varios hilos"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+    
+    def emitir(self, evento, **datos):
+        datos = {'evento': evento, 'tiempo': round(time.time(), 3), **datos}
+        linea = json.dumps(datos, ensure_ascii=False)
+        with self.lock:
+            self.stream.write(linea + "\n")
+            self.stream.flush()
+
+def importar_historial(args):
+    historial = HistorialDescargas()
+    try:
+        for carpeta in args.importar_carpeta:
+            cantidad = historial.importar_carpeta(carpeta)
+            log.info("%s archivos de %s agregados al historial", cantidad, carpeta)
+        for archivo in args.importar_archivo:
+            cantidad = historial.importar_archivo_ytdlp(archivo)
+            log.info("%s entradas de %s agregadas al historial", cantidad, archivo)
+    finally:
+        historial.cerrar()
+
+def ejecutar_servicio(args, config):
+    if ClienteServicio.conectar() is not None:
+        log.error("Ya hay un servicio en marcha (ver %s)", ARCHIVO_SERVICIO)
+        return 1
+    servicio = ServicioDescargas(config, puerto=args.puerto, socket_unix=args.socket, archivo_config=args.config)
+    try:
+        servicio.iniciar()
+    except OSError as e:
+        log.error("No se pudo iniciar el servicio: %s", e)
+        return 1
+    
+    def detener(*_):
+        raise KeyboardInterrupt
+    
+    signal.signal(signal.SIGTERM, detener)
+    try:
+        while not servicio.detenido.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servicio.detener()
+    return 0
+
+def enviar_al_servicio(args, urls, formato, calidad, al_actualizar, salida):
+    """--remoto: encola en el servicio y, salvo --sin-esperar, sigue sus eventos hasta que terminen"""
+    cliente = ClienteServicio.conectar()
+    if cliente is None:
+        log.error("No hay ningun servicio en marcha (python -m descargador --servicio)")
+        return 2
+    try:
+        ids = cliente.enviar(urls, os.path.abspath(args.carpeta), formato, calidad, args.prioridad, args.peso)
+    except (OSError, ErrorServicio) as e:
+        log.error("El servicio rechazo los trabajos: %s", e)
+        return 1
+    if args.sin_esperar:
+        salida.emitir('encolados', ids=ids)
+        return 0
+    
+    # El servicio informa de todos sus trabajos; solo se muestran estos y las entradas de sus listas
+    propios = set(ids)
+    
+    def al_actualizar_propio(trabajo):
+        if trabajo.id in propios or trabajo.padre in propios:
+            propios.add(trabajo.id)
+            al_actualizar(trabajo)
+    
+    cola = ColaRemota(cliente, al_actualizar=al_actualizar_propio)
+    try:
+        trabajos = cola.esperar(ids)
+    except ErrorServicio as e:
+        log.error("%s; los trabajos siguen en el servicio si vuelve a arrancar", e)
+        return 1
+    finally:
+        cola.cerrar()
+    fallidos = [t for t in trabajos if t.estado == ESTADO_FALLIDO]
+    omitidos = [t for t in trabajos if t.estado == ESTADO_OMITIDO]
+    salida.emitir('resumen', total=len(trabajos), fallidos=len(fallidos), omitidos=len(omitidos))
+    return 1 if fallidos else 0
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    config = cargar_configuracion(args.config)
+    configurar_registro(args.nivel_log or config.get('nivel_log', 'INFO'),
+                        archivo=ARCHIVO_LOG if config.get('log_archivo', True) else None)
+    if args.servicio:
+        return ejecutar_servicio(args, config)
+    importar = args.importar_carpeta or args.importar_archivo
+    if importar:
+        importar_historial(args)
+    urls = [] if importar and not args.urls and not args.archivo else leer_urls(args)
+    if not urls and not args.reanudar:
+        if importar:
+            return 0
+        print("No se indico ninguna URL", file=sys.stderr)
+        return 2
+    
+    if args.simultaneas:
+        config['descargas_simultaneas'] = args.simultaneas
+    if args.conexiones:
+        config['conexiones_por_archivo'] = args.conexiones
+    if args.hilos:
+        config['hilos'] = args.hilos
+    if args.ffmpeg:
+        config['ffmpeg_path'] = args.ffmpeg
+    if args.temporal is not None:
+        config['carpeta_temporal'] = args.temporal
+    if args.limite_mbps:
+        config['limite_enabled'] = True
+        config['limite_mbps'] = args.limite_mbps
+    if args.sin_cache:
+        config['cache_info'] = False
+    if args.sin_historial:
+        config['historial'] = False
+    if args.audio_original:
+        config['audio_original'] = True
+    
+    salida = SalidaEventos(sys.stdout)
+    
+    def al_actualizar(trabajo):
+        datos = trabajo.a_dict()
+        if trabajo.estado == ESTADO_COMPLETADO:
+            salida.emitir('completado', **datos)
+        elif trabajo.estado == ESTADO_FALLIDO:
+            salida.emitir('fallido', **datos)
+        elif trabajo.estado == ESTADO_OMITIDO:
+            salida.emitir('omitido', **datos)
+        elif trabajo.estado == ESTADO_CANCELADO:
+            salida.emitir('cancelado', **datos)
+        else:
+            salida.emitir('progreso', **datos)
+    
+    formato = "audio" if args.audio else "video"
+    calidad = calidad_desde_args(args)
+    if args.remoto:
+        return enviar_al_servicio(args, urls, formato, calidad, al_actualizar, salida)
+    
+    cola = ColaDescargas(config, al_actualizar=al_actualizar)
+    os.makedirs(args.carpeta, exist_ok=True)
+    
+    # El registro y la salida de yt-dlp van a stderr; se redirige stdout por si
+    # algo escribe directamente, para que solo lleve eventos JSON
+    stdout_original = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        if args.reanudar:
+            cola.reanudar()
+        for url in urls:
+            cola.agregar(url, args.carpeta, formato, calidad, prioridad=args.prioridad, peso=args.peso)
+        cola.esperar()
+    finally:
+        cola.cerrar()
+        sys.stdout = stdout_original
+    
+    fallidos = [t for t in cola.trabajos.values() if t.estado == ESTADO_FALLIDO]
+    omitidos = [t for t in cola.trabajos.values() if t.estado == ESTADO_OMITIDO]
+    if args.metricas:
+        try:
+            cola.metricas.exportar(args.metricas)
+        except OSError as e:
+            log.warning("No se pudieron guardar las metricas en %s: %s", args.metricas, e)
+    salida.emitir('resumen', total=len(cola.trabajos), fallidos=len(fallidos), omitidos=len(omitidos),
+                  metricas=cola.metricas.instantanea())
+    return 1 if fallidos else 0
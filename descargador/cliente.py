@@ -0,0 +1,296 @@
+"""Cliente de la API del servicio local (ver servicio.py)
+
+ClienteServicio habla con el servicio por TCP o por el socket Unix. ColaRemota
+imita la parte de ColaDescargas que usan la GUI y la linea de comandos, asi
+pueden trabajar contra el servicio sin cambiar su logica: los trabajos se
+mantienen al dia con el flujo de /eventos.
+"""
+import http.client
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+from .nucleo import ESTADOS_TERMINADOS
+from .servicio import ARCHIVO_SERVICIO, leer_token
+
+log = logging.getLogger(__name__)
+
+TIEMPO_ESPERA = 5
+# Espera entre intentos de reconectar el flujo de eventos
+ESPERA_RECONEXION = 2
+# Intentos seguidos sin conectar tras los que esperar() da el servicio por perdido
+MAX_RECONEXIONES = 5
+
+class ErrorServicio(Exception):
+    def __init__(self, mensaje, codigo=None):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+class ConexionUnix(http.client.HTTPConnection):
+    def __init__(self, ruta, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.ruta = ruta
+    
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.ruta)
+
+class ClienteServicio:
+    def __init__(self, puerto=None, token=None, socket_unix=None, host='127.0.0.1'):
+        self.puerto = puerto
+        self.token = token
+        self.socket_unix = socket_unix
+        self.host = host
+    
+    @classmethod
+    def conectar(cls, archivo=ARCHIVO_SERVICIO):
+        """Cliente del servicio en marcha, o None si no hay ninguno que responda"""
+        try:
+            with open(archivo, 'r') as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            return None
+        socket_unix = datos.get('socket') if hasattr(socket, 'AF_UNIX') else None
+        cliente = cls(datos.get('puerto'), leer_token(), socket_unix)
+        try:
+            cliente.pedir('GET', '/estado')
+        except (OSError, ErrorServicio) as e:
+            log.debug("El servicio anotado en %s no responde: %s", archivo, e)
+            return None
+        return cliente
+    
+    def abrir(self, timeout=TIEMPO_ESPERA):
+        if self.socket_unix and os.path.exists(self.socket_unix):
+            return ConexionUnix(self.socket_unix, timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.puerto, timeout=timeout)
+    
+    def cabeceras(self):
+        cabeceras = {'Content-Type': 'application/json'}
+        if self.token:
+            cabeceras['Authorization'] = f"Bearer {self.token}"
+        return cabeceras
+    
+    def pedir(self, metodo, ruta, datos=None):
+        """Respuesta de la API ya decodificada (JSON o texto). Lanza ErrorServicio si el codigo no es 2xx"""
+        conexion = self.abrir()
+        try:
+            cuerpo = json.dumps(datos).encode('utf-8') if datos is not None else None
+            conexion.request(metodo, ruta, body=cuerpo, headers=self.cabeceras())
+            respuesta = conexion.getresponse()
+            contenido = respuesta.read().decode('utf-8')
+            es_json = respuesta.getheader('Content-Type', '').startswith('application/json')
+            resultado = json.loads(contenido) if es_json else contenido
+            if respuesta.status >= 300:
+                mensaje = resultado.get('error') if isinstance(resultado, dict) else contenido
+                raise ErrorServicio(f"{respuesta.status}: {mensaje}", respuesta.status)
+            return resultado
+        finally:
+            conexion.close()
+    
+    def enviar(self, urls, carpeta=None, formato='video', calidad=None, prioridad=0, peso=1.0):
+        """Encola las URLs y retorna los ids de los trabajos"""
+        datos = {'urls': list(urls), 'carpeta': carpeta, 'formato': formato, 'calidad': calidad or {},
+                 'prioridad': prioridad, 'peso': peso}
+        return self.pedir('POST', '/trabajos', datos)['ids']
+    
+    def trabajos(self):
+        return self.pedir('GET', '/trabajos')
+    
+    def cancelar(self, id_trabajo):
+        return self.pedir('DELETE', f"/trabajos/{id_trabajo}")
+    
+    def cambiar_prioridad(self, id_trabajo, prioridad=None, peso=None):
+        return self.pedir('PATCH', f"/trabajos/{id_trabajo}", {'prioridad': prioridad, 'peso': peso})
+    
+    def metricas(self, formato='json'):
+        return self.pedir('GET', f"/metricas?formato={quote(formato)}")
+    
+    def eventos(self):
+        """Generador de (evento, datos) del flujo /eventos; termina si se corta la conexion"""
+        conexion = self.abrir(timeout=None)
+        try:
+            conexion.request('GET', '/eventos', headers=self.cabeceras())
+            respuesta = conexion.getresponse()
+            if respuesta.status != 200:
+                raise ErrorServicio(f"{respuesta.status}: no se pudo abrir el flujo de eventos", respuesta.status)
+            evento, datos = None, []
+            for linea in respuesta:
+                linea = linea.decode('utf-8').rstrip('\r\n')
+                if linea.startswith('event: '):
+                    evento = linea[7:]
+                elif linea.startswith('data: '):
+                    datos.append(linea[6:])
+                elif not linea and evento:
+                    yield evento, json.loads("\n".join(datos))
+                    evento, datos = None, []
+        finally:
+            conexion.close()
+
+def iniciar_servicio(espera=10):
+    """Lanza el servicio en segundo plano y espera a que responda. Retorna el cliente o None"""
+    if getattr(sys, 'frozen', False):
+        # En el ejecutable de PyInstaller sys.executable es la propia aplicacion, que atiende --servicio
+        argumentos = [sys.executable, '--servicio']
+        carpeta = os.path.dirname(sys.executable)
+    else:
+        argumentos = [sys.executable, '-m', 'descargador', '--servicio']
+        carpeta = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    opciones = {'start_new_session': True} if os.name != 'nt' else {
+        'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    subprocess.Popen(argumentos, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     cwd=carpeta, **opciones)
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        cliente = ClienteServicio.conectar()
+        if cliente is not None:
+            return cliente
+        time.sleep(0.2)
+    log.warning("El servicio no respondio a tiempo")
+    return None
+
+class TrabajoRemoto:
+    """Trabajo del servicio con los mismos atributos que TrabajoDescarga.a_dict()"""
+    def __init__(self, datos):
+        self.actualizar(datos)
+    
+    def actualizar(self, datos):
+        self.__dict__.update(datos)
+    
+    def terminado(self):
+        return self.estado in ESTADOS_TERMINADOS
+    
+    def a_dict(self):
+        return dict(self.__dict__)
+
+class MetricasRemotas:
+    """resumen() y exportar() de Metricas, calculados por el servicio"""
+    def __init__(self, cliente):
+        self.cliente = cliente
+    
+    def instantanea(self):
+        return self.cliente.metricas()
+    
+    def resumen(self):
+        return self.cliente.metricas('resumen')
+    
+    def exportar(self, ruta):
+        if str(ruta).endswith('.prom'):
+            contenido = self.cliente.metricas('prometheus')
+        else:
+            contenido = json.dumps(self.instantanea(), indent=4)
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+
+class ColaRemota:
+    """Misma interfaz que ColaDescargas para la GUI, pero los trabajos corren en el servicio"""
+    def __init__(self, cliente, al_actualizar=None):
+        self.cliente = cliente
+        self.al_actualizar = al_actualizar or (lambda trabajo: None)
+        self.trabajos = {}
+        self.metricas = MetricasRemotas(cliente)
+        self.lock = threading.Lock()
+        self.cambio = threading.Condition(self.lock)
+        self.cerrada = False
+        # True tras MAX_RECONEXIONES intentos fallidos seguidos; se sigue reintentando por si vuelve
+        self.perdida = False
+        threading.Thread(target=self.seguir_eventos, daemon=True).start()
+    
+    def seguir_eventos(self):
+        fallos = 0
+        while not self.cerrada:
+            try:
+                for evento, datos in self.cliente.eventos():
+                    if self.cerrada:
+                        return
+                    if fallos:
+                        fallos = 0
+                        with self.lock:
+                            self.perdida = False
+                    self.aplicar_evento(evento, datos)
+            except (OSError, ValueError, http.client.HTTPException, ErrorServicio) as e:
+                log.warning("Se perdio la conexion con el servicio, reintentando: %s", e)
+            fallos += 1
+            if fallos == MAX_RECONEXIONES:
+                log.error("El servicio no responde tras %s intentos", fallos)
+                with self.lock:
+                    self.perdida = True
+                    self.cambio.notify_all()
+            time.sleep(ESPERA_RECONEXION)
+    
+    def aplicar_evento(self, evento, datos):
+        if evento == 'trabajo':
+            with self.lock:
+                trabajo = self.trabajos.get(datos['id'])
+                if trabajo is None:
+                    trabajo = self.trabajos[datos['id']] = TrabajoRemoto(datos)
+                else:
+                    trabajo.actualizar(datos)
+                self.cambio.notify_all()
+            self.al_actualizar(trabajo)
+        elif evento == 'limpiados':
+            with self.lock:
+                for id_trabajo in datos['ids']:
+                    self.trabajos.pop(id_trabajo, None)
+    
+    def agregar(self, url, carpeta, formato, calidad, prioridad=0, peso=1.0):
+        self.cliente.enviar([url], carpeta, formato, calidad, prioridad, peso)
+    
+    def procesar_cola(self):
+        pass
+    
+    def aplicar_configuracion(self):
+        self.cliente.pedir('POST', '/configuracion')
+    
+    def cambiar_prioridad(self, id_trabajo, prioridad=None, peso=None):
+        self.cliente.cambiar_prioridad(id_trabajo, prioridad, peso)
+    
+    def cancelar(self, id_trabajo):
+        try:
+            self.cliente.cancelar(id_trabajo)
+            return True
+        except ErrorServicio as e:
+            if e.codigo == 409:
+                return False
+            raise
+    
+    def reanudar(self):
+        # El servicio ya reanuda el diario al arrancar
+        return self.cliente.pedir('POST', '/reanudar')['ids']
+    
+    def num_activos(self):
+        with self.lock:
+            return sum(1 for trabajo in self.trabajos.values() if not trabajo.terminado())
+    
+    def esperar(self, ids):
+        """Bloquea hasta que terminen los trabajos ids y las entradas de lista que generen.
+        
+        Lanza ErrorServicio si se pierde la conexion con el servicio.
+        """
+        with self.lock:
+            while True:
+                if self.perdida:
+                    raise ErrorServicio("Se perdio la conexion con el servicio")
+                seguidos = set(ids)
+                for trabajo in sorted(self.trabajos.values(), key=lambda t: t.id):
+                    if trabajo.padre in seguidos:
+                        seguidos.add(trabajo.id)
+                if all(i in self.trabajos and self.trabajos[i].terminado() for i in seguidos):
+                    return [self.trabajos[i] for i in sorted(seguidos)]
+                self.cambio.wait()
+    
+    def limpiar_terminados(self):
+        return self.cliente.pedir('POST', '/limpiar')['ids']
+    
+    def cerrar(self):
+        """Deja de seguir los eventos; el servicio y sus descargas siguen en marcha"""
+        self.cerrada = True
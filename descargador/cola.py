@@ -0,0 +1,453 @@
+"""Cola de descargas con un numero maximo de trabajos simultaneos"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from .afinador import AfinadorFragmentos
+from .ancho_banda import PresupuestoAncho, limite_desde_config
+from .cache_info import CacheInfo
+from .cookies import AlmacenCookies
+from .diario import DiarioTrabajos
+from .historial import HistorialDescargas
+from .hosts import LimitadorHosts, host_de
+from .metricas import Metricas
+from .plataformas import obtener_registro
+from .sesiones import GestorSesiones
+from .contenedor import ETIQUETAS_ACCION
+from .nucleo import (
+    Descargador, DescargaOmitida, traducir_error, es_error_permanente, categoria_error, perfil_formato,
+    ESTADO_EN_COLA, ESTADO_COMPLETADO, ESTADO_FALLIDO, ESTADO_OMITIDO, ESTADO_CANCELADO, ESTADOS_TERMINADOS
+)
+
+log = logging.getLogger(__name__)
+
+class TrabajoDescarga:
+    """Una descarga encolada y su estado actual"""
+    def __init__(self, id_trabajo, url, carpeta, formato, calidad, padre=None, prioridad=0, peso=1.0):
+        self.id = id_trabajo
+        self.url = url
+        self.carpeta = carpeta
+        self.formato = formato
+        self.calidad = calidad
+        self.estado = ESTADO_EN_COLA
+        self.mensaje = ""
+        self.titulo = ""
+        self.error = ""
+        self.contenedor = None
+        self.progreso = None
+        # Trabajo de la lista de reproduccion que genero este, si lo hay
+        self.padre = padre
+        self.intentos = 0
+        self.cancelado = False
+        # (plataforma, id), perfil de formato y carpeta: dos trabajos con la misma identidad son la misma descarga
+        self.identidad = None
+        # Pedidos que se unieron a este trabajo en lugar de crear uno nuevo
+        self.solicitudes = 1
+        # Reparto del ancho de banda: primero las prioridades altas, dentro de cada una segun el peso
+        self.prioridad = prioridad
+        self.peso = peso
+        self.descargador = None
+        # Identidad estable entre ejecuciones, para el diario de trabajos
+        self.clave = uuid.uuid4().hex
+        self.clave_padre = None
+        self.creado = time.time()
+        self.formato_elegido = None
+        self.archivo = None
+    
+    def terminado(self):
+        return self.estado in ESTADOS_TERMINADOS
+    
+    def a_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'carpeta': self.carpeta,
+            'formato': self.formato,
+            'estado': self.estado,
+            'mensaje': self.mensaje,
+            'titulo': self.titulo,
+            'error': self.error,
+            'contenedor': self.contenedor,
+            'progreso': self.progreso,
+            'padre': self.padre,
+            'intentos': self.intentos,
+            'prioridad': self.prioridad,
+            'peso': self.peso,
+            'solicitudes': self.solicitudes,
+        }
+
+class ColaDescargas:
+    """Ejecuta trabajos en hilos, como maximo 'descargas_simultaneas' a la vez.
+    
+    Es una cadena de dos etapas: cuando un trabajo termina de descargar y pasa a
+    FFmpeg (merge, arreglos, conversion) cede su turno de descarga y espera uno de
+    los 'postprocesos_simultaneos' turnos de postprocesado. Si se acumulan mas de
+    'postprocesos_en_espera' trabajos esperando a FFmpeg no se empiezan descargas
+    nuevas, para no llenar el disco de archivos sin procesar.
+    
+    al_actualizar(trabajo) se llama desde el hilo del trabajo cada vez que cambia
+    su estado o mensaje; quien lo use debe pasarlo a su propio hilo si lo necesita.
+    """
+    def __init__(self, config, al_actualizar=None):
+        self.config = config
+        self.al_actualizar = al_actualizar or (lambda trabajo: None)
+        self.trabajos = {}
+        self.pendientes = deque()
+        self.activos = set()
+        # Trabajos que ya descargaron y estan en la etapa de postprocesado: no ocupan turno de descarga
+        self.postprocesando = set()
+        self.siguiente_id = 1
+        self.reintentos_pendientes = 0
+        self.hijos = set()
+        # identidad -> id del trabajo en cola o en curso con esa identidad
+        self.en_curso = {}
+        self.plataformas = obtener_registro()
+        self.lock = threading.Lock()
+        self.cambio = threading.Condition(self.lock)
+        self.cache = None
+        if config.get('cache_info', True):
+            self.cache = CacheInfo(
+                ttl=config.get('cache_info_ttl_horas', 6) * 3600,
+                max_bytes=config.get('cache_info_max_mb', 200) * 1024 * 1024,
+            )
+        self.historial = None
+        if config.get('historial', True):
+            self.historial = HistorialDescargas()
+        self.presupuesto = PresupuestoAncho(limite_desde_config(config))
+        self.metricas = Metricas()
+        self.afinador = None
+        if config.get('autoajuste_hilos', True):
+            self.afinador = AfinadorFragmentos(config.get('hilos', 16), config.get('hilos_max', 64))
+        self.diario = None
+        if config.get('reanudar_trabajos', True):
+            self.diario = DiarioTrabajos()
+        self.limitador_hosts = None
+        if config.get('limitador_adaptativo', True):
+            self.limitador_hosts = LimitadorHosts(tasa_maxima=config.get('peticiones_por_segundo', 20))
+        self.cookies = AlmacenCookies(
+            ttl=config.get('cookies_ttl_minutos', 30) * 60,
+            cache_disco=config.get('cache_cookies_disco', False),
+        )
+        
+        self.etapa_postproceso = threading.Semaphore(self.max_postprocesos())
+        
+        self.sesiones = None
+        if config.get('reutilizar_sesiones', True):
+            self.sesiones = GestorSesiones(max_libres=self.max_simultaneas())
+    
+    def max_simultaneas(self):
+        return max(1, int(self.config.get('descargas_simultaneas', 3)))
+    
+    def max_postprocesos(self):
+        """0 = uno por nucleo. Se lee al crear la cola"""
+        return int(self.config.get('postprocesos_simultaneos', 0)) or os.cpu_count() or 2
+    
+    def max_en_espera(self):
+        """Trabajos descargados esperando a FFmpeg antes de frenar las descargas nuevas. 0 = el doble de postprocesos"""
+        return int(self.config.get('postprocesos_en_espera', 0)) or 2 * self.max_postprocesos()
+    
+    def identidad(self, url, carpeta, formato, calidad):
+        """(url a descargar, identidad del trabajo); ver RegistroPlataformas.canonizar"""
+        url, medio = self.plataformas.canonizar(url)
+        return url, (medio, perfil_formato(formato, calidad, self.config), os.path.abspath(carpeta))
+    
+    def agregar(self, url, carpeta, formato, calidad, padre=None, prioridad=0, peso=1.0):
+        """Encola la URL; si ya hay un trabajo sin terminar para el mismo video, formato y carpeta lo retorna"""
+        url, identidad = self.identidad(url, carpeta, formato, calidad)
+        with self.lock:
+            if padre is not None:
+                # Una lista que se vuelve a expandir (al reanudar) no duplica sus entradas
+                if (padre, url) in self.hijos:
+                    return None
+                self.hijos.add((padre, url))
+            existente = self.trabajos.get(self.en_curso.get(identidad))
+            if existente is not None and not existente.terminado() and not existente.cancelado:
+                existente.solicitudes += 1
+            else:
+                existente = None
+                trabajo = TrabajoDescarga(self.siguiente_id, url, carpeta, formato, calidad, padre, prioridad, peso)
+                trabajo.identidad = identidad
+                if padre in self.trabajos:
+                    trabajo.clave_padre = self.trabajos[padre].clave
+                self.encolar(trabajo)
+        if existente is not None:
+            log.info("%s ya esta en la cola (trabajo %s); se une a ese trabajo", url, existente.id)
+            if prioridad > existente.prioridad:
+                self.cambiar_prioridad(existente.id, prioridad=prioridad)
+            else:
+                self.al_actualizar(existente)
+            return existente
+        if self.diario is not None:
+            self.diario.guardar(trabajo)
+        self.al_actualizar(trabajo)
+        self.procesar_cola()
+        return trabajo
+    
+    def encolar(self, trabajo):
+        """Llamar con el lock tomado"""
+        self.siguiente_id += 1
+        self.trabajos[trabajo.id] = trabajo
+        self.pendientes.append(trabajo.id)
+        if trabajo.identidad is not None:
+            self.en_curso[trabajo.identidad] = trabajo.id
+    
+    def reanudar(self):
+        """Vuelve a encolar los trabajos que quedaron sin terminar en la ejecucion anterior"""
+        if self.diario is None:
+            return []
+        reanudados = []
+        ids = {}
+        for datos in self.diario.pendientes():
+            with self.lock:
+                if any(t.clave == datos['clave'] for t in self.trabajos.values()):
+                    continue
+                padre = ids.get(datos['padre'])
+                trabajo = TrabajoDescarga(
+                    self.siguiente_id, datos['url'], datos['carpeta'], datos['formato'], datos['calidad'],
+                    padre, datos['prioridad'], datos['peso']
+                )
+                trabajo.clave = datos['clave']
+                trabajo.clave_padre = datos['padre']
+                trabajo.identidad = self.identidad(trabajo.url, trabajo.carpeta, trabajo.formato, trabajo.calidad)[1]
+                trabajo.creado = datos['creado']
+                trabajo.formato_elegido = datos['formato_elegido']
+                trabajo.archivo = datos['archivo']
+                if datos['total']:
+                    trabajo.mensaje = f"Reanudando desde {datos['descargado'] * 100 / datos['total']:.0f}%"
+                else:
+                    trabajo.mensaje = "Reanudando"
+                if padre is not None:
+                    self.hijos.add((padre, trabajo.url))
+                self.encolar(trabajo)
+                ids[trabajo.clave] = trabajo.id
+            reanudados.append(trabajo)
+            self.al_actualizar(trabajo)
+        if reanudados:
+            log.info("%s trabajos reanudados del diario", len(reanudados))
+        self.procesar_cola()
+        return reanudados
+    
+    def procesar_cola(self):
+        """Lanza trabajos pendientes mientras haya hilos libres"""
+        with self.lock:
+            while (self.pendientes and len(self.activos) < self.max_simultaneas()
+                   and len(self.postprocesando) < self.max_en_espera()):
+                trabajo = self.trabajos[self.pendientes.popleft()]
+                self.activos.add(trabajo.id)
+                threading.Thread(target=self.ejecutar, args=(trabajo,), daemon=True).start()
+    
+    def ejecutar(self, trabajo):
+        inicio = time.monotonic()
+        # Copia de la configuracion para que cambios posteriores no afecten al trabajo en curso
+        descargador = Descargador(
+            trabajo.url, trabajo.carpeta, trabajo.formato, trabajo.calidad, dict(self.config),
+            id_trabajo=trabajo.id,
+            progreso=lambda mensaje, datos=None: self.actualizar_mensaje(trabajo, mensaje, datos),
+            estado=lambda estado: self.cambiar_estado(trabajo, estado),
+            cache=self.cache,
+            cookies=self.cookies,
+            sesiones=self.sesiones,
+            historial=self.historial,
+            limitador_hosts=self.limitador_hosts,
+            expandir=lambda url: self.agregar(url, trabajo.carpeta, trabajo.formato, trabajo.calidad, padre=trabajo.id,
+                                              prioridad=trabajo.prioridad, peso=trabajo.peso),
+            presupuesto=self.presupuesto,
+            prioridad=trabajo.prioridad,
+            peso=trabajo.peso,
+            formato_fijo=trabajo.formato_elegido,
+            archivo_fijo=trabajo.archivo,
+            al_elegir_formato=lambda info: self.formato_elegido(trabajo, info),
+            afinador=self.afinador,
+            metricas=self.metricas,
+            al_terminar_transferencia=lambda: self.liberar_turno(trabajo),
+            etapa_postproceso=self.etapa_postproceso,
+        )
+        trabajo.descargador = descargador
+        if trabajo.cancelado:
+            descargador.cancelar()
+        try:
+            trabajo.titulo = descargador.descargar()
+            trabajo.contenedor = descargador.decision_contenedor
+            trabajo.mensaje = "Descarga completada exitosamente"
+            if descargador.entradas_expandidas is not None:
+                trabajo.mensaje = f"Lista expandida: {descargador.entradas_expandidas} videos en cola"
+            elif trabajo.contenedor:
+                trabajo.mensaje += f" ({ETIQUETAS_ACCION[trabajo.contenedor['accion']]})"
+            self.metricas.registrar_fase('total', time.monotonic() - inicio)
+            self.metricas.registrar_resultado(host_de(trabajo.url), 'exito')
+            self.cambiar_estado(trabajo, ESTADO_COMPLETADO)
+        except DescargaOmitida as e:
+            descargador.log.info(str(e))
+            trabajo.mensaje = str(e)
+            self.cambiar_estado(trabajo, ESTADO_OMITIDO)
+        except Exception as e:
+            if descargador.cancelado:
+                descargador.log.info("Descarga cancelada")
+                trabajo.mensaje = "Cancelada"
+                self.cambiar_estado(trabajo, ESTADO_CANCELADO)
+                return
+            descargador.log.error(str(e))
+            self.metricas.registrar_resultado(host_de(trabajo.url), categoria_error(str(e)))
+            if self.reintentar(trabajo, str(e)):
+                return
+            trabajo.error = traducir_error(str(e))
+            trabajo.mensaje = trabajo.error.split("\n")[0]
+            self.cambiar_estado(trabajo, ESTADO_FALLIDO)
+        finally:
+            trabajo.descargador = None
+            with self.lock:
+                self.activos.discard(trabajo.id)
+                self.postprocesando.discard(trabajo.id)
+                self.cambio.notify_all()
+            self.procesar_cola()
+    
+    def liberar_turno(self, trabajo):
+        """El trabajo paso a la etapa de postprocesado: su turno de descarga pasa al siguiente pendiente"""
+        with self.lock:
+            if trabajo.id not in self.activos:
+                return
+            self.activos.discard(trabajo.id)
+            self.postprocesando.add(trabajo.id)
+        self.procesar_cola()
+    
+    def reintentar(self, trabajo, error_msg):
+        """Vuelve a encolar una entrada de lista que fallo por un error pasajero.
+        
+        La espera crece con cada intento y no ocupa un hilo: las demas entradas siguen
+        descargandose mientras tanto.
+        """
+        if trabajo.padre is None or es_error_permanente(error_msg):
+            return False
+        if trabajo.intentos >= self.config.get('reintentos_entradas', 2):
+            return False
+        trabajo.intentos += 1
+        espera = min(60, 5 * 2 ** (trabajo.intentos - 1))
+        trabajo.mensaje = f"Reintentando en {espera} s ({trabajo.intentos}/{self.config.get('reintentos_entradas', 2)})"
+        trabajo.progreso = None
+        with self.lock:
+            self.reintentos_pendientes += 1
+        self.cambiar_estado(trabajo, ESTADO_EN_COLA)
+        temporizador = threading.Timer(espera, self.reencolar, args=(trabajo,))
+        temporizador.daemon = True
+        temporizador.start()
+        return True
+    
+    def reencolar(self, trabajo):
+        with self.lock:
+            self.reintentos_pendientes -= 1
+            if not trabajo.cancelado:
+                self.pendientes.append(trabajo.id)
+            self.cambio.notify_all()
+        if trabajo.cancelado:
+            trabajo.mensaje = "Cancelada"
+            self.cambiar_estado(trabajo, ESTADO_CANCELADO)
+        self.procesar_cola()
+    
+    def cancelar(self, id_trabajo):
+        """Cancela un trabajo y, si es una lista, las entradas que genero. Retorna False si ya termino"""
+        with self.lock:
+            trabajo = self.trabajos.get(id_trabajo)
+            if trabajo is None or trabajo.terminado():
+                return False
+            hijos = [t.id for t in self.trabajos.values() if t.padre == id_trabajo]
+            trabajo.cancelado = True
+            en_cola = id_trabajo in self.pendientes
+            if en_cola:
+                self.pendientes.remove(id_trabajo)
+                self.cambio.notify_all()
+        if en_cola:
+            trabajo.mensaje = "Cancelada"
+            self.cambiar_estado(trabajo, ESTADO_CANCELADO)
+        elif trabajo.descargador is not None:
+            # El hilo del trabajo lo marca como cancelado cuando yt-dlp se detiene
+            trabajo.descargador.cancelar()
+            self.actualizar_mensaje(trabajo, "Cancelando...")
+        for id_hijo in hijos:
+            self.cancelar(id_hijo)
+        return True
+    
+    def cambiar_prioridad(self, id_trabajo, prioridad=None, peso=None):
+        """Cambia la prioridad o el peso de un trabajo; si esta descargando se aplica al momento"""
+        trabajo = self.trabajos.get(id_trabajo)
+        if trabajo is None:
+            return
+        if prioridad is not None:
+            trabajo.prioridad = prioridad
+        if peso is not None:
+            trabajo.peso = peso
+        descargador = trabajo.descargador
+        participacion = descargador.participacion if descargador is not None else None
+        if participacion is not None:
+            self.presupuesto.cambiar_prioridad(participacion, prioridad, peso)
+        self.al_actualizar(trabajo)
+    
+    def aplicar_configuracion(self):
+        """Aplica a las descargas en curso los cambios de configuracion que no requieren reiniciarlas"""
+        self.presupuesto.cambiar_limite(limite_desde_config(self.config))
+        self.cookies.ttl = self.config.get('cookies_ttl_minutos', 30) * 60
+        self.procesar_cola()
+    
+    def formato_elegido(self, trabajo, info):
+        """yt-dlp eligio formato y archivo: se anotan para poder reanudar esa misma descarga"""
+        trabajo.formato_elegido = info.get('format_id')
+        trabajo.archivo = info.get('_filename') or info.get('filepath')
+        if self.diario is not None:
+            self.diario.guardar(trabajo)
+    
+    def cambiar_estado(self, trabajo, estado):
+        trabajo.estado = estado
+        if trabajo.terminado():
+            with self.lock:
+                if self.en_curso.get(trabajo.identidad) == trabajo.id:
+                    del self.en_curso[trabajo.identidad]
+        if self.diario is not None:
+            if trabajo.terminado():
+                self.diario.eliminar(trabajo.clave)
+            else:
+                self.diario.actualizar(trabajo, forzar=True)
+        self.al_actualizar(trabajo)
+    
+    def actualizar_mensaje(self, trabajo, mensaje, datos=None):
+        trabajo.mensaje = mensaje
+        if datos is not None:
+            trabajo.progreso = datos
+            if self.diario is not None:
+                self.diario.actualizar(trabajo)
+        self.al_actualizar(trabajo)
+    
+    def num_activos(self):
+        with self.lock:
+            return len(self.activos) + len(self.postprocesando) + len(self.pendientes) + self.reintentos_pendientes
+    
+    def esperar(self):
+        """Bloquea hasta que no queden trabajos pendientes ni en curso"""
+        with self.lock:
+            while self.activos or self.postprocesando or self.pendientes or self.reintentos_pendientes:
+                self.cambio.wait()
+    
+    def cerrar(self):
+        """Libera las sesiones de yt-dlp y la cache; llamar al salir"""
+        if self.sesiones is not None:
+            self.sesiones.cerrar()
+        if self.cache is not None:
+            self.cache.cerrar()
+        if self.historial is not None:
+            self.historial.cerrar()
+        if self.limitador_hosts is not None:
+            self.limitador_hosts.cerrar()
+        if self.diario is not None:
+            self.diario.cerrar()
+    
+    def limpiar_terminados(self):
+        with self.lock:
+            terminados = [id_trabajo for id_trabajo, t in self.trabajos.items() if t.terminado()]
+            for id_trabajo in terminados:
+                del self.trabajos[id_trabajo]
+            if terminados:
+                # Los ids no se reutilizan: una lista ya limpiada no vuelve a expandirse con el mismo id
+                limpiados = set(terminados)
+                self.hijos = {(padre, url) for padre, url in self.hijos if padre not in limpiados}
+        return terminados
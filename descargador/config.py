@@ -0,0 +1,67 @@
+"""Carga y guardado de la configuracion compartida por la GUI y la linea de comandos"""
+import json
+from pathlib import Path
+
+CONFIG_FILE = Path.home() / ".3ox_downloader_config.json"
+
+# Caches, indices e historial que la aplicacion guarda entre ejecuciones
+DIRECTORIO_DATOS = Path.home() / ".3ox_downloader"
+
+CARPETA_POR_DEFECTO = str(Path.home() / "Downloads" / "Videos")
+
+CONFIG_POR_DEFECTO = {
+    'hilos': 16,
+    'ffmpeg_path': '',
+    'limite_enabled': False,
+    'limite_mbps': 10,
+    'cookies_browser': 'Ninguno',
+    'tema': 'Azul',
+    'descargas_simultaneas': 3,
+    'cache_info': True,
+    'cache_info_ttl_horas': 6,
+    'cache_info_max_mb': 200,
+    'reutilizar_sesiones': True,
+    'progreso_hz': 4,
+    'historial': True,
+    'reintentos_entradas': 2,
+    'limitador_adaptativo': True,
+    'peticiones_por_segundo': 20,
+    'reanudar_trabajos': True,
+    'autoajuste_hilos': True,
+    'hilos_max': 64,
+    'nivel_log': 'INFO',
+    'cookies_ttl_minutos': 30,
+    'cache_cookies_disco': False,
+    'log_archivo': True,
+    'audio_original': False,
+    'audio_contenedores': ['m4a', 'webm', 'opus', 'ogg', 'mp3'],
+    'recodificaciones_simultaneas': 0,
+    'postprocesos_simultaneos': 0,
+    'postprocesos_en_espera': 0,
+    'servicio_puerto': 8765,
+    'usar_servicio': True,
+    'iniciar_servicio': False,
+    'carpeta_temporal': '',
+    'temporal_libre_minimo_mb': 1024,
+    'sobrescribir': False,
+    'conexiones_por_archivo': 8
+}
+
+def cargar_configuracion(config_file=CONFIG_FILE):
+    """Retorna la configuracion por defecto actualizada con la del archivo, si existe"""
+    config = dict(CONFIG_POR_DEFECTO)
+    config_file = Path(config_file)
+    
+    if config_file.exists():
+        try:
+            with open(config_file, 'r') as f:
+                loaded_config = json.load(f)
+                config.update(loaded_config)
+        except:
+            pass
+    
+    return config
+
+def guardar_configuracion(config, config_file=CONFIG_FILE):
+    with open(config_file, 'w') as f:
+        json.dump(config, f, indent=4)
@@ -0,0 +1,125 @@
+"""Decide si el archivo final necesita remux (copia de streams) o recodificacion
+
+Antes se pasaba siempre por FFmpegVideoConvertor. Ahora:
+  - si el archivo ya esta en el contenedor destino no se toca
+  - si sus codecs caben en el contenedor destino se remuxa con -c copy
+  - solo se recodifica cuando algun codec no cabe
+"""
+import json
+import logging
+import subprocess
+
+from .ffmpeg import tiene_muxer
+
+log = logging.getLogger(__name__)
+
+ACCION_NINGUNA = "ninguna"
+ACCION_REMUX = "remux"
+ACCION_RECODIFICAR = "recodificar"
+
+ETIQUETAS_ACCION = {
+    ACCION_NINGUNA: "sin cambios de contenedor",
+    ACCION_REMUX: "remux sin recodificar",
+    ACCION_RECODIFICAR: "recodificado",
+}
+
+CODECS_COMPATIBLES = {
+    'mp4': {
+        'video': {'avc1', 'avc3', 'h264', 'hev1', 'hvc1', 'h265', 'hevc', 'av01', 'av1', 'vp09', 'vp9', 'mp4v', 'mpeg4'},
+        'audio': {'mp4a', 'aac', 'mp3', 'opus', 'flac', 'ac-3', 'ac3', 'ec-3', 'eac3', 'alac'},
+    },
+}
+
+def codec_base(codec):
+    """'avc1.640028' -> 'avc1'; None/'none' -> None"""
+    if not codec or codec == 'none':
+        return None
+    return codec.lower().split('.')[0]
+
+def codecs_de_info(info):
+    """Codecs (video, audio) que yt-dlp conoce para el archivo final"""
+    video = codec_base(info.get('vcodec'))
+    audio = codec_base(info.get('acodec'))
+    for formato in info.get('requested_formats') or []:
+        video = video or codec_base(formato.get('vcodec'))
+        audio = audio or codec_base(formato.get('acodec'))
+    return video, audio
+
+def codecs_con_ffprobe(ruta_archivo, ffprobe):
+    """Codecs leidos del archivo cuando el extractor no los informa"""
+    resultado = subprocess.run(
+        [ffprobe, '-v', 'error', '-show_entries', 'stream=codec_type,codec_name', '-of', 'json', ruta_archivo],
+        capture_output=True, text=True, timeout=30
+    )
+    video = audio = None
+    if resultado.returncode == 0:
+        for stream in json.loads(resultado.stdout).get('streams', []):
+            if stream.get('codec_type') == 'video' and video is None:
+                video = codec_base(stream.get('codec_name'))
+            elif stream.get('codec_type') == 'audio' and audio is None:
+                audio = codec_base(stream.get('codec_name'))
+    return video, audio
+
+def decidir(info, destino='mp4', ffprobe=None):
+    """Retorna (accion, motivo) para llevar el archivo de info al contenedor destino"""
+    if info.get('ext') == destino:
+        return ACCION_NINGUNA, f"ya es {destino}"
+    
+    video, audio = codecs_de_info(info)
+    if video is None and audio is None and ffprobe and info.get('filepath'):
+        try:
+            video, audio = codecs_con_ffprobe(info['filepath'], ffprobe)
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            log.warning("ffprobe no pudo leer los codecs: %s", e)
+    
+    if video is None and audio is None:
+        return ACCION_RECODIFICAR, "codecs desconocidos"
+    
+    compatibles = CODECS_COMPATIBLES.get(destino, {})
+    for tipo, codec in (('video', video), ('audio', audio)):
+        permitidos = compatibles.get(tipo)
+        if codec is not None and permitidos and codec not in permitidos:
+            return ACCION_RECODIFICAR, f"{codec} no cabe en {destino}"
+    
+    return ACCION_REMUX, f"{video or '-'}/{audio or '-'} caben en {destino}"
+
+_clase_pp = None
+
+def crear_pp_contenedor(ydl, destino, ffmpeg=None):
+    """Postprocesador de yt-dlp que aplica decidir() y delega en el remuxer o el convertidor.
+    
+    ffmpeg: datos de obtener_ffmpeg(), o None si no se encontro
+    """
+    global _clase_pp
+    if _clase_pp is None:
+        from yt_dlp.postprocessor import PostProcessor, FFmpegVideoRemuxerPP, FFmpegVideoConvertorPP
+        from yt_dlp.utils import PostProcessingError
+        
+        class ContenedorPP(PostProcessor):
+            def __init__(self, downloader, destino, ffmpeg=None):
+                super().__init__(downloader)
+                self.destino = destino
+                self.ffmpeg = ffmpeg
+            
+            def run(self, info):
+                ffprobe = self.ffmpeg['ffprobe'] if self.ffmpeg else None
+                accion, motivo = decidir(info, self.destino, ffprobe)
+                self.to_screen(f"{ETIQUETAS_ACCION[accion]} ({motivo})")
+                if accion != ACCION_NINGUNA and self.ffmpeg and not tiene_muxer(self.ffmpeg, self.destino):
+                    raise PostProcessingError(
+                        f"El FFmpeg de {self.ffmpeg['ruta']} no incluye el muxer {self.destino}: "
+                        f"no se puede pasar el archivo a {self.destino}"
+                    )
+                
+                archivos_borrar = []
+                if accion == ACCION_REMUX:
+                    archivos_borrar, info = FFmpegVideoRemuxerPP(self._downloader, self.destino).run(info)
+                elif accion == ACCION_RECODIFICAR:
+                    archivos_borrar, info = FFmpegVideoConvertorPP(self._downloader, self.destino).run(info)
+                
+                info['decision_contenedor'] = {'accion': accion, 'motivo': motivo}
+                return archivos_borrar, info
+        
+        _clase_pp = ContenedorPP
+    
+    return _clase_pp(ydl, destino, ffmpeg)
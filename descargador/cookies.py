@@ -0,0 +1,250 @@
+"""Cookies compartidas por todas las descargas
+
+Con cookies_browser cada trabajo pasaba cookiesfrombrowser a yt-dlp, que abre,
+copia y descifra la base de datos del navegador en cada descarga (segundos con
+perfiles grandes de Chrome, y a veces falla porque el navegador la tiene
+bloqueada). AlmacenCookies carga las cookies una vez en un jar en memoria que
+comparten todos los YoutubeDL, y lo recarga cuando cambia la base de datos del
+navegador (o el cookies.txt) o cuando vence el TTL.
+
+Como el jar compartido reemplaza a cookiefile, yt-dlp ya no guarda en
+cookies.txt las cookies que renuevan los sitios: lo hace guardar() al terminar
+cada descarga, solo si el jar salio de ese archivo y cambio.
+
+Opcionalmente (cache_cookies_disco) el jar descifrado se guarda en
+~/.3ox_downloader/cookies_cache.txt, legible solo por el usuario, para no
+descifrar de nuevo al abrir la aplicacion mientras el navegador no cambie.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+
+from .config import DIRECTORIO_DATOS
+
+log = logging.getLogger(__name__)
+
+# cookies.txt junto al programa, como siempre
+ARCHIVO_TXT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cookies.txt')
+ARCHIVO_CACHE = DIRECTORIO_DATOS / "cookies_cache.txt"
+# Como mucho una comprobacion de mtime cada tantos segundos
+INTERVALO_COMPROBACION = 10
+# Tras un fallo al leer el navegador no se reintenta hasta pasado este tiempo
+ESPERA_TRAS_FALLO = 60
+
+class LoggerCookies:
+    """Logger para yt-dlp que ademas anota de que archivo se leyeron las cookies"""
+    def __init__(self):
+        self.base_datos = None
+    
+    def debug(self, msg):
+        log.debug(msg)
+    
+    def info(self, msg):
+        coincidencia = re.search(r'Extracting cookies from: "(.+)"', msg)
+        if coincidencia:
+            self.base_datos = coincidencia.group(1)
+        log.debug(msg)
+    
+    def warning(self, msg, only_once=False):
+        log.warning(msg)
+    
+    def error(self, msg):
+        log.error(msg)
+
+def mtime(ruta):
+    """Ultima modificacion del archivo (y de su -wal si es SQLite), o None"""
+    if not ruta:
+        return None
+    tiempos = []
+    for archivo in (ruta, f"{ruta}-wal"):
+        try:
+            tiempos.append(os.stat(archivo).st_mtime_ns)
+        except OSError:
+            pass
+    return max(tiempos) if tiempos else None
+
+def huella_jar(jar):
+    """Contenido del jar, para saber si cambio desde que se leyo"""
+    with jar._cookies_lock:
+        return hash(tuple(sorted((c.domain, c.path, c.name, c.value or '', c.expires or 0) for c in jar)))
+
+class AlmacenCookies:
+    def __init__(self, ttl=1800, cache_disco=False, archivo_txt=ARCHIVO_TXT, archivo_cache=ARCHIVO_CACHE):
+        self.ttl = ttl
+        self.cache_disco = cache_disco
+        self.archivo_txt = archivo_txt
+        self.archivo_cache = archivo_cache
+        self.lock = threading.Lock()
+        self.jar = None
+        # 'archivo' o el nombre del navegador; version cambia con cada recarga
+        self.origen = None
+        self.version = 0
+        self.base_datos = None
+        self.mtime_origen = None
+        self.cargado = 0.0
+        self.comprobado = 0.0
+        self.ultimo = None
+        self.fallo = None
+        # Huella del jar tal como esta en cookies.txt (ver guardar)
+        self.huella_txt = None
+    
+    def obtener(self, navegador='Ninguno'):
+        """(jar, origen) para la configuracion actual.
+        
+        (None, None) si no hay cookies configuradas; (None, navegador) si no se
+        pudo leer el navegador y debe intentarlo yt-dlp con cookiesfrombrowser.
+        """
+        navegador = (navegador or 'Ninguno').lower()
+        with self.lock:
+            ahora = time.monotonic()
+            if self.ultimo is not None and self.ultimo[0] == navegador and ahora - self.comprobado < INTERVALO_COMPROBACION:
+                return self.ultimo[1]
+            self.comprobado = ahora
+            
+            if os.path.exists(self.archivo_txt):
+                resultado = self.usar_txt(ahora)
+            elif navegador == 'ninguno':
+                self.olvidar()
+                resultado = (None, None)
+            else:
+                resultado = self.usar_navegador(navegador, ahora)
+            self.ultimo = (navegador, resultado)
+            return resultado
+    
+    def identificador(self):
+        """Distingue cada carga del jar: las sesiones de yt-dlp no se reutilizan entre versiones"""
+        return f"{self.origen}#{self.version}"
+    
+    def olvidar(self):
+        self.jar = None
+        self.origen = None
+        self.base_datos = None
+    
+    def vigente(self, origen, mtime_actual, ahora):
+        return (self.jar is not None and self.origen == origen and mtime_actual == self.mtime_origen
+                and ahora - self.cargado < self.ttl)
+    
+    def reemplazar(self, jar, origen, base_datos, mtime_actual, ahora):
+        self.jar = jar
+        self.origen = origen
+        self.base_datos = base_datos
+        self.mtime_origen = mtime_actual
+        self.cargado = ahora
+        self.version += 1
+    
+    def usar_txt(self, ahora):
+        mtime_actual = mtime(self.archivo_txt)
+        if not self.vigente('archivo', mtime_actual, ahora):
+            from yt_dlp.cookies import YoutubeDLCookieJar
+            jar = YoutubeDLCookieJar(self.archivo_txt)
+            try:
+                jar.load(ignore_discard=True, ignore_expires=True)
+            except Exception as e:
+                log.warning("No se pudo leer %s: %s", self.archivo_txt, e)
+                self.olvidar()
+                return None, None
+            log.info("Cookies cargadas de %s (%s cookies)", self.archivo_txt, len(jar))
+            self.reemplazar(jar, 'archivo', self.archivo_txt, mtime_actual, ahora)
+            self.huella_txt = huella_jar(jar)
+        return self.jar, self.identificador()
+    
+    def guardar(self):
+        """Escribe el jar en cookies.txt si se cargo de ahi y los sitios renovaron alguna cookie.
+        
+        El archivo se reemplaza de forma atomica conservando sus permisos, y su nuevo
+        mtime se da por conocido para no recargar lo que se acaba de escribir.
+        """
+        with self.lock:
+            if self.jar is None or self.origen != 'archivo':
+                return
+            huella = huella_jar(self.jar)
+            if huella == self.huella_txt:
+                return
+            temporal = f"{self.archivo_txt}.tmp"
+            try:
+                with self.jar._cookies_lock:
+                    self.jar.save(temporal, ignore_discard=True, ignore_expires=True)
+                shutil.copymode(self.archivo_txt, temporal)
+                os.replace(temporal, self.archivo_txt)
+            except OSError as e:
+                log.warning("No se pudieron guardar las cookies en %s: %s", self.archivo_txt, e)
+                return
+            self.huella_txt = huella
+            self.mtime_origen = mtime(self.archivo_txt)
+            log.debug("Cookies renovadas guardadas en %s", self.archivo_txt)
+    
+    def usar_navegador(self, navegador, ahora):
+        # Si el navegador cambia, la base de datos conocida ya no sirve
+        base_datos = self.base_datos if self.origen == navegador else None
+        mtime_actual = mtime(base_datos)
+        if self.vigente(navegador, mtime_actual, ahora):
+            return self.jar, self.identificador()
+        
+        if self.jar is None and self.cache_disco and self.leer_cache(navegador, ahora):
+            return self.jar, self.identificador()
+        
+        if self.fallo is not None and self.fallo[0] == navegador and ahora - self.fallo[1] < ESPERA_TRAS_FALLO:
+            return (self.jar, self.identificador()) if self.origen == navegador else (None, navegador)
+        
+        from yt_dlp.cookies import extract_cookies_from_browser
+        logger = LoggerCookies()
+        inicio = time.perf_counter()
+        try:
+            jar = extract_cookies_from_browser(navegador, logger=logger)
+        except Exception as e:
+            self.fallo = (navegador, ahora)
+            if self.origen == navegador:
+                # Mejor las cookies anteriores que ninguna (p. ej. la base de datos esta bloqueada)
+                log.warning("No se pudieron recargar las cookies de %s, se siguen usando las anteriores: %s", navegador, e)
+                return self.jar, self.identificador()
+            log.warning("No se pudieron leer las cookies de %s: %s", navegador, e)
+            return None, navegador
+        self.fallo = None
+        log.info("Cookies de %s cargadas en %.1f s (%s cookies)", navegador, time.perf_counter() - inicio, len(jar))
+        self.reemplazar(jar, navegador, logger.base_datos, mtime(logger.base_datos), ahora)
+        if self.cache_disco:
+            self.guardar_cache()
+        return self.jar, self.identificador()
+    
+    def leer_cache(self, navegador, ahora):
+        """Carga el jar guardado si es de este navegador, su base de datos no cambio y no vencio"""
+        try:
+            with open(self.archivo_cache.with_suffix('.json'), 'r') as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            return False
+        edad = time.time() - datos.get('guardado', 0)
+        if datos.get('navegador') != navegador or edad > self.ttl or mtime(datos.get('base_datos')) != datos.get('mtime'):
+            return False
+        
+        from yt_dlp.cookies import YoutubeDLCookieJar
+        jar = YoutubeDLCookieJar(str(self.archivo_cache))
+        try:
+            jar.load(ignore_discard=True, ignore_expires=True)
+        except Exception as e:
+            log.warning("Cache de cookies ilegible, se leen del navegador: %s", e)
+            return False
+        log.info("Cookies de %s cargadas de la cache en disco (%s cookies)", navegador, len(jar))
+        self.reemplazar(jar, navegador, datos.get('base_datos'), datos.get('mtime'), ahora - edad)
+        return True
+    
+    def guardar_cache(self):
+        """Llamar con el lock tomado. El archivo se crea con permisos 0600"""
+        try:
+            self.archivo_cache.parent.mkdir(parents=True, exist_ok=True)
+            temporal = self.archivo_cache.with_suffix('.tmp')
+            os.close(os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))
+            self.jar.save(str(temporal), ignore_discard=True, ignore_expires=True)
+            os.replace(temporal, self.archivo_cache)
+            datos = {'navegador': self.origen, 'base_datos': self.base_datos,
+                     'mtime': self.mtime_origen, 'guardado': time.time()}
+            temporal = self.archivo_cache.with_suffix('.json.tmp')
+            with open(temporal, 'w') as f:
+                json.dump(datos, f)
+            os.replace(temporal, self.archivo_cache.with_suffix('.json'))
+        except OSError as e:
+            log.warning("No se pudo guardar la cache de cookies: %s", e)
@@ -0,0 +1,131 @@
+"""Diario persistente de trabajos sin terminar
+
+Cada trabajo de la cola se anota en SQLite (cada escritura es una transaccion,
+asi que un cierre o un fallo a mitad nunca deja el diario a medias): opciones
+de la descarga, formato elegido por yt-dlp, archivo de salida y progreso. Los
+trabajos terminados se borran del diario.
+
+Al volver a abrir la aplicacion los trabajos que quedaron se vuelven a encolar
+con el mismo formato y el mismo archivo de salida, asi yt-dlp continua desde
+los .part (y el indice de fragmentos .ytdl) en lugar de empezar de cero.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from .config import DIRECTORIO_DATOS
+
+# El progreso se anota como mucho cada INTERVALO_PROGRESO segundos por trabajo
+INTERVALO_PROGRESO = 2.0
+
+COLUMNAS = (
+    'clave', 'url', 'carpeta', 'formato', 'calidad', 'prioridad', 'peso', 'padre',
+    'estado', 'formato_elegido', 'archivo', 'descargado', 'total', 'fragmento',
+    'fragmentos', 'creado', 'actualizado'
+)
+
+class DiarioTrabajos:
+    def __init__(self, ruta=None):
+        self.ruta = ruta or (DIRECTORIO_DATOS / "trabajos.sqlite3")
+        self.lock = threading.Lock()
+        self.conexion = None
+        self.ultimo_progreso = {}
+    
+    def conectar(self):
+        if self.conexion is None:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            self.conexion = sqlite3.connect(str(self.ruta), check_same_thread=False)
+            self.conexion.execute("PRAGMA journal_mode=WAL")
+            self.conexion.execute(
+                "CREATE TABLE IF NOT EXISTS trabajos ("
+                " clave TEXT PRIMARY KEY, url TEXT, carpeta TEXT, formato TEXT, calidad TEXT,"
+                " prioridad INTEGER, peso REAL, padre TEXT, estado TEXT, formato_elegido TEXT,"
+                " archivo TEXT, descargado INTEGER, total INTEGER, fragmento INTEGER,"
+                " fragmentos INTEGER, creado REAL, actualizado REAL)"
+            )
+        return self.conexion
+    
+    def guardar(self, trabajo):
+        """Anota (o reemplaza) el trabajo completo"""
+        progreso = trabajo.progreso or {}
+        fila = (
+            trabajo.clave, trabajo.url, trabajo.carpeta, trabajo.formato, json.dumps(trabajo.calidad),
+            trabajo.prioridad, trabajo.peso, trabajo.clave_padre, trabajo.estado, trabajo.formato_elegido,
+            trabajo.archivo, progreso.get('descargado'), progreso.get('total'),
+            progreso.get('fragmento'), progreso.get('fragmentos'), trabajo.creado, time.time()
+        )
+        with self.lock:
+            conexion = self.conectar()
+            with conexion:
+                conexion.execute(
+                    f"INSERT OR REPLACE INTO trabajos ({', '.join(COLUMNAS)}) "
+                    f"VALUES ({', '.join('?' * len(COLUMNAS))})", fila
+                )
+    
+    def actualizar(self, trabajo, forzar=False):
+        """Anota el estado y el progreso; sin forzar, como mucho cada INTERVALO_PROGRESO segundos"""
+        ahora = time.monotonic()
+        if not forzar and ahora - self.ultimo_progreso.get(trabajo.clave, 0) < INTERVALO_PROGRESO:
+            return
+        self.ultimo_progreso[trabajo.clave] = ahora
+        progreso = trabajo.progreso or {}
+        with self.lock:
+            conexion = self.conectar()
+            with conexion:
+                conexion.execute(
+                    "UPDATE trabajos SET estado = ?, descargado = ?, total = ?, fragmento = ?,"
+                    " fragmentos = ?, actualizado = ? WHERE clave = ?",
+                    (trabajo.estado, progreso.get('descargado'), progreso.get('total'),
+                     progreso.get('fragmento'), progreso.get('fragmentos'), time.time(), trabajo.clave)
+                )
+    
+    def eliminar(self, clave):
+        self.ultimo_progreso.pop(clave, None)
+        with self.lock:
+            conexion = self.conectar()
+            with conexion:
+                conexion.execute("DELETE FROM trabajos WHERE clave = ?", (clave,))
+    
+    def pendientes(self):
+        """Trabajos sin terminar, en el orden en que se encolaron"""
+        with self.lock:
+            filas = self.conectar().execute(
+                f"SELECT {', '.join(COLUMNAS)} FROM trabajos ORDER BY creado"
+            ).fetchall()
+        pendientes = []
+        for fila in filas:
+            datos = dict(zip(COLUMNAS, fila))
+            datos['calidad'] = json.loads(datos['calidad'] or '{}')
+            pendientes.append(datos)
+        return pendientes
+    
+    def cerrar(self):
+        with self.lock:
+            if self.conexion is not None:
+                self.conexion.close()
+                self.conexion = None
+
+_clase_pp = None
+# Nombre con el que yt-dlp informa de este postprocesador en los postprocessor_hooks
+NOMBRE_PP_FORMATO = 'FormatoElegido'
+
+def crear_pp_formato_elegido(ydl):
+    """Postprocesador 'before_dl' que avisa del formato y archivo elegidos antes de descargar.
+    
+    Llama a params['al_elegir_formato'](info) del YoutubeDL, que cambia con cada trabajo.
+    """
+    global _clase_pp
+    if _clase_pp is None:
+        from yt_dlp.postprocessor import PostProcessor
+        
+        class FormatoElegidoPP(PostProcessor):
+            def run(self, info):
+                aviso = self._downloader.params.get('al_elegir_formato')
+                if aviso is not None:
+                    aviso(info)
+                return [], info
+        
+        _clase_pp = FormatoElegidoPP
+    
+    return _clase_pp(ydl)
@@ -0,0 +1,163 @@
+"""Deteccion de FFmpeg/ffprobe y de sus capacidades (muxers y encoders)
+
+La busqueda y el sondeo se hacen una sola vez por ruta configurada. El
+resultado se guarda en disco, indexado por la ruta del binario y su fecha de
+modificacion, asi que solo se vuelve a lanzar ffmpeg cuando el binario cambia.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+
+from .config import DIRECTORIO_DATOS
+
+log = logging.getLogger(__name__)
+
+ARCHIVO_CACHE = DIRECTORIO_DATOS / "ffmpeg.json"
+
+CARPETAS_COMUNES = {
+    'win32': [r'C:\ffmpeg\bin', r'C:\Program Files\ffmpeg\bin', r'C:\ProgramData\chocolatey\bin'],
+    'darwin': ['/opt/homebrew/bin', '/usr/local/bin', '/opt/local/bin'],
+    'linux': ['/usr/bin', '/usr/local/bin', '/snap/bin'],
+}
+
+_sondeos = {}
+_lock = threading.Lock()
+
+def nombre_binario(nombre):
+    return f"{nombre}.exe" if sys.platform == 'win32' else nombre
+
+def candidatos(ruta_config):
+    """Rutas posibles de ffmpeg en orden de preferencia"""
+    if ruta_config:
+        if os.path.isfile(ruta_config):
+            yield ruta_config
+        # La ruta configurada suele ser de Windows (ffmpeg.exe) aunque se use en otro sistema
+        for nombre in (nombre_binario('ffmpeg'), 'ffmpeg.exe', 'ffmpeg'):
+            yield os.path.join(ruta_config, nombre)
+    en_path = shutil.which('ffmpeg')
+    if en_path:
+        yield en_path
+    plataforma = 'linux' if sys.platform.startswith('linux') else sys.platform
+    for carpeta in CARPETAS_COMUNES.get(plataforma, []):
+        yield os.path.join(carpeta, nombre_binario('ffmpeg'))
+
+def buscar_ffmpeg(ruta_config=''):
+    for ruta in candidatos(ruta_config):
+        if os.path.isfile(ruta) and os.access(ruta, os.X_OK):
+            return os.path.abspath(ruta)
+    return None
+
+def buscar_ffprobe(ruta_ffmpeg):
+    carpeta = os.path.dirname(ruta_ffmpeg)
+    for nombre in (nombre_binario('ffprobe'), 'ffprobe.exe', 'ffprobe'):
+        ruta = os.path.join(carpeta, nombre)
+        if os.path.isfile(ruta):
+            return ruta
+    return shutil.which('ffprobe')
+
+def ejecutar(ruta, *args):
+    resultado = subprocess.run(
+        [ruta, '-hide_banner', *args], capture_output=True, text=True, timeout=10
+    )
+    return resultado.stdout if resultado.returncode == 0 else ""
+
+def leer_lista(salida, columna_flags):
+    """Nombres de la tabla que imprime 'ffmpeg -muxers' / '-encoders' (despues de la linea --)"""
+    nombres = []
+    en_tabla = False
+    for linea in salida.splitlines():
+        if linea.strip().startswith('--'):
+            en_tabla = True
+            continue
+        partes = linea.split()
+        if en_tabla and len(partes) > columna_flags:
+            nombres.append(partes[columna_flags])
+    return nombres
+
+def sondear(ruta_ffmpeg):
+    """Version, muxers y encoders del binario (lanza ffmpeg tres veces)"""
+    version = ejecutar(ruta_ffmpeg, '-version')
+    coincidencia = re.search(r'ffmpeg version (\S+)', version)
+    return {
+        'ruta': ruta_ffmpeg,
+        'carpeta': os.path.dirname(ruta_ffmpeg),
+        'ffprobe': buscar_ffprobe(ruta_ffmpeg),
+        'version': coincidencia.group(1) if coincidencia else None,
+        'muxers': leer_lista(ejecutar(ruta_ffmpeg, '-muxers'), 1),
+        'encoders': leer_lista(ejecutar(ruta_ffmpeg, '-encoders'), 1),
+    }
+
+def clave_binario(ruta):
+    estado = os.stat(ruta)
+    return f"{ruta}|{estado.st_mtime_ns}|{estado.st_size}"
+
+def leer_cache_disco():
+    try:
+        with open(ARCHIVO_CACHE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def guardar_cache_disco(cache):
+    try:
+        ARCHIVO_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        temporal = ARCHIVO_CACHE.with_suffix('.tmp')
+        with open(temporal, 'w') as f:
+            json.dump(cache, f, indent=4)
+        os.replace(temporal, ARCHIVO_CACHE)
+    except OSError as e:
+        log.warning("No se pudo guardar la cache de FFmpeg: %s", e)
+
+def obtener_ffmpeg(ruta_config='', forzar=False):
+    """Datos de FFmpeg para la ruta configurada, o None si no se encuentra.
+    
+    Solo la primera llamada por ruta hace trabajo real; las siguientes son gratis.
+    """
+    with _lock:
+        if not forzar and ruta_config in _sondeos:
+            return _sondeos[ruta_config]
+        
+        ruta = buscar_ffmpeg(ruta_config)
+        if ruta is None:
+            log.warning("FFmpeg no encontrado. Los videos pueden estar corruptos.")
+            _sondeos[ruta_config] = None
+            return None
+        
+        cache = leer_cache_disco()
+        clave = clave_binario(ruta)
+        info = cache.get(clave)
+        if info is None or forzar:
+            try:
+                info = sondear(ruta)
+            except (OSError, subprocess.SubprocessError) as e:
+                log.warning("No se pudo ejecutar FFmpeg en %s: %s", ruta, e)
+                _sondeos[ruta_config] = None
+                return None
+            cache = {c: v for c, v in cache.items() if not c.startswith(f"{ruta}|")}
+            cache[clave] = info
+            guardar_cache_disco(cache)
+        
+        log.info("FFmpeg %s encontrado en: %s", info['version'], info['ruta'])
+        _sondeos[ruta_config] = info
+        return info
+
+def precargar_ffmpeg(ruta_config='', forzar=False):
+    """Sondea FFmpeg en segundo plano (al arrancar o al cambiar la configuracion)"""
+    hilo = threading.Thread(target=obtener_ffmpeg, args=(ruta_config, forzar), daemon=True)
+    hilo.start()
+    return hilo
+
+def tiene_encoder(info, nombre):
+    """False si el FFmpeg sondeado no trae el encoder; si la lista no se pudo leer se supone que si"""
+    encoders = info.get('encoders')
+    return not encoders or nombre in encoders
+
+def tiene_muxer(info, nombre):
+    """False si el FFmpeg sondeado no trae el muxer; si la lista no se pudo leer se supone que si"""
+    muxers = info.get('muxers')
+    return not muxers or nombre in muxers
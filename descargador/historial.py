@@ -0,0 +1,170 @@
+"""Historial persistente de descargas terminadas
+
+Cada descarga se registra por (extractor, id del video, perfil de formato). Antes
+de extraer se calcula el id a partir de la URL (sin red) y, si ya esta en el
+historial, el trabajo se omite. Las busquedas usan la clave primaria de SQLite,
+asi que siguen siendo instantaneas con cientos de miles de entradas.
+
+Las carpetas que ya tienen videos se pueden importar: los archivos con el id
+en el nombre ("Titulo [id].mp4", la plantilla habitual de yt-dlp) se registran
+por id y el resto por titulo y carpeta, que se comprueba justo antes de
+descargar. Un titulo solo cuenta para descargas a la carpeta donde estaba el
+archivo: dos videos distintos con un titulo comun ("Intro", "Trailer") no se
+confunden entre sitios ni entre carpetas.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from .config import DIRECTORIO_DATOS
+
+# Comodin para entradas importadas de las que no se conoce el extractor o el perfil
+CUALQUIERA = '*'
+
+EXTENSIONES_AUDIO = {'.mp3', '.m4a', '.opus', '.ogg', '.aac', '.flac', '.wav'}
+EXTENSIONES_VIDEO = {'.mp4', '.mkv', '.webm', '.mov', '.avi', '.flv'}
+
+PATRON_ID_NOMBRE = re.compile(r'\[([A-Za-z0-9_-]{6,})\]$')
+
+def normalizar_titulo(titulo):
+    """Titulo comparable con el nombre de archivo que genera yt-dlp (sin caracteres prohibidos)"""
+    titulo = unicodedata.normalize('NFKC', titulo).lower()
+    titulo = re.sub(r'[\\/:*?"<>|]', '', titulo)
+    return re.sub(r'\s+', ' ', titulo).strip()
+
+def tipo_perfil(perfil):
+    return perfil.split(':', 1)[0]
+
+def clave_carpeta(carpeta):
+    return os.path.normcase(os.path.abspath(carpeta))
+
+class HistorialDescargas:
+    def __init__(self, ruta=None):
+        self.ruta = ruta or (DIRECTORIO_DATOS / "historial.sqlite3")
+        self.lock = threading.Lock()
+        self.conexion = None
+    
+    def conectar(self):
+        if self.conexion is None:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            self.conexion = sqlite3.connect(str(self.ruta), check_same_thread=False)
+            self.conexion.execute("PRAGMA journal_mode=WAL")
+            self.conexion.execute(
+                "CREATE TABLE IF NOT EXISTS descargas ("
+                " extractor TEXT, id TEXT, perfil TEXT, titulo TEXT, ruta TEXT, fecha REAL,"
+                " PRIMARY KEY (id, extractor, perfil))"
+            )
+            columnas = [fila[1] for fila in self.conexion.execute("PRAGMA table_info(titulos)")]
+            anteriores = []
+            if columnas and 'carpeta' not in columnas:
+                # Historial de una version que no guardaba la carpeta: se deduce de la ruta
+                anteriores = self.conexion.execute("SELECT titulo, tipo, ruta FROM titulos").fetchall()
+                self.conexion.execute("DROP TABLE titulos")
+            self.conexion.execute(
+                "CREATE TABLE IF NOT EXISTS titulos ("
+                " titulo TEXT, tipo TEXT, carpeta TEXT, ruta TEXT, PRIMARY KEY (titulo, tipo, carpeta))"
+            )
+            if anteriores:
+                self.conexion.executemany(
+                    "INSERT OR IGNORE INTO titulos VALUES (?, ?, ?, ?)",
+                    [(titulo, tipo, clave_carpeta(os.path.dirname(ruta)), ruta) for titulo, tipo, ruta in anteriores]
+                )
+                self.conexion.commit()
+        return self.conexion
+    
+    def contiene(self, extractor, id_video, perfil):
+        if not id_video:
+            return False
+        with self.lock:
+            fila = self.conectar().execute(
+                "SELECT 1 FROM descargas WHERE id = ? AND extractor IN (?, ?) AND perfil IN (?, ?, ?) LIMIT 1",
+                (str(id_video), extractor, CUALQUIERA, perfil, tipo_perfil(perfil), CUALQUIERA)
+            ).fetchone()
+        return fila is not None
+    
+    def contiene_titulo(self, titulo, perfil, carpeta):
+        """True si se importo un archivo con ese titulo en carpeta, la de destino de la descarga"""
+        if not titulo:
+            return False
+        with self.lock:
+            fila = self.conectar().execute(
+                "SELECT 1 FROM titulos WHERE titulo = ? AND carpeta = ? AND tipo IN (?, ?) LIMIT 1",
+                (normalizar_titulo(titulo), clave_carpeta(carpeta), tipo_perfil(perfil), CUALQUIERA)
+            ).fetchone()
+        return fila is not None
+    
+    def registrar(self, extractor, id_video, perfil, titulo=None, ruta=None):
+        with self.lock:
+            conexion = self.conectar()
+            conexion.execute(
+                "INSERT OR REPLACE INTO descargas VALUES (?, ?, ?, ?, ?, ?)",
+                (extractor, str(id_video), perfil, titulo, ruta, time.time())
+            )
+            conexion.commit()
+    
+    def registrar_info(self, info, perfil):
+        """Registra un resultado de yt-dlp (video o lista con sus entradas descargadas)"""
+        if info.get('_type') == 'playlist':
+            for entrada in info.get('entries') or []:
+                if entrada:
+                    self.registrar_info(entrada, perfil)
+            return
+        if not info.get('id') or not info.get('extractor_key'):
+            return
+        descargas = info.get('requested_downloads') or []
+        ruta = descargas[-1].get('filepath') if descargas else info.get('filepath')
+        if ruta is None:
+            return
+        self.registrar(info['extractor_key'], info['id'], perfil, info.get('title'), ruta)
+    
+    def importar_carpeta(self, carpeta):
+        """Registra los videos y audios que ya hay en la carpeta. Retorna cuantos se importaron"""
+        filas_id = []
+        filas_titulo = []
+        for raiz, _, archivos in os.walk(carpeta):
+            for nombre in archivos:
+                base, extension = os.path.splitext(nombre)
+                extension = extension.lower()
+                if extension in EXTENSIONES_AUDIO:
+                    tipo = 'audio'
+                elif extension in EXTENSIONES_VIDEO:
+                    tipo = 'video'
+                else:
+                    continue
+                ruta = os.path.join(raiz, nombre)
+                coincidencia = PATRON_ID_NOMBRE.search(base)
+                if coincidencia:
+                    filas_id.append((CUALQUIERA, coincidencia.group(1), tipo, base, ruta, time.time()))
+                    base = base[:coincidencia.start()]
+                filas_titulo.append((normalizar_titulo(base), tipo, clave_carpeta(raiz), ruta))
+        
+        with self.lock:
+            conexion = self.conectar()
+            conexion.executemany("INSERT OR IGNORE INTO descargas VALUES (?, ?, ?, ?, ?, ?)", filas_id)
+            conexion.executemany("INSERT OR IGNORE INTO titulos VALUES (?, ?, ?, ?)", filas_titulo)
+            conexion.commit()
+        return len(filas_titulo)
+    
+    def importar_archivo_ytdlp(self, ruta):
+        """Importa un archivo de --download-archive de yt-dlp (lineas 'extractor id')"""
+        filas = []
+        with open(ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                partes = linea.split()
+                if len(partes) == 2:
+                    # yt-dlp guarda el extractor en minusculas, distinto de ie_key(); se usa el comodin
+                    filas.append((CUALQUIERA, partes[1], CUALQUIERA, None, None, time.time()))
+        with self.lock:
+            conexion = self.conectar()
+            conexion.executemany("INSERT OR IGNORE INTO descargas VALUES (?, ?, ?, ?, ?, ?)", filas)
+            conexion.commit()
+        return len(filas)
+    
+    def cerrar(self):
+        with self.lock:
+            if self.conexion is not None:
+                self.conexion.close()
+                self.conexion = None
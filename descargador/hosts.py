@@ -0,0 +1,185 @@
+"""Limite adaptativo de peticiones por host
+
+Cada host tiene un cubo de fichas (token bucket) con una tasa de peticiones por
+segundo. Mientras el host responde bien la tasa sube poco a poco hasta el
+maximo; un 429 (o un 403) la reduce a la mitad y abre un periodo de espera
+(Retry-After si el servidor lo indica). El estado se guarda en disco, asi que
+un host que nos limito sigue frenado en el siguiente trabajo y tras reiniciar.
+
+Sustituye a las esperas fijas de yt-dlp (sleep_interval): los hosts rapidos ya
+no esperan y los lentos no reciben peticiones hasta que nos bloquean.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .config import DIRECTORIO_DATOS
+
+log = logging.getLogger(__name__)
+
+ARCHIVO_ESTADO = DIRECTORIO_DATOS / "hosts.json"
+
+TASA_MINIMA = 0.2
+# Peticiones por segundo que se recuperan por cada respuesta correcta
+RECUPERACION = 0.25
+ESPERA_MAXIMA = 900
+INTERVALO_GUARDADO = 10
+
+def host_de(peticion):
+    """Host de una URL o de un objeto Request (de yt-dlp o de urllib)"""
+    url = peticion if isinstance(peticion, str) else getattr(peticion, 'url', None)
+    if url is None and hasattr(peticion, 'get_full_url'):
+        url = peticion.get_full_url()
+    return (urlsplit(url or '').hostname or '').lower()
+
+def datos_error_http(error):
+    """(status, segundos de Retry-After) de un HTTPError de yt-dlp o urllib; (None, None) si no lo es"""
+    status = getattr(error, 'status', None) or getattr(error, 'code', None)
+    if not isinstance(status, int):
+        return None, None
+    respuesta = getattr(error, 'response', None)
+    cabeceras = getattr(respuesta, 'headers', None) or getattr(error, 'headers', None) or {}
+    try:
+        retry_after = float(cabeceras.get('Retry-After'))
+    except (TypeError, ValueError):
+        retry_after = None
+    return status, retry_after
+
+class LimitadorHosts:
+    def __init__(self, tasa_maxima=20, archivo=ARCHIVO_ESTADO):
+        self.tasa_maxima = tasa_maxima
+        self.archivo = archivo
+        self.lock = threading.Lock()
+        self.hosts = self.leer()
+        self.ultimo_guardado = 0.0
+        self.cambios = False
+    
+    def leer(self):
+        try:
+            with open(self.archivo, 'r') as f:
+                hosts = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        ahora = time.time()
+        for estado in hosts.values():
+            estado['tokens'] = 0.0
+            estado['actualizado'] = ahora
+        return hosts
+    
+    def estado(self, host):
+        estado = self.hosts.get(host)
+        if estado is None:
+            estado = {
+                'tasa': float(self.tasa_maxima),
+                'tokens': float(self.tasa_maxima),
+                'actualizado': time.time(),
+                'enfriamiento_hasta': 0.0,
+                'penalizaciones': 0,
+            }
+            self.hosts[host] = estado
+        return estado
+    
+    def reservar(self, host):
+        """Toma una ficha del host y retorna los segundos que hay que esperar antes de la peticion"""
+        with self.lock:
+            estado = self.estado(host)
+            ahora = time.time()
+            capacidad = max(1.0, estado['tasa'])
+            transcurrido = max(0.0, ahora - estado['actualizado'])
+            estado['tokens'] = min(capacidad, estado['tokens'] + transcurrido * estado['tasa'])
+            estado['actualizado'] = ahora
+            estado['tokens'] -= 1
+            espera = max(0.0, estado['enfriamiento_hasta'] - ahora)
+            if estado['tokens'] < 0:
+                espera += -estado['tokens'] / estado['tasa']
+            return espera
+    
+    def espera_pendiente(self, host):
+        """Segundos de enfriamiento que le quedan al host (sin consumir fichas)"""
+        with self.lock:
+            estado = self.hosts.get(host)
+            return max(0.0, estado['enfriamiento_hasta'] - time.time()) if estado else 0.0
+    
+    def esperar(self, host):
+        espera = self.reservar(host)
+        if espera > 0:
+            time.sleep(espera)
+    
+    def exito(self, host):
+        with self.lock:
+            estado = self.estado(host)
+            if estado['tasa'] >= self.tasa_maxima:
+                return
+            estado['tasa'] = min(float(self.tasa_maxima), estado['tasa'] + RECUPERACION)
+            if estado['tasa'] >= self.tasa_maxima:
+                estado['penalizaciones'] = 0
+            self.cambios = True
+        self.guardar()
+    
+    def penalizar(self, host, status, retry_after=None):
+        """El host respondio 429/403: reduce su tasa a la mitad y abre un periodo de espera"""
+        with self.lock:
+            estado = self.estado(host)
+            estado['penalizaciones'] += 1
+            estado['tasa'] = max(TASA_MINIMA, estado['tasa'] / 2)
+            estado['tokens'] = 0.0
+            if retry_after is None:
+                base = 30 if status == 429 else 5
+                retry_after = base * 2 ** (estado['penalizaciones'] - 1)
+            espera = min(ESPERA_MAXIMA, retry_after)
+            estado['enfriamiento_hasta'] = max(estado['enfriamiento_hasta'], time.time() + espera)
+            self.cambios = True
+        log.warning("%s respondio %s: %.2f peticiones/s, esperando %.0f s", host, status, estado['tasa'], espera)
+        self.guardar(forzar=True)
+    
+    def envolver(self, ydl):
+        """Hace que todas las peticiones HTTP del YoutubeDL (extraccion y fragmentos) pasen por el limitador"""
+        urlopen_original = ydl.urlopen
+        
+        def urlopen(peticion):
+            host = host_de(peticion)
+            self.esperar(host)
+            try:
+                respuesta = urlopen_original(peticion)
+            except Exception as e:
+                status, retry_after = datos_error_http(e)
+                if status in (403, 429):
+                    self.penalizar(host, status, retry_after)
+                raise
+            self.exito(host)
+            return respuesta
+        
+        ydl.urlopen = urlopen
+        return ydl
+    
+    def guardar(self, forzar=False):
+        with self.lock:
+            ahora = time.time()
+            if not self.cambios or (not forzar and ahora - self.ultimo_guardado < INTERVALO_GUARDADO):
+                return
+            # Solo se guardan los hosts que siguen frenados; el resto empieza de cero
+            datos = {
+                host: {
+                    'tasa': estado['tasa'],
+                    'enfriamiento_hasta': estado['enfriamiento_hasta'],
+                    'penalizaciones': estado['penalizaciones'],
+                }
+                for host, estado in self.hosts.items()
+                if estado['tasa'] < self.tasa_maxima or estado['enfriamiento_hasta'] > ahora
+            }
+            self.ultimo_guardado = ahora
+            self.cambios = False
+            try:
+                self.archivo.parent.mkdir(parents=True, exist_ok=True)
+                temporal = self.archivo.with_suffix('.tmp')
+                with open(temporal, 'w') as f:
+                    json.dump(datos, f, indent=4)
+                os.replace(temporal, self.archivo)
+            except OSError as e:
+                log.warning("No se pudo guardar el estado de los hosts: %s", e)
+    
+    def cerrar(self):
+        self.guardar(forzar=True)
@@ -0,0 +1,140 @@
+"""Metricas de tiempo y bytes por fase, y resultados por host
+
+Fases que se miden en cada descarga:
+  extraccion            extract_info sin procesar (o lectura de la cache)
+  seleccion_formato     desde que yt-dlp procesa la informacion hasta que elige formato
+  transferencia         descarga de cada archivo (video, audio...), con sus bytes
+  postproceso:<nombre>  cada postprocesador de yt-dlp (Merger, ContenedorPP, FFmpegExtractAudio...)
+  total                 el trabajo completo, solo los que terminan bien
+
+Por host se cuentan los trabajos correctos y los errores por categoria (las
+mismas que usa traducir_error). La instantanea se exporta como JSON o como texto
+de Prometheus; resumen() da medianas y p95 de las ultimas muestras.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Muestras recientes por fase para el resumen movil
+VENTANA = 200
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return round(ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))], 6)
+
+def etiqueta_prometheus(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metricas:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inicio = time.time()
+        self.fases = {}
+        self.hosts = {}
+    
+    def registrar_fase(self, fase, segundos, bytes_fase=0):
+        with self.lock:
+            datos = self.fases.get(fase)
+            if datos is None:
+                datos = {'cuenta': 0, 'segundos': 0.0, 'maximo': 0.0, 'bytes': 0, 'recientes': deque(maxlen=VENTANA)}
+                self.fases[fase] = datos
+            datos['cuenta'] += 1
+            datos['segundos'] += segundos
+            datos['maximo'] = max(datos['maximo'], segundos)
+            datos['bytes'] += bytes_fase or 0
+            datos['recientes'].append(segundos)
+    
+    @contextlib.contextmanager
+    def cronometro(self, fase):
+        """Registra lo que tarda el bloque; si lanza una excepcion no cuenta, como una fase que no termino"""
+        inicio = time.monotonic()
+        yield
+        self.registrar_fase(fase, time.monotonic() - inicio)
+    
+    def registrar_resultado(self, host, resultado):
+        """resultado: 'exito' o la categoria del error"""
+        with self.lock:
+            resultados = self.hosts.setdefault(host or 'desconocido', {})
+            resultados[resultado] = resultados.get(resultado, 0) + 1
+    
+    def instantanea(self):
+        with self.lock:
+            fases = {}
+            for fase, datos in self.fases.items():
+                recientes = list(datos['recientes'])
+                fases[fase] = {
+                    'cuenta': datos['cuenta'],
+                    'segundos': round(datos['segundos'], 6),
+                    'maximo': round(datos['maximo'], 6),
+                    'bytes': datos['bytes'],
+                    'mediana_reciente': percentil(recientes, 0.5),
+                    'p95_reciente': percentil(recientes, 0.95),
+                }
+            return {
+                'desde': self.inicio,
+                'tiempo': time.time(),
+                'fases': fases,
+                'hosts': {host: dict(resultados) for host, resultados in self.hosts.items()},
+            }
+    
+    def prometheus(self):
+        """Instantanea en el formato de texto de Prometheus"""
+        datos = self.instantanea()
+        lineas = [
+            "# HELP descargador_fase_segundos_total Tiempo acumulado por fase",
+            "# TYPE descargador_fase_segundos_total counter",
+        ]
+        for fase, valores in datos['fases'].items():
+            lineas.append(f'descargador_fase_segundos_total{{fase="{etiqueta_prometheus(fase)}"}} {valores["segundos"]}')
+        lineas += [
+            "# HELP descargador_fase_total Veces que se completo cada fase",
+            "# TYPE descargador_fase_total counter",
+        ]
+        for fase, valores in datos['fases'].items():
+            lineas.append(f'descargador_fase_total{{fase="{etiqueta_prometheus(fase)}"}} {valores["cuenta"]}')
+        lineas += [
+            "# HELP descargador_fase_bytes_total Bytes procesados por fase",
+            "# TYPE descargador_fase_bytes_total counter",
+        ]
+        for fase, valores in datos['fases'].items():
+            if valores['bytes']:
+                lineas.append(f'descargador_fase_bytes_total{{fase="{etiqueta_prometheus(fase)}"}} {valores["bytes"]}')
+        lineas += [
+            "# HELP descargador_resultados_total Trabajos terminados por host y resultado",
+            "# TYPE descargador_resultados_total counter",
+        ]
+        for host, resultados in datos['hosts'].items():
+            for resultado, cuenta in resultados.items():
+                lineas.append(
+                    f'descargador_resultados_total{{host="{etiqueta_prometheus(host)}",'
+                    f'resultado="{etiqueta_prometheus(resultado)}"}} {cuenta}'
+                )
+        return "\n".join(lineas) + "\n"
+    
+    def resumen(self):
+        """Texto corto con las ultimas muestras, para mostrar en la aplicacion"""
+        datos = self.instantanea()
+        lineas = []
+        for fase, valores in sorted(datos['fases'].items()):
+            linea = f"{fase}: {valores['cuenta']} veces, mediana {valores['mediana_reciente']:.1f} s, p95 {valores['p95_reciente']:.1f} s"
+            if valores['bytes'] and valores['segundos']:
+                linea += f", {valores['bytes'] / valores['segundos'] / 1048576:.1f} MiB/s"
+            lineas.append(linea)
+        for host, resultados in sorted(datos['hosts'].items()):
+            exitos = resultados.get('exito', 0)
+            errores = ", ".join(f"{categoria} {cuenta}" for categoria, cuenta in sorted(resultados.items()) if categoria != 'exito')
+            lineas.append(f"{host}: {exitos} correctas" + (f", errores: {errores}" if errores else ""))
+        return "\n".join(lineas) or "Todavia no hay descargas medidas"
+    
+    def exportar(self, ruta):
+        """Escribe la instantanea en ruta: texto de Prometheus si termina en .prom, JSON si no"""
+        contenido = self.prometheus() if str(ruta).endswith('.prom') else json.dumps(self.instantanea(), indent=4)
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
@@ -0,0 +1,789 @@
+"""Logica de descarga sin dependencias de PyQt5"""
+import os, certifi
+os.environ["SSL_CERT_FILE"] = certifi.where()
+
+import contextlib
+import functools
+import json
+import logging
+import threading
+import time
+
+from .audio import crear_pp_audio, contenedores_desde_config
+from .bitacora import AdaptadorTrabajo, LoggerYtDlp
+from .contenedor import crear_pp_contenedor, ETIQUETAS_ACCION
+from .diario import crear_pp_formato_elegido, NOMBRE_PP_FORMATO
+from .afinador import clave_formato, DURACION_MINIMA
+from .ancho_banda import PresupuestoAncho, limite_desde_config, envolver as envolver_ancho
+from .ffmpeg import obtener_ffmpeg
+from .hosts import host_de
+from .plataformas import obtener_registro
+from .progreso import LimitadorEventos, datos_desde_hook, formatear
+from .segmentado import envolver as envolver_segmentado
+from .temporal import carpeta_temporal, comprobar_espacio, crear_pp_colocar, archivo_existente
+
+DIRECTORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ESTADO_EN_COLA = "en_cola"
+ESTADO_EXTRAYENDO = "extrayendo"
+ESTADO_DESCARGANDO = "descargando"
+ESTADO_POSTPROCESANDO = "postprocesando"
+ESTADO_COMPLETADO = "completado"
+ESTADO_FALLIDO = "fallido"
+ESTADO_OMITIDO = "omitido"
+ESTADO_CANCELADO = "cancelado"
+
+ESTADOS_TERMINADOS = (ESTADO_COMPLETADO, ESTADO_FALLIDO, ESTADO_OMITIDO, ESTADO_CANCELADO)
+
+class DescargaOmitida(Exception):
+    """El video ya esta en el historial de descargas"""
+
+_yt_dlp = None
+tiempo_carga_yt_dlp = None
+
+def cargar_yt_dlp():
+    """Importa yt_dlp la primera vez que se necesita; con todos sus extractores tarda bastante"""
+    global _yt_dlp, tiempo_carga_yt_dlp
+    if _yt_dlp is None:
+        inicio = time.perf_counter()
+        import yt_dlp
+        if _yt_dlp is None:
+            tiempo_carga_yt_dlp = time.perf_counter() - inicio
+            _yt_dlp = yt_dlp
+    return _yt_dlp
+
+def precargar_yt_dlp():
+    """Importa yt_dlp en segundo plano para que la primera descarga no tenga que esperar"""
+    hilo = threading.Thread(target=cargar_yt_dlp, daemon=True)
+    hilo.start()
+    return hilo
+
+@functools.lru_cache(maxsize=1024)
+def identificar(url):
+    """(extractor, id) de la URL sin acceder a la red; el id es None si la URL no lo contiene.
+    
+    Recorre los extractores en el mismo orden que YoutubeDL.
+    """
+    yt_dlp = cargar_yt_dlp()
+    for ie in yt_dlp.extractor.gen_extractor_classes():
+        if ie.suitable(url):
+            try:
+                id_video = ie.get_temp_id(url)
+            except Exception:
+                id_video = None
+            return ie.ie_key(), id_video
+    return 'Generic', None
+
+def extractor_para(url):
+    """Nombre del extractor de yt-dlp que manejara la URL"""
+    return identificar(url)[0]
+
+def crear_ydl(opciones):
+    """YoutubeDL para las opciones dadas, con los postprocesadores propios de 3oX registrados.
+    
+    'contenedor_final' y 'limitador_hosts' no son opciones de yt-dlp: indican el contenedor
+    al que se lleva el video (ver contenedor.py) y el limitador de peticiones por host
+    (ver hosts.py). 'audio_final' lleva los contenedores aceptados en modo audio y el
+    tamano del pool de recodificacion (ver audio.py). 'cookies_compartidas' es el jar de
+    cookies.py que reemplaza al que yt-dlp armaria por su cuenta; 'origen_cookies' solo lo
+    distingue en la huella de sesiones.py. 'al_elegir_formato' se queda en params y lo usa el postprocesador de
+    diario.py; 'colocar_en' tambien, y lo usa el de temporal.py, que se registra siempre porque
+    cambia en cada trabajo.
+    """
+    yt_dlp = cargar_yt_dlp()
+    opciones = dict(opciones)
+    contenedor = opciones.pop('contenedor_final', None)
+    audio = opciones.pop('audio_final', None)
+    limitador_hosts = opciones.pop('limitador_hosts', None)
+    cookies = opciones.pop('cookies_compartidas', None)
+    opciones.pop('origen_cookies', None)
+    ydl = yt_dlp.YoutubeDL(opciones)
+    if cookies is not None:
+        # cookiejar es una propiedad cacheada de YoutubeDL: asignarla antes de la primera peticion evita cargarlas otra vez
+        ydl.cookiejar = cookies
+    if limitador_hosts is not None:
+        limitador_hosts.envolver(ydl)
+    # Sin 'participacion_ancho' en params (ver ancho_banda.py) las respuestas no se tocan
+    envolver_ancho(ydl)
+    # Lee 'conexiones_por_archivo' de params en cada descarga; con menos de 2 no cambia nada
+    envolver_segmentado(ydl)
+    if 'al_elegir_formato' in opciones:
+        ydl.add_post_processor(crear_pp_formato_elegido(ydl), when='before_dl')
+    if contenedor:
+        ffmpeg = obtener_ffmpeg(opciones.get('ffmpeg_location', ''))
+        ydl.add_post_processor(crear_pp_contenedor(ydl, contenedor, ffmpeg), when='post_process')
+    if audio:
+        ffmpeg = obtener_ffmpeg(opciones.get('ffmpeg_location', ''))
+        ydl.add_post_processor(crear_pp_audio(ydl, audio['contenedores'], ffmpeg, audio['trabajadores']),
+                               when='post_process')
+    ydl.add_post_processor(crear_pp_colocar(ydl), when='after_move')
+    return ydl
+
+def perfil_formato(formato, calidad, config):
+    """Identifica el resultado pedido: el mismo video en audio y en video son descargas distintas"""
+    if formato == "audio":
+        return "audio:original" if config.get('audio_original', False) else "audio:mp3"
+    partes = [calidad.get(clave, 'Mejor disponible')
+              for clave in ('resolucion', 'fps', 'audio_codec', 'audio_canales')]
+    return "video:" + "|".join(partes)
+
+def tiene_cookies(opciones):
+    return bool(opciones.get('cookiefile') or opciones.get('cookiesfrombrowser') or opciones.get('cookies_compartidas'))
+
+def categoria_error(error_msg):
+    """Categoria del error de yt-dlp, la misma clasificacion que usa traducir_error"""
+    if '403' in error_msg or 'Forbidden' in error_msg:
+        return '403'
+    elif '429' in error_msg:
+        return '429'
+    elif 'Sign in' in error_msg.lower() or 'login' in error_msg.lower():
+        return 'login'
+    elif 'unavailable' in error_msg.lower():
+        return 'no_disponible'
+    elif 'format' in error_msg.lower():
+        return 'formato'
+    return 'otro'
+
+def traducir_error(error_msg):
+    """Convierte el error de yt-dlp en un mensaje entendible para el usuario"""
+    categoria = categoria_error(error_msg)
+    if categoria == '403':
+        return (
+            "Error 403: Acceso denegado\n\n"
+            "Soluciones:\n"
+            "1. Actualiza yt-dlp: pip install --upgrade yt-dlp\n"
+            "2. Configura cookies del navegador en Configuracion\n"
+            "3. O exporta cookies.txt manualmente\n\n"
+            f"Error tecnico: {error_msg[:150]}"
+        )
+    elif categoria == '429':
+        return "Demasiadas solicitudes\n\nEspera 5-10 minutos e intenta de nuevo"
+    elif categoria == 'login':
+        return "Video privado o requiere inicio de sesion\n\nNo se puede descargar"
+    elif categoria == 'no_disponible':
+        return "Video no disponible\n\nPuede haber sido eliminado o es privado"
+    elif categoria == 'formato':
+        return (
+            "Formato no disponible\n\n"
+            "Intenta:\n"
+            "- Cambiar la calidad\n"
+            "- Actualizar yt-dlp: pip install --upgrade yt-dlp\n"
+            "- Verificar que el video sea publico\n\n"
+            f"Error: {error_msg[:150]}"
+        )
+    return f"Error: {error_msg[:250]}"
+
+def es_error_permanente(error_msg):
+    """Errores que no se arreglan reintentando (video privado, eliminado, bloqueado)"""
+    error_msg = error_msg.lower()
+    return any(texto in error_msg for texto in ('sign in', 'login', 'unavailable', 'private', 'copyright', 'removed',
+                                                 'espacio insuficiente', 'no space left'))
+
+def error_de_informacion_vieja(error):
+    """True si el error puede deberse a una extraccion guardada que ya no sirve (URL caducada o prohibida).
+    
+    Cancelaciones, fallos de postprocesado y errores de disco no tienen que ver con la
+    extraccion: volver a extraer solo repetiria la descarga.
+    """
+    yt_dlp = cargar_yt_dlp()
+    utilidades = yt_dlp.utils
+    if isinstance(error, (utilidades.DownloadCancelled, utilidades.PostProcessingError, OSError)):
+        return False
+    if isinstance(error, utilidades.ExtractorError):
+        return True
+    if not isinstance(error, utilidades.DownloadError):
+        return False
+    causa = error.exc_info[1] if error.exc_info else None
+    if causa is None:
+        return categoria_error(str(error)) == '403'
+    if isinstance(causa, (utilidades.DownloadCancelled, utilidades.PostProcessingError)):
+        return False
+    return isinstance(causa, (utilidades.ExtractorError, *yt_dlp.networking.exceptions.network_exceptions))
+
+# Resultados de extract_info que agrupan varios videos
+TIPOS_LISTA = ('playlist', 'multi_video')
+
+def url_entrada(entrada):
+    """URL descargable de una entrada de lista sin procesar, o None"""
+    if entrada.get('_type') in ('url', 'url_transparent'):
+        url = entrada.get('url')
+    else:
+        url = entrada.get('webpage_url') or entrada.get('original_url')
+    if url and '://' in url:
+        return url
+    return None
+
+class Descargador:
+    """Construye las opciones de yt-dlp para una URL y ejecuta la descarga"""
+    def __init__(self, url, carpeta, formato, calidad, config, progreso=None, estado=None, cache=None, sesiones=None,
+                 historial=None, expandir=None, limitador_hosts=None, presupuesto=None, prioridad=0, peso=1.0,
+                 formato_fijo=None, archivo_fijo=None, al_elegir_formato=None, plataformas=None,
+                 afinador=None, metricas=None, id_trabajo=None, cookies=None, al_terminar_transferencia=None,
+                 etapa_postproceso=None):
+        self.url = url
+        self.carpeta = carpeta
+        self.formato = formato
+        self.calidad = calidad
+        self.config = config
+        self.progreso = progreso or (lambda mensaje, datos=None: None)
+        self.estado = estado or (lambda estado: None)
+        self.cache = cache
+        self.sesiones = sesiones
+        self.historial = historial
+        # Almacen de cookies compartido (cookies.py); sin el cada trabajo las lee por su cuenta
+        self.cookies = cookies
+        self.omitidos = 0
+        self.motivo_omision = None
+        # expandir(url) encola una entrada de lista como trabajo propio; sin el, las listas se descargan aqui mismo
+        self.expandir = expandir
+        self.entradas_expandidas = None
+        self.limitador_hosts = limitador_hosts
+        # Con presupuesto compartido el limite de velocidad lo decide el reparto global; sin el, un
+        # presupuesto propio: 'ratelimit' valdria para cada hilo de fragmentos por separado
+        limite = limite_desde_config(config)
+        if presupuesto is None and limite is not None:
+            presupuesto = PresupuestoAncho(limite)
+        self.presupuesto = presupuesto
+        self.prioridad = prioridad
+        self.peso = peso
+        self.participacion = None
+        # Al reanudar se fuerzan el formato y el archivo de la ejecucion anterior para aprovechar los .part
+        self.formato_fijo = formato_fijo
+        self.archivo_fijo = archivo_fijo
+        self.al_elegir_formato = al_elegir_formato
+        # Se llama una vez cuando ya no queda nada por descargar y solo falta postprocesar
+        self.al_terminar_transferencia = al_terminar_transferencia
+        # Semaforo compartido que limita cuantos trabajos postprocesan (FFmpeg) a la vez
+        self.etapa_postproceso = etapa_postproceso
+        self.en_postproceso = False
+        self.cancelado = False
+        # Ajuste de fragmentos simultaneos; params_ydl son los params vivos del YoutubeDL en uso
+        self.afinador = afinador
+        self.params_ydl = None
+        self.ydl = None
+        self.hilos_archivo = None
+        self.metricas = metricas
+        self.inicio_proceso = None
+        self.inicio_archivo = None
+        self.inicios_pp = {}
+        self.decision_contenedor = None
+        # Carpeta donde se escribe la descarga en curso; si no es carpeta, el resultado se mueve al terminar
+        self.carpeta_salida = carpeta
+        self.limitador = LimitadorEventos(
+            lambda datos: self.progreso(formatear(datos), datos),
+            config.get('progreso_hz', 4)
+        )
+        self.estado_actual = ESTADO_EN_COLA
+        self.plataforma = (plataformas or obtener_registro()).buscar(url)
+        self.log = AdaptadorTrabajo(logging.getLogger(__name__), {
+            'trabajo': id_trabajo if id_trabajo is not None else '-',
+            'host': host_de(url) or '-',
+            'fase': ESTADO_EN_COLA,
+        })
+    
+    def get_opciones_base(self):
+        """Retorna opciones base mejoradas para evitar error 403"""
+        opciones = {
+            'outtmpl': f'{self.carpeta}/%(title)s.%(ext)s',
+            'quiet': False,
+            'no_warnings': False,
+            # La salida de yt-dlp va al registro del trabajo; el progreso ya lo dan los hooks
+            'logger': LoggerYtDlp(self.log),
+            'noprogress': True,
+            'concurrent_fragment_downloads': self.config.get('hilos', 16),
+            # Conexiones por rangos para los archivos progresivos (ver segmentado.py)
+            'conexiones_por_archivo': self.config.get('conexiones_por_archivo', 8),
+            'nocheckcertificate': True,
+            'no_check_certificate': True,
+            'prefer_insecure': False,
+            'extractor_retries': 5,
+            'fragment_retries': 5,
+            'retries': 10,
+            'sleep_interval': 1,
+            'max_sleep_interval': 5,
+            'skip_unavailable_fragments': True,
+            'geo_bypass': True,
+            'geo_bypass_country': 'US',
+            'allow_unplayable_formats': False,
+            'extract_flat': False,
+            'cachedir': os.path.join(DIRECTORIO_APP, '.cache'),
+            'merge_output_format': 'mp4',
+        }
+        
+        ffmpeg = obtener_ffmpeg(self.config.get('ffmpeg_path', ''))
+        if ffmpeg is not None:
+            opciones['ffmpeg_location'] = ffmpeg['ruta']
+        
+        opciones['http_headers'] = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'DNT': '1',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+        }
+        
+        cookies_browser = self.config.get('cookies_browser', 'Ninguno')
+        cookies_file = os.path.join(DIRECTORIO_APP, 'cookies.txt')
+        
+        if self.cookies is not None:
+            jar, origen = self.cookies.obtener(cookies_browser)
+            if jar is not None:
+                self.log.debug("Usando cookies compartidas (%s)", origen)
+                opciones['cookies_compartidas'] = jar
+                opciones['origen_cookies'] = origen
+            elif origen is not None:
+                # El almacen no pudo leer el navegador: que lo intente yt-dlp como antes
+                opciones['cookiesfrombrowser'] = (cookies_browser.lower(),)
+            else:
+                self.log.debug("Sin cookies - usando clientes por defecto")
+        elif os.path.exists(cookies_file):
+            self.log.debug("Usando archivo de cookies: %s", cookies_file)
+            opciones['cookiefile'] = cookies_file
+        elif cookies_browser != 'Ninguno':
+            try:
+                browser = cookies_browser.lower()
+                self.log.debug("Extrayendo cookies de %s...", browser)
+                opciones['cookiesfrombrowser'] = (browser,)
+                self.log.debug("Cookies configuradas - yt-dlp usara clientes compatibles automaticamente")
+            except Exception as e:
+                self.log.warning("No se pudieron configurar cookies: %s", e)
+        else:
+            self.log.debug("Sin cookies - usando clientes por defecto")
+        
+        return opciones
+    
+    def configurar_plataforma(self, opciones):
+        """Aplica el perfil de la plataforma de la URL (ver plataformas.py)"""
+        nombre, perfil = self.plataforma
+        if perfil is None:
+            return opciones
+        
+        if 'extractor_args_sin_cookies' in perfil:
+            if not tiene_cookies(opciones):
+                self.log.debug("Sin cookies - usando argumentos de extractor alternativos para %s", nombre)
+                opciones['extractor_args'] = dict(perfil['extractor_args_sin_cookies'])
+            else:
+                self.log.debug("Con cookies - dejando que yt-dlp elija los mejores clientes")
+        
+        if 'extractor_args' in perfil:
+            opciones['extractor_args'] = {**opciones.get('extractor_args', {}), **perfil['extractor_args']}
+        
+        opciones['http_headers'].update(perfil.get('cabeceras', {}))
+        
+        if 'age_limit' in perfil:
+            opciones['age_limit'] = perfil['age_limit']
+        if self.formato == "video" and perfil.get('formato_video'):
+            opciones['format'] = perfil['formato_video']
+        
+        # Ajustes propios de la plataforma: fragmentos simultaneos, reintentos, esperas...
+        opciones.update(perfil.get('opciones', {}))
+        return opciones
+    
+    def construir_formato_video(self):
+        """Construye la cadena de formato segun las opciones seleccionadas"""
+        
+        perfil = self.plataforma[1]
+        if perfil is not None and perfil.get('formato_video'):
+            return perfil['formato_video']
+        
+        resolucion = self.calidad.get('resolucion', 'Mejor disponible')
+        fps = self.calidad.get('fps', 'Mejor disponible')
+        audio_codec = self.calidad.get('audio_codec', 'Mejor disponible')
+        audio_canales = self.calidad.get('audio_canales', 'Mejor disponible')
+        
+        video_filters = []
+        
+        if resolucion != "Mejor disponible":
+            height_map = {
+                "8K (4320p)": 4320,
+                "5K (2880p)": 2880,
+                "4K (2160p)": 2160,
+                "2K (1440p)": 1440,
+                "Full HD (1080p)": 1080,
+                "HD (720p)": 720,
+                "SD (480p)": 480,
+                "360p": 360,
+                "240p": 240,
+                "144p": 144
+            }
+            height = height_map.get(resolucion, 0)
+            if height > 0:
+                video_filters.append(f"height<={height}")
+        
+        if fps == "60 FPS":
+            video_filters.append("fps>=60")
+        elif fps == "30 FPS":
+            video_filters.append("fps<=30")
+        
+        audio_filters = []
+        
+        if audio_codec == "Opus (mejor calidad)":
+            audio_filters.append("acodec=opus")
+        elif audio_codec == "AAC (compatible)":
+            audio_filters.append("acodec=aac")
+        
+        if audio_canales == "5.1 Surround":
+            audio_filters.append("channels>=6")
+        elif audio_canales == "Stereo":
+            audio_filters.append("channels=2")
+        
+        if video_filters:
+            video_selector = f"bv*[{']['.join(video_filters)}]"
+        else:
+            video_selector = "bv*"
+        
+        if audio_filters:
+            audio_selector = f"ba*[{']['.join(audio_filters)}]"
+        else:
+            audio_selector = "ba*"
+        
+        formato = f"{video_selector}+{audio_selector}/{video_selector}+ba/bv*+{audio_selector}/bv*+ba/b"
+        
+        self.log.debug("Formato construido: %s (resolucion %s, fps %s, codec %s, canales %s)",
+                       formato, resolucion, fps, audio_codec, audio_canales)
+        
+        return formato
+    
+    def cambiar_estado(self, estado):
+        if estado != self.estado_actual:
+            self.estado_actual = estado
+            self.log.extra['fase'] = estado
+            self.estado(estado)
+    
+    def construir_opciones(self):
+        """Opciones completas de yt-dlp para este trabajo, incluidos hooks y postprocesado"""
+        opciones = self.get_opciones_base()
+        
+        if self.limitador_hosts is not None:
+            # El limitador por host reemplaza las esperas fijas entre descargas
+            opciones.pop('sleep_interval', None)
+            opciones.pop('max_sleep_interval', None)
+            opciones['limitador_hosts'] = self.limitador_hosts
+        
+        def progress_hook(d):
+            self.comprobar_cancelacion()
+            if d['status'] == 'downloading':
+                self.cambiar_estado(ESTADO_DESCARGANDO)
+                if self.inicio_archivo is None:
+                    self.inicio_archivo = time.monotonic()
+                if self.hilos_archivo is None and d.get('fragment_count') and self.params_ydl is not None:
+                    self.hilos_archivo = self.params_ydl.get('concurrent_fragment_downloads')
+                if self.participacion is not None:
+                    self.participacion.informar(d)
+                self.limitador.publicar(datos_desde_hook(d, ESTADO_DESCARGANDO))
+            elif d['status'] == 'finished':
+                datos = datos_desde_hook(d, ESTADO_DESCARGANDO)
+                datos['descargado'] = datos['total'] = d.get('total_bytes') or datos['descargado']
+                datos['porcentaje'] = 100.0
+                self.limitador.publicar(datos, forzar=True)
+                self.progreso("Procesando archivo...")
+                self.medir_fragmentos(d)
+                self.medir('transferencia', self.inicio_archivo, datos['total'])
+                self.inicio_archivo = None
+        
+        def postprocessor_hook(d):
+            nombre = d.get('postprocessor')
+            if nombre == NOMBRE_PP_FORMATO:
+                # Se ejecuta antes de descargar; no es postprocesado
+                return
+            if d['status'] == 'started':
+                self.entrar_postproceso(d.get('info_dict') or {})
+                self.comprobar_cancelacion()
+                self.cambiar_estado(ESTADO_POSTPROCESANDO)
+                self.inicios_pp[nombre] = time.monotonic()
+            elif d['status'] == 'finished':
+                self.medir(f"postproceso:{nombre}", self.inicios_pp.pop(nombre, None))
+                decision = (d.get('info_dict') or {}).get('decision_contenedor')
+                if decision and decision != self.decision_contenedor:
+                    self.decision_contenedor = decision
+                    etiqueta = ETIQUETAS_ACCION[decision['accion']]
+                    self.log.info("Contenedor: %s (%s)", etiqueta, decision['motivo'])
+                    self.progreso(f"Contenedor: {etiqueta}")
+        
+        opciones['progress_hooks'] = [progress_hook]
+        opciones['postprocessor_hooks'] = [postprocessor_hook]
+        if self.formato == "audio":
+            opciones['format'] = 'bestaudio/best'
+            # AudioPP copia el audio si su contenedor se acepta y solo recodifica a mp3 si no
+            opciones['audio_final'] = {
+                'contenedores': contenedores_desde_config(self.config),
+                'trabajadores': self.config.get('recodificaciones_simultaneas', 0),
+            }
+        else:
+            formato_str = self.construir_formato_video()
+            opciones['format'] = formato_str
+            
+            # El paso a mp4 (remux o recodificacion) lo decide ContenedorPP segun los codecs
+            opciones['contenedor_final'] = 'mp4'
+            if 'ffmpeg_location' in opciones:
+                # Sin FFmpeg los arreglos fallan con PostProcessingError; el archivo se deja como llega
+                opciones['postprocessors'] = [{
+                    'key': 'FFmpegFixupM4a',
+                }, {
+                    'key': 'FFmpegFixupM3u8',
+                }]
+        
+        opciones = self.configurar_plataforma(opciones)
+        
+        temporal = carpeta_temporal(self.config, self.carpeta)
+        if temporal:
+            opciones['outtmpl'] = f"{temporal.replace('%', '%%')}/%(title)s.%(ext)s"
+        if self.formato_fijo:
+            # Si el formato anterior ya no existe se vuelve a elegir con el selector normal
+            opciones['format'] = f"{self.formato_fijo}/{opciones['format']}"
+        if self.archivo_fijo:
+            base = os.path.splitext(self.archivo_fijo)[0].replace('%', '%%')
+            opciones['outtmpl'] = f"{base}.%(ext)s"
+        # Al reanudar puede venir de la carpeta temporal aunque ahora no se use, o al reves
+        self.carpeta_salida = os.path.dirname(opciones['outtmpl'].replace('%%', '%'))
+        if os.path.abspath(self.carpeta_salida) != os.path.abspath(self.carpeta):
+            opciones['colocar_en'] = self.carpeta
+        if self.config.get('sobrescribir', False):
+            opciones['overwrites'] = True
+        if self.historial is not None:
+            opciones['match_filter'] = self.filtro_historial
+        elif 'colocar_en' in opciones:
+            opciones['match_filter'] = self.filtro_existente
+        if (self.al_elegir_formato is not None or self.afinador_activo() or self.metricas is not None
+                or 'colocar_en' in opciones):
+            opciones['al_elegir_formato'] = self.antes_de_descargar
+        return opciones
+    
+    def afinador_activo(self):
+        """El perfil de la plataforma puede fijar concurrent_fragment_downloads; entonces no se ajusta"""
+        perfil = self.plataforma[1] or {}
+        return self.afinador is not None and 'concurrent_fragment_downloads' not in perfil.get('opciones', {})
+    
+    def antes_de_descargar(self, info):
+        """yt-dlp ya eligio formato: se ajustan los fragmentos simultaneos para su host y se avisa a la cola"""
+        self.comprobar_cancelacion()
+        self.medir('seleccion_formato', self.inicio_proceso)
+        self.inicio_archivo = time.monotonic()
+        if self.params_ydl is not None and self.params_ydl.get('colocar_en'):
+            comprobar_espacio(info, self.carpeta_salida, self.carpeta)
+        if self.afinador_activo() and self.params_ydl is not None:
+            formato = (info.get('requested_formats') or [info])[0]
+            self.params_ydl['concurrent_fragment_downloads'] = self.afinador.sugerir(clave_formato(formato))
+        if self.al_elegir_formato is not None:
+            self.al_elegir_formato(info)
+    
+    def cancelar(self):
+        """Pide detener la descarga; se corta en el siguiente aviso de progreso de yt-dlp"""
+        self.cancelado = True
+    
+    def comprobar_cancelacion(self):
+        if self.cancelado:
+            # Es la excepcion con la que yt-dlp corta una descarga sin tratarla como error
+            raise cargar_yt_dlp().utils.DownloadCancelled("Descarga cancelada")
+    
+    def fin_transferencia(self):
+        """Ya no queda nada por descargar: se cede el ancho de banda y el turno de descarga"""
+        if self.participacion is not None:
+            self.presupuesto.abandonar(self.participacion)
+            self.participacion = None
+        if self.al_terminar_transferencia is not None:
+            aviso, self.al_terminar_transferencia = self.al_terminar_transferencia, None
+            aviso()
+    
+    def entrar_postproceso(self, info):
+        """Primer postprocesador del trabajo: pasa de la etapa de descarga a la de postprocesado"""
+        if self.en_postproceso:
+            return
+        if self.expandir is None and info.get('playlist_index') is not None:
+            # Lista descargada aqui mismo: despues de esta entrada viene otra descarga
+            return
+        self.en_postproceso = True
+        self.fin_transferencia()
+        if self.etapa_postproceso is not None:
+            with self.cronometro('espera_postproceso'):
+                if not self.etapa_postproceso.acquire(blocking=False):
+                    self.progreso("Esperando turno para procesar con FFmpeg...")
+                    self.etapa_postproceso.acquire()
+    
+    def salir_postproceso(self):
+        if self.en_postproceso and self.etapa_postproceso is not None:
+            self.etapa_postproceso.release()
+        self.en_postproceso = False
+    
+    def cronometro(self, fase):
+        """Contexto que registra en las metricas lo que tarda el bloque, si termina sin error"""
+        return self.metricas.cronometro(fase) if self.metricas is not None else contextlib.nullcontext()
+    
+    def medir(self, fase, inicio, bytes_fase=0):
+        """Registra en las metricas el tiempo transcurrido desde inicio (time.monotonic)"""
+        if self.metricas is not None and inicio is not None:
+            self.metricas.registrar_fase(fase, time.monotonic() - inicio, bytes_fase)
+    
+    def medir_fragmentos(self, d):
+        """Al terminar un archivo fragmentado se informa su velocidad media al afinador"""
+        hilos, self.hilos_archivo = self.hilos_archivo, None
+        if hilos is None or not self.afinador_activo() or self.params_ydl is None:
+            return
+        transcurrido = d.get('elapsed')
+        total = d.get('total_bytes') or d.get('downloaded_bytes')
+        if not transcurrido or not total or transcurrido < DURACION_MINIMA:
+            return
+        clave = clave_formato(d.get('info_dict') or {})
+        siguiente = self.afinador.registrar(clave, hilos, total / transcurrido)
+        # El siguiente archivo del mismo trabajo (la pista de audio) ya usa el valor nuevo
+        self.params_ydl['concurrent_fragment_downloads'] = siguiente
+    
+    def perfil_formato(self):
+        return perfil_formato(self.formato, self.calidad, self.config)
+    
+    def filtro_existente(self, info, incomplete=False):
+        """match_filter de yt-dlp: omite el video si ya esta en la carpeta de destino.
+        
+        Descargando en la carpeta temporal yt-dlp solo ve esa carpeta, asi que no
+        nota por su cuenta que el archivo ya existe en el destino.
+        """
+        if incomplete or self.ydl is None or self.config.get('sobrescribir', False):
+            return None
+        if not (self.params_ydl or {}).get('colocar_en'):
+            return None
+        if self.formato == "audio":
+            extensiones = contenedores_desde_config(self.config)
+        else:
+            extensiones = ['mp4']
+        existente = archivo_existente(self.ydl.prepare_filename(info), self.carpeta, extensiones)
+        if existente is None:
+            return None
+        self.omitidos += 1
+        self.motivo_omision = f"Ya existe en la carpeta de destino: {os.path.basename(existente)}"
+        return self.motivo_omision
+    
+    def filtro_historial(self, info, incomplete=False):
+        """match_filter de yt-dlp: omite entradas que ya estan en el historial o en la carpeta de destino"""
+        perfil = self.perfil_formato()
+        extractor = info.get('extractor_key') or info.get('ie_key')
+        if self.historial.contiene(extractor, info.get('id'), perfil) or (
+                not incomplete and self.historial.contiene_titulo(info.get('title'), perfil, self.carpeta)):
+            self.omitidos += 1
+            return f"{info.get('title') or info.get('id')} ya esta en el historial de descargas"
+        return self.filtro_existente(info, incomplete)
+    
+    def descargar(self):
+        """Ejecuta la descarga y retorna el titulo. Las excepciones de yt-dlp se propagan"""
+        self.cambiar_estado(ESTADO_EXTRAYENDO)
+        
+        if self.historial is not None:
+            extractor, id_video = identificar(self.url)
+            if self.historial.contiene(extractor, id_video, self.perfil_formato()):
+                raise DescargaOmitida(f"Ya descargado anteriormente ({extractor} {id_video})")
+        
+        if self.limitador_hosts is not None:
+            host = host_de(self.url)
+            espera = self.limitador_hosts.espera_pendiente(host)
+            if espera >= 1:
+                self.progreso(f"{host} limito las peticiones, esperando {espera:.0f} s...")
+        
+        self.progreso("Obteniendo informacion del video...")
+        
+        opciones = self.construir_opciones()
+        
+        self.progreso("Iniciando descarga...")
+        
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Formato final: %s", opciones.get('format'))
+            self.log.debug("URL: %s", self.url)
+            self.log.debug("Cookies: %s", opciones.get('origen_cookies') or opciones.get('cookiesfrombrowser', 'Archivo' if opciones.get('cookiefile') else 'No'))
+            self.log.debug("Clientes: %s", opciones.get('extractor_args', {}).get('youtube', {}).get('player_client', 'Por defecto'))
+        
+        with self.abrir_ydl(opciones) as ydl:
+            self.params_ydl = ydl.params
+            self.ydl = ydl
+            if self.presupuesto is not None:
+                self.participacion = self.presupuesto.participar(ydl.params, self.prioridad, self.peso)
+            try:
+                info = self.extraer_y_descargar(ydl, opciones)
+            finally:
+                if self.participacion is not None:
+                    self.presupuesto.abandonar(self.participacion)
+                    self.participacion = None
+                self.limitador.cerrar()
+                self.salir_postproceso()
+                self.ydl = None
+                if self.cookies is not None:
+                    self.cookies.guardar()
+        
+        if info.get('_type', 'video') == 'video' and self.omitidos:
+            raise DescargaOmitida(self.motivo_omision or f"Ya descargado anteriormente: {info.get('title', 'Video')}")
+        if self.historial is not None:
+            self.historial.registrar_info(info, self.perfil_formato())
+        return info.get('title', 'Video')
+    
+    def abrir_ydl(self, opciones):
+        """YoutubeDL prestado por el gestor de sesiones, o uno nuevo si no hay gestor"""
+        if self.sesiones is not None:
+            return self.sesiones.prestar(opciones)
+        return crear_ydl(opciones)
+    
+    def perfil_extraccion(self, opciones):
+        """Opciones que cambian el resultado de la extraccion y por tanto forman parte de la clave de cache"""
+        return json.dumps({
+            'extractor_args': opciones.get('extractor_args'),
+            'cookies': tiene_cookies(opciones),
+            'age_limit': opciones.get('age_limit'),
+        }, sort_keys=True)
+    
+    def extraer_y_descargar(self, ydl, opciones):
+        """Igual que extract_info(download=True), pero reutiliza la extraccion guardada en cache si sigue vigente
+        y reparte las listas de reproduccion en trabajos separados"""
+        clave = None
+        if self.cache is not None:
+            extractor = extractor_para(self.url)
+            clave = self.cache.clave(extractor, self.url, self.perfil_extraccion(opciones))
+            
+            inicio = time.monotonic()
+            info = self.cache.obtener(clave)
+            if info is not None:
+                self.log.info("Informacion de %s en cache - se omite la extraccion", extractor)
+                self.medir('extraccion_cache', inicio)
+                try:
+                    self.inicio_proceso = time.monotonic()
+                    return ydl.process_ie_result(info, download=True)
+                except Exception as e:
+                    if not error_de_informacion_vieja(e):
+                        raise
+                    self.log.warning("Fallo la descarga con la informacion en cache, extrayendo de nuevo: %s", e)
+                    self.cache.invalidar(clave)
+        
+        with self.cronometro('extraccion'):
+            info = ydl.extract_info(self.url, download=False, process=False)
+        if self.expandir is not None:
+            # Un enlace a un video dentro de una lista suele redirigir a la lista completa
+            redirecciones = 0
+            while info.get('_type') == 'url' and redirecciones < 3:
+                info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+                redirecciones += 1
+            if info.get('_type') in TIPOS_LISTA:
+                return self.expandir_lista(info)
+        
+        # Las listas de reproduccion traen generadores de entradas, solo se guardan videos sueltos
+        if clave is not None and info.get('_type', 'video') == 'video':
+            self.cache.guardar(clave, extractor, self.url, ydl.sanitize_info(info))
+        self.inicio_proceso = time.monotonic()
+        return ydl.process_ie_result(info, download=True)
+    
+    def expandir_lista(self, info):
+        """Encola cada entrada como un trabajo propio a medida que yt-dlp la lista.
+        
+        Las entradas llegan de un generador que pide las paginas de la lista bajo
+        demanda, asi que las primeras descargas empiezan sin esperar al final.
+        """
+        titulo = info.get('title') or info.get('id') or 'Lista'
+        self.progreso(f"Listando {titulo}...")
+        total = 0
+        for entrada in info.get('entries') or []:
+            url = url_entrada(entrada) if entrada else None
+            if url is None:
+                self.log.warning("Entrada de %s sin URL descargable, se omite", titulo)
+                continue
+            self.expandir(url)
+            total += 1
+            if total % 50 == 0:
+                self.progreso(f"Listando {titulo}: {total} videos en cola...")
+        self.entradas_expandidas = total
+        return dict(info, entries=[])
@@ -0,0 +1,214 @@
+"""Perfiles por plataforma indexados por dominio
+
+Antes cada plataforma era una rama de un if/elif con comprobaciones como
+'x.com' in url, que tambien coincidian con hosts ajenos (netflix.com, box.com).
+Ahora se toma el host de la URL y se buscan sus sufijos en un diccionario:
+'m.youtube.com' prueba 'm.youtube.com', 'youtube.com' y 'com'.
+
+Cada perfil es un diccionario con:
+  dominios                    hosts (y sus subdominios) a los que se aplica
+  cabeceras                   cabeceras HTTP que se agregan a las de base
+  extractor_args              argumentos de extractor de yt-dlp
+  extractor_args_sin_cookies  igual, pero solo cuando no hay cookies configuradas
+  age_limit                   edad que se declara al sitio
+  formato_video               selector de formato fijo para video (ignora la calidad elegida)
+  opciones                    cualquier otra opcion de yt-dlp (concurrent_fragment_downloads,
+                              retries, sleep_interval...)
+  patrones_id                 expresiones regulares que sacan el id del video de la URL
+  url_canonica                URL a la que se reescribe la del usuario, con {id}
+  parametros_conservados      parametros de la URL que cambian lo que se descarga (p. ej. 'list')
+  parametros_rastreo          parametros de rastreo propios del sitio, ademas de los generales
+
+canonizar() usa los cuatro ultimos para que youtu.be/ID, youtube.com/watch?v=ID&t=30
+y m.youtube.com/shorts/ID sean el mismo trabajo. La URL solo se reescribe en
+los perfiles con url_canonica; en el resto se descarga la URL tal como llego y
+la version sin rastreo (normalizar_url) solo sirve de clave.
+
+Los usuarios pueden agregar o cambiar perfiles en ~/.3ox_downloader/plataformas.json,
+con el mismo formato que PERFILES_INTEGRADOS.
+"""
+import json
+import logging
+import re
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, unquote_plus
+
+from .config import DIRECTORIO_DATOS
+from .hosts import host_de
+
+log = logging.getLogger(__name__)
+
+ARCHIVO_PERFILES = DIRECTORIO_DATOS / "plataformas.json"
+
+# Parametros que solo sirven para rastrear de donde vino el enlace, en cualquier sitio. Los que en
+# otros sitios pueden significar algo (si, feature, pp...) van en parametros_rastreo de cada perfil
+PARAMETROS_RASTREO = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'twclid', 'igshid', 'igsh', 'mc_cid', 'mc_eid',
+    '_hsenc', '_hsmi', 'mibextid',
+}
+PREFIJOS_RASTREO = ('utm_',)
+
+PERFILES_INTEGRADOS = {
+    'youtube': {
+        'dominios': ['youtube.com', 'youtu.be', 'youtube-nocookie.com'],
+        'cabeceras': {
+            'Origin': 'https://www.youtube.com',
+            'Referer': 'https://www.youtube.com/',
+        },
+        'extractor_args_sin_cookies': {
+            'youtube': {
+                'player_client': ['android_creator', 'ios', 'web'],
+            }
+        },
+        'patrones_id': [r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/|/v/)([\w-]{11})(?![\w-])'],
+        'url_canonica': 'https://www.youtube.com/watch?v={id}',
+        'parametros_rastreo': ['si', 'feature', 'pp'],
+        # Con list yt-dlp descarga la lista entera: es otro trabajo
+        'parametros_conservados': ['list'],
+    },
+    'tiktok': {
+        'dominios': ['tiktok.com'],
+        'patrones_id': [r'/video/(\d+)'],
+        'parametros_rastreo': ['share_app_id', 'is_from_webapp', 'sender_device', 'sender_web_id'],
+        'cabeceras': {
+            'Referer': 'https://www.tiktok.com/',
+            'Origin': 'https://www.tiktok.com',
+        },
+    },
+    'twitter': {
+        'dominios': ['twitter.com', 'x.com'],
+        'patrones_id': [r'/status(?:es)?/(\d+)'],
+        'parametros_rastreo': ['s', 't', 'ref_src', 'ref_url'],
+        'cabeceras': {
+            'Referer': 'https://twitter.com/',
+            'Origin': 'https://twitter.com',
+        },
+    },
+    'facebook': {
+        'dominios': ['facebook.com', 'fb.watch'],
+        'patrones_id': [r'[?&]v=(\d+)', r'/videos/(?:[^/?]+/)?(\d+)', r'/reel/(\d+)'],
+        'cabeceras': {
+            'Referer': 'https://www.facebook.com/',
+            'Origin': 'https://www.facebook.com',
+        },
+    },
+    'pornhub': {
+        'dominios': ['pornhub.com'],
+        'cabeceras': {
+            'Referer': 'https://www.pornhub.com/',
+            'Origin': 'https://www.pornhub.com',
+            'Age-Gate': '1',
+        },
+        'age_limit': 18,
+        'formato_video': 'best[ext=mp4]/best',
+    },
+}
+
+class RegistroPlataformas:
+    def __init__(self, perfiles=None, archivo=ARCHIVO_PERFILES):
+        self.perfiles = {nombre: dict(perfil) for nombre, perfil in (perfiles or PERFILES_INTEGRADOS).items()}
+        if archivo is not None:
+            for nombre, perfil in self.leer_usuario(archivo).items():
+                # Un perfil de usuario con el nombre de uno integrado lo completa o lo corrige
+                self.perfiles[nombre] = {**self.perfiles.get(nombre, {}), **perfil}
+        self.por_dominio = {}
+        for nombre, perfil in self.perfiles.items():
+            for dominio in perfil.get('dominios', []):
+                self.por_dominio[dominio.lower()] = nombre
+    
+    @staticmethod
+    def leer_usuario(archivo):
+        try:
+            with open(archivo, 'r', encoding='utf-8') as f:
+                perfiles = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning("No se pudieron leer los perfiles de %s: %s", archivo, e)
+            return {}
+        if not isinstance(perfiles, dict):
+            log.warning("%s debe contener un objeto con un perfil por plataforma", archivo)
+            return {}
+        return {nombre: perfil for nombre, perfil in perfiles.items() if isinstance(perfil, dict)}
+    
+    def buscar(self, url):
+        """(nombre, perfil) de la plataforma de la URL, o (None, None) si no hay perfil"""
+        url = url.strip()
+        partes = host_de(url if '://' in url else f"https://{url}").rstrip('.').split('.')
+        for inicio in range(len(partes)):
+            nombre = self.por_dominio.get('.'.join(partes[inicio:]))
+            if nombre is not None:
+                return nombre, self.perfiles[nombre]
+        return None, None
+    
+    def canonizar(self, url):
+        """(url a descargar, (plataforma, id)).
+        
+        La url a descargar es la recibida salvo que el perfil tenga url_canonica y se encuentre
+        el id. Sin patron que encuentre el id, la clave es (host, normalizar_url(url)).
+        """
+        url = url.strip()
+        nombre, perfil = self.buscar(url)
+        if perfil is None:
+            return url, (host_de(url), normalizar_url(url))
+        rastreo = perfil.get('parametros_rastreo', ())
+        partes = urlsplit(quitar_rastreo(url, rastreo))
+        texto = f"{partes.netloc}{partes.path}?{partes.query}"
+        for patron in perfil.get('patrones_id', []):
+            coincidencia = re.search(patron, texto)
+            if coincidencia is None:
+                continue
+            id_medio = coincidencia.group(1)
+            conservados = [(clave, valor) for clave, valor in parse_qsl(partes.query)
+                           if clave in perfil.get('parametros_conservados', [])]
+            if conservados:
+                id_medio += '?' + urlencode(conservados)
+            if perfil.get('url_canonica'):
+                url = perfil['url_canonica'].format(id=coincidencia.group(1))
+                if conservados:
+                    url += ('&' if '?' in url else '?') + urlencode(conservados)
+            return url, (nombre, id_medio)
+        return url, (nombre, normalizar_url(url, rastreo))
+
+def es_rastreo(parametro, rastreo):
+    clave = unquote_plus(parametro.partition('=')[0]).lower()
+    return clave in rastreo or clave.startswith(PREFIJOS_RASTREO)
+
+def quitar_rastreo(url, otros=()):
+    """URL sin espacios, con el host en minusculas y sin parametros de rastreo.
+    
+    El resto de la query se deja tal cual (sin decodificar ni volver a codificar) y el
+    fragmento se conserva: algunos sitios llevan la ruta del video en el (#/video/12).
+    """
+    rastreo = PARAMETROS_RASTREO.union(clave.lower() for clave in otros)
+    url = url.strip()
+    if '://' not in url:
+        url = f"https://{url}"
+    partes = urlsplit(url)
+    query = '&'.join(parametro for parametro in partes.query.split('&')
+                     if parametro and not es_rastreo(parametro, rastreo))
+    return urlunsplit((partes.scheme.lower(), partes.netloc.lower(), partes.path, query, partes.fragment))
+
+def normalizar_url(url, otros=()):
+    """Clave de una URL: sin rastreo, sin www. ni m., sin barra final y con la query ordenada.
+    
+    Solo sirve para comparar URLs (cola, cache de informacion); nunca se descarga.
+    """
+    partes = urlsplit(quitar_rastreo(url, otros))
+    host = partes.netloc
+    for prefijo in ('www.', 'm.'):
+        if host.startswith(prefijo):
+            host = host[len(prefijo):]
+    query = '&'.join(sorted(partes.query.split('&'))) if partes.query else ''
+    return urlunsplit((partes.scheme, host, partes.path.rstrip('/'), query, partes.fragment))
+
+_registro = None
+_lock = threading.Lock()
+
+def obtener_registro():
+    """Registro con los perfiles integrados y los del usuario; se lee una sola vez"""
+    global _registro
+    with _lock:
+        if _registro is None:
+            _registro = RegistroPlataformas()
+        return _registro
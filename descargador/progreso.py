@@ -0,0 +1,139 @@
+"""Eventos de progreso estructurados y limitados en frecuencia
+
+Los hooks de yt-dlp se llaman por cada bloque descargado (con 16 fragmentos en
+paralelo son cientos por segundo). Aqui se convierten en un diccionario con
+numeros y se agrupan para emitir como maximo 'progreso_hz' eventos por segundo
+por trabajo, sin perder el ultimo de cada intervalo. La GUI, la linea de comandos y las metricas consumen los mismos
+eventos.
+"""
+import threading
+import time
+
+def datos_desde_hook(d, fase):
+    """Evento de progreso a partir del diccionario que yt-dlp pasa a progress_hooks"""
+    descargado = d.get('downloaded_bytes') or 0
+    total = d.get('total_bytes') or d.get('total_bytes_estimate')
+    datos = {
+        'fase': fase,
+        'descargado': descargado,
+        'total': int(total) if total else None,
+        'porcentaje': None,
+        'velocidad': d.get('speed'),
+        'eta': d.get('eta'),
+        'fragmento': d.get('fragment_index'),
+        'fragmentos': d.get('fragment_count'),
+        'archivo': d.get('filename'),
+    }
+    if total:
+        datos['porcentaje'] = round(min(100.0, descargado * 100.0 / total), 1)
+    elif datos['fragmento'] and datos['fragmentos']:
+        datos['porcentaje'] = round(datos['fragmento'] * 100.0 / datos['fragmentos'], 1)
+    return datos
+
+def formatear_bytes(cantidad):
+    if cantidad is None:
+        return "N/A"
+    for unidad in ('B', 'KiB', 'MiB', 'GiB'):
+        if cantidad < 1024:
+            return f"{cantidad:.1f} {unidad}"
+        cantidad /= 1024
+    return f"{cantidad:.1f} TiB"
+
+def formatear_eta(segundos):
+    if segundos is None:
+        return "N/A"
+    minutos, segundos = divmod(int(segundos), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas}:{minutos:02d}:{segundos:02d}" if horas else f"{minutos:02d}:{segundos:02d}"
+
+def formatear(datos):
+    """Texto para la barra de estado, equivalente al que se mostraba antes"""
+    porcentaje = f"{datos['porcentaje']:.1f}%" if datos['porcentaje'] is not None else "N/A"
+    velocidad = f"{formatear_bytes(datos['velocidad'])}/s" if datos['velocidad'] else "N/A"
+    return f"Descargando: {porcentaje} | Velocidad: {velocidad} | Tiempo: {formatear_eta(datos['eta'])}"
+
+class LimitadorEventos:
+    """Emite como maximo max_por_segundo eventos.
+    
+    Un evento que llega antes de tiempo queda pendiente, reemplazando al anterior, y
+    un hilo que vive mientras dure el trabajo lo emite al final del intervalo: si la
+    descarga se queda quieta, lo ultimo que se muestra es su estado real y no el de
+    hace un momento. Los eventos forzados (fin de un archivo) pasan siempre y
+    descartan el pendiente.
+    
+    yt-dlp llama a los hooks desde los hilos de fragmentos, asi que emitir se llama
+    fuera del lock: un hilo solo lo toma para anotar el evento. Cada evento lleva
+    un numero de secuencia y uno normal que llega a emitirse despues de otro mas
+    nuevo se descarta, para que el orden se mantenga.
+    """
+    def __init__(self, emitir, max_por_segundo=4):
+        self.emitir = emitir
+        self.intervalo = 1.0 / max_por_segundo if max_por_segundo > 0 else 0
+        self.ultimo = 0.0
+        self.pendiente = None
+        self.secuencia = 0
+        self.emitida = 0
+        self.hilo = None
+        self.cerrado = False
+        self.lock = threading.Lock()
+        self.cambio = threading.Condition(self.lock)
+        self.lock_emision = threading.Lock()
+    
+    def publicar(self, datos, forzar=False):
+        ahora = time.monotonic()
+        with self.lock:
+            self.cerrado = False
+            self.secuencia += 1
+            restante = self.ultimo + self.intervalo - ahora
+            if not forzar and restante > 0:
+                self.pendiente = (self.secuencia, datos)
+                if self.hilo is None:
+                    self.hilo = threading.Thread(target=self.vaciar, name='progreso', daemon=True)
+                    self.hilo.start()
+                else:
+                    self.cambio.notify()
+                return
+            self.pendiente = None
+            self.ultimo = ahora
+            secuencia = self.secuencia
+        self.entregar(secuencia, datos, forzar)
+    
+    def entregar(self, secuencia, datos, forzar=False):
+        """Llama a emitir sin el lock de estado; un evento normal adelantado por otro mas nuevo no sale"""
+        with self.lock_emision:
+            if secuencia < self.emitida and not forzar:
+                return
+            self.emitida = max(self.emitida, secuencia)
+            self.emitir(datos)
+    
+    def vaciar(self):
+        """Hilo que emite el evento pendiente al final de cada intervalo hasta cerrar()"""
+        with self.lock:
+            while not self.cerrado:
+                if self.pendiente is None:
+                    self.cambio.wait()
+                    continue
+                restante = self.ultimo + self.intervalo - time.monotonic()
+                if restante > 0:
+                    self.cambio.wait(restante)
+                    continue
+                (secuencia, datos), self.pendiente = self.pendiente, None
+                self.ultimo = time.monotonic()
+                self.lock.release()
+                try:
+                    self.entregar(secuencia, datos)
+                finally:
+                    self.lock.acquire()
+            self.hilo = None
+    
+    def cerrar(self):
+        """El trabajo salio de la descarga: un progreso pendiente ya no debe llegar despues"""
+        with self.lock:
+            self.pendiente = None
+            self.cerrado = True
+            self.secuencia += 1
+            corte = self.secuencia
+            self.cambio.notify()
+        # Espera a que termine una emision en curso y descarta las que aun no empezaron
+        with self.lock_emision:
+            self.emitida = max(self.emitida, corte)
@@ -0,0 +1,297 @@
+"""Descarga de archivos progresivos por rangos HTTP en varias conexiones
+
+concurrent_fragment_downloads solo sirve para formatos fragmentados (HLS,
+DASH). Un mp4 progresivo (Facebook, TikTok, 'best[ext=mp4]/best') se bajaba
+por una sola conexion y chocaba con el limite por conexion de las CDN.
+
+envolver() hace que el YoutubeDL use SegmentadoFD para las descargas http/https
+de un solo archivo cuando 'conexiones_por_archivo' es mayor que 1. Antes de
+empezar se pide el byte 0: si el servidor responde 206 con el tamano total, el
+archivo se reparte en piezas que bajan 'conexiones_por_archivo' conexiones a
+la vez. Cada pieza se escribe en su posicion del .part (sin unir nada al final)
+y se reintenta por su cuenta desde el byte en que se corto. Las piezas
+terminadas se anotan junto al .part para reanudar, con el ETag y el
+Last-Modified del servidor: si al reanudar no coinciden el archivo cambio y se
+empieza de cero. Si el servidor no acepta rangos o el archivo es pequeno se usa
+el HttpFD normal de yt-dlp.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+log = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# Por debajo de este tamano no compensa abrir varias conexiones
+TAMANO_MINIMO = 4 * MB
+PIEZA_MINIMA = 1 * MB
+PIEZA_MAXIMA = 32 * MB
+# Piezas por conexion: con varias cada una, una conexion lenta no retrasa el final
+PIEZAS_POR_CONEXION = 4
+TAMANO_BLOQUE = 256 * 1024
+INTERVALO_PROGRESO = 0.25
+ESPERA_MAXIMA_REINTENTO = 10
+
+class PiezaFallida(Exception):
+    """Una pieza agoto sus reintentos"""
+
+def admite_segmentos(params, info, nombre):
+    """True si la descarga es un solo archivo por http/https que se puede repartir en rangos"""
+    from yt_dlp.utils import determine_protocol
+    if (params.get('conexiones_por_archivo') or 0) < 2 or nombre == '-' or params.get('external_downloader'):
+        return False
+    if info.get('fragments') or info.get('request_data') or info.get('is_live'):
+        return False
+    cabeceras = {clave.lower() for clave in (info.get('http_headers') or {})}
+    return 'range' not in cabeceras and determine_protocol(info) in ('http', 'https')
+
+def tamano_pieza(total, conexiones, limite=None):
+    """Tamano de pieza para repartir total bytes; limite es el http_chunk_size del extractor"""
+    pieza = total // (conexiones * PIEZAS_POR_CONEXION)
+    pieza = max(PIEZA_MINIMA, min(PIEZA_MAXIMA, pieza))
+    return min(pieza, limite) if limite else pieza
+
+def leer_estado(archivo):
+    try:
+        with open(archivo, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def guardar_estado(archivo, estado):
+    temporal = f"{archivo}.tmp"
+    with open(temporal, 'w') as f:
+        json.dump(estado, f)
+    os.replace(temporal, archivo)
+
+_clase_fd = None
+
+def clase_fd():
+    """SegmentadoFD; se define al primer uso porque hereda de HttpFD y yt_dlp se importa tarde"""
+    global _clase_fd
+    if _clase_fd is None:
+        from yt_dlp.downloader.http import HttpFD
+        from yt_dlp.networking import Request
+        from yt_dlp.networking.exceptions import HTTPError, RequestError
+        from yt_dlp.utils import parse_http_range
+        from yt_dlp.utils.networking import HTTPHeaderDict
+        
+        class SegmentadoFD(HttpFD):
+            def real_download(self, filename, info_dict):
+                self.cabeceras = HTTPHeaderDict({'Accept-Encoding': 'identity'}, info_dict.get('http_headers'))
+                self.extensiones = {}
+                impersonar = self._get_impersonate_target(info_dict)
+                if impersonar is not None:
+                    self.extensiones['impersonate'] = impersonar
+                
+                total, validadores = self.sondear(info_dict['url'])
+                conexiones = self.params.get('conexiones_por_archivo') or 1
+                tmpfilename = self.temp_name(filename)
+                archivo_estado = f"{tmpfilename}.segmentos"
+                if total is None or total < TAMANO_MINIMO or tmpfilename == filename:
+                    if os.path.exists(archivo_estado):
+                        # El .part tiene huecos: HttpFD lo tomaria como un prefijo continuo
+                        self.try_remove(tmpfilename)
+                        self.try_remove(archivo_estado)
+                    return super().real_download(filename, info_dict)
+                
+                limite = self.params.get('http_chunk_size') or (
+                    info_dict.get('downloader_options') or {}).get('http_chunk_size')
+                pieza = tamano_pieza(total, conexiones, limite)
+                hechas = self.preparar_parcial(tmpfilename, archivo_estado, total, pieza, validadores)
+                piezas = [(inicio, min(inicio + pieza, total)) for inicio in range(0, total, pieza)]
+                pendientes = [rango for rango in piezas if rango[0] not in hechas]
+                
+                self.report_destination(filename)
+                if hechas:
+                    self.to_screen(f"[download] Reanudando: {len(hechas)} de {len(piezas)} piezas ya descargadas")
+                self.to_screen(f"[download] {len(pendientes)} piezas de {pieza // 1024} KiB en {conexiones} conexiones")
+                
+                self.lock = threading.Lock()
+                self.detener = threading.Event()
+                self.descargados = sum(min(inicio + pieza, total) - inicio for inicio in hechas)
+                self.inicio = time.time()
+                self.base_limite = (None, self.inicio, 0)
+                contexto = {
+                    'url': info_dict['url'], 'tmpfilename': tmpfilename, 'archivo_estado': archivo_estado,
+                    'total': total, 'pieza': pieza, 'hechas': hechas, 'validadores': validadores,
+                }
+                inicial = self.descargados
+                
+                with ThreadPoolExecutor(max_workers=conexiones, thread_name_prefix='segmento') as ejecutor:
+                    futuros = {ejecutor.submit(self.bajar_pieza, contexto, inicio, fin) for inicio, fin in pendientes}
+                    try:
+                        while futuros:
+                            terminados, futuros = wait(futuros, timeout=INTERVALO_PROGRESO, return_when=FIRST_EXCEPTION)
+                            for futuro in terminados:
+                                futuro.result()
+                            self.informar(filename, tmpfilename, total, inicial, info_dict)
+                    finally:
+                        # Cancelacion o pieza fallida: las demas conexiones terminan en el siguiente bloque
+                        self.detener.set()
+                
+                # El .part ya mide total desde el principio: lo que dice si esta completo es el estado
+                estado = leer_estado(archivo_estado) or {}
+                faltan = [inicio for inicio, _ in piezas if inicio not in set(estado.get('hechas', []))]
+                if faltan:
+                    raise PiezaFallida(f"Faltan {len(faltan)} de {len(piezas)} piezas (la primera en el byte {faltan[0]})")
+                self.try_remove(archivo_estado)
+                self.try_rename(tmpfilename, filename)
+                if validadores['last_modified'] and self.params.get('updatetime'):
+                    self.try_utime(filename, validadores['last_modified'])
+                self._hook_progress({
+                    'downloaded_bytes': total,
+                    'total_bytes': total,
+                    'filename': filename,
+                    'status': 'finished',
+                    'elapsed': time.time() - self.inicio,
+                }, info_dict)
+                return True
+            
+            def peticion(self, url, inicio, fin=None):
+                cabeceras = HTTPHeaderDict(self.cabeceras, {'Range': f"bytes={inicio}-{'' if fin is None else fin}"})
+                return Request(url, None, cabeceras, extensions=self.extensiones)
+            
+            def sondear(self, url):
+                """(tamano total, {'etag', 'last_modified'}) si el servidor acepta rangos, o (None, None)"""
+                try:
+                    respuesta = self.ydl.urlopen(self.peticion(url, 0, 0))
+                except RequestError as e:
+                    log.debug("Sondeo de rangos fallido, se descarga en una conexion: %s", e)
+                    return None, None
+                try:
+                    inicio, _, total = parse_http_range(respuesta.headers.get('Content-Range'))
+                    if respuesta.status != 206 or inicio != 0 or not total:
+                        return None, None
+                    return total, {
+                        'etag': respuesta.headers.get('etag'),
+                        'last_modified': respuesta.headers.get('last-modified'),
+                    }
+                finally:
+                    respuesta.close()
+            
+            def preparar_parcial(self, tmpfilename, archivo_estado, total, pieza, validadores):
+                """Deja el .part con el tamano final y retorna los inicios de las piezas ya terminadas"""
+                hechas = set()
+                if self.params.get('continuedl', True) and os.path.isfile(tmpfilename):
+                    estado = leer_estado(archivo_estado)
+                    if estado is not None:
+                        if estado.get('validadores') != validadores:
+                            self.to_screen("[download] El archivo cambio en el servidor: se empieza de cero")
+                        elif estado.get('total') == total and estado.get('pieza') == pieza:
+                            hechas = set(estado.get('hechas', []))
+                    else:
+                        # .part de una descarga en una conexion: su contenido es un prefijo continuo
+                        prefijo = os.path.getsize(tmpfilename)
+                        hechas = {inicio for inicio in range(0, total, pieza)
+                                  if min(inicio + pieza, total) <= prefijo}
+                modo = 'r+b' if hechas else 'wb'
+                with open(tmpfilename, modo) as f:
+                    f.truncate(total)
+                guardar_estado(archivo_estado, {
+                    'total': total, 'pieza': pieza, 'hechas': sorted(hechas), 'validadores': validadores,
+                })
+                return hechas
+            
+            def bajar_pieza(self, contexto, inicio, fin):
+                """Descarga [inicio, fin) en su posicion del .part; reintenta desde donde se corto"""
+                posicion = inicio
+                reintentos = self.params.get('retries', 10)
+                intento = 0
+                with open(contexto['tmpfilename'], 'r+b') as f:
+                    while posicion < fin:
+                        if self.detener.is_set():
+                            return
+                        try:
+                            posicion = self.leer_rango(contexto['url'], f, posicion, fin)
+                        except (RequestError, ConnectionError, TimeoutError) as e:
+                            estado = e.status if isinstance(e, HTTPError) else None
+                            if estado is not None and estado < 500 and estado != 429:
+                                raise
+                            intento += 1
+                            if intento > reintentos:
+                                raise PiezaFallida(f"Pieza {inicio}-{fin - 1}: {e}") from e
+                            self.report_retry(e, intento, reintentos, fatal=False)
+                            self.detener.wait(min(2 ** (intento - 1), ESPERA_MAXIMA_REINTENTO))
+                if posicion >= fin:
+                    with self.lock:
+                        contexto['hechas'].add(inicio)
+                        guardar_estado(contexto['archivo_estado'], {
+                            'total': contexto['total'], 'pieza': contexto['pieza'],
+                            'hechas': sorted(contexto['hechas']), 'validadores': contexto['validadores'],
+                        })
+            
+            def leer_rango(self, url, f, posicion, fin):
+                """Copia al archivo lo que llegue de [posicion, fin) y retorna la posicion alcanzada"""
+                respuesta = self.ydl.urlopen(self.peticion(url, posicion, fin - 1))
+                try:
+                    inicio, _, _ = parse_http_range(respuesta.headers.get('Content-Range'))
+                    if respuesta.status != 206 or inicio != posicion:
+                        raise PiezaFallida(f"El servidor no respeto el rango {posicion}-{fin - 1}")
+                    f.seek(posicion)
+                    while posicion < fin and not self.detener.is_set():
+                        bloque = respuesta.read(min(TAMANO_BLOQUE, fin - posicion))
+                        if not bloque:
+                            raise ConnectionError(f"Conexion cerrada en el byte {posicion}")
+                        f.write(bloque)
+                        posicion += len(bloque)
+                        self.contar(len(bloque))
+                    return posicion
+                finally:
+                    respuesta.close()
+            
+            def contar(self, cantidad):
+                """Suma bytes al total y frena si se supera el ratelimit, que es para todas las conexiones juntas"""
+                with self.lock:
+                    self.descargados += cantidad
+                    limite = self.params.get('ratelimit')
+                    ahora = time.time()
+                    if limite != self.base_limite[0]:
+                        # El reparto de ancho de banda cambia el limite en marcha: se mide desde el cambio
+                        self.base_limite = (limite, ahora, self.descargados)
+                    _, desde, bytes_base = self.base_limite
+                    espera = (self.descargados - bytes_base) / limite - (ahora - desde) if limite else 0
+                if espera > 0:
+                    self.detener.wait(espera)
+            
+            def informar(self, filename, tmpfilename, total, inicial, info_dict):
+                with self.lock:
+                    descargados = self.descargados
+                transcurrido = time.time() - self.inicio
+                velocidad = (descargados - inicial) / transcurrido if transcurrido > 0 else None
+                self._hook_progress({
+                    'status': 'downloading',
+                    'downloaded_bytes': descargados,
+                    'total_bytes': total,
+                    'tmpfilename': tmpfilename,
+                    'filename': filename,
+                    'eta': (total - descargados) / velocidad if velocidad else None,
+                    'speed': velocidad,
+                    'elapsed': transcurrido,
+                }, info_dict)
+        
+        _clase_fd = SegmentadoFD
+    
+    return _clase_fd
+
+def envolver(ydl):
+    """Hace que el YoutubeDL descargue por rangos los archivos que lo admitan (ver admite_segmentos)"""
+    dl_original = ydl.dl
+    
+    def dl(name, info, subtitle=False, test=False):
+        if subtitle or test or not info.get('url') or not admite_segmentos(ydl.params, info, name):
+            return dl_original(name, info, subtitle, test)
+        # Lo mismo que YoutubeDL.dl, pero con SegmentadoFD en lugar del que elegiria yt-dlp
+        fd = clase_fd()(ydl, ydl.params)
+        for hook in ydl._progress_hooks:
+            fd.add_progress_hook(hook)
+        info = ydl._copy_infodict(info)
+        if info.get('http_headers') is None:
+            info['http_headers'] = ydl._calc_headers(info)
+        return fd.download(name, info, subtitle)
+    
+    ydl.dl = dl
+    return ydl
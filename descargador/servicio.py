@@ -0,0 +1,382 @@
+"""Servicio local: yt-dlp cargado en memoria y una API HTTP para encolar trabajos
+
+Abrir la aplicacion para cada video obliga a importar yt-dlp y sus extractores
+cada vez. El servicio (python -m descargador --servicio) mantiene una sola
+ColaDescargas viva, con yt-dlp, FFmpeg, sesiones y cookies ya cargados, y la
+expone en http://127.0.0.1:8765 (servicio_puerto) y opcionalmente en un socket
+Unix. La GUI, la linea de comandos (--remoto), scripts y marcadores del
+navegador encolan trabajos ahi:
+  
+  GET    /estado               version, trabajos activos y total
+  GET    /trabajos             lista de trabajos
+  POST   /trabajos             {"url" o "urls", "carpeta", "formato", "calidad", "prioridad", "peso"}
+  GET    /trabajos/<id>        un trabajo
+  PATCH  /trabajos/<id>        {"prioridad", "peso"}
+  DELETE /trabajos/<id>        cancela el trabajo (y las entradas de una lista)
+  POST   /limpiar              quita los trabajos terminados
+  POST   /reanudar             retoma los trabajos del diario
+  POST   /configuracion        vuelve a leer el archivo de configuracion
+  GET    /metricas             JSON; ?formato=prometheus o ?formato=resumen para texto
+  GET    /eventos              Server-Sent Events: el estado de todos los trabajos y luego cada cambio
+
+Por TCP cada peticion lleva el token de ~/.3ox_downloader/servicio_token en
+la cabecera 'Authorization: Bearer <token>': sin el, cualquier pagina abierta
+en el navegador podria encolar descargas. No se acepta en la URL, donde
+quedaria en el historial y en los Referer de cualquier pagina. El socket Unix
+solo lo puede abrir el usuario y no pide token.
+"""
+import json
+import logging
+import math
+import os
+import queue
+import secrets
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from .cola import ColaDescargas
+from .config import cargar_configuracion, CONFIG_FILE, CARPETA_POR_DEFECTO, DIRECTORIO_DATOS
+from .ffmpeg import precargar_ffmpeg
+from .nucleo import precargar_yt_dlp
+
+log = logging.getLogger(__name__)
+
+VERSION_API = 1
+PUERTO_POR_DEFECTO = 8765
+# Puerto, socket y pid del servicio en marcha, para que los clientes lo encuentren
+ARCHIVO_SERVICIO = DIRECTORIO_DATOS / "servicio.json"
+ARCHIVO_TOKEN = DIRECTORIO_DATOS / "servicio_token"
+# Eventos sin leer por suscriptor antes de desconectarlo por lento
+MAX_EVENTOS_PENDIENTES = 1000
+INTERVALO_LATIDO = 15
+MAX_CUERPO = 1024 * 1024
+
+def escribir_privado(ruta, contenido):
+    """Escritura atomica de un archivo legible solo por el usuario"""
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    temporal = ruta.with_name(ruta.name + '.tmp')
+    descriptor = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+def leer_token(crear=False):
+    """Token fijo entre reinicios, para que los marcadores del navegador sigan funcionando"""
+    try:
+        token = ARCHIVO_TOKEN.read_text().strip()
+        if token:
+            return token
+    except OSError:
+        pass
+    if not crear:
+        return None
+    token = secrets.token_urlsafe(24)
+    escribir_privado(ARCHIVO_TOKEN, token)
+    return token
+
+class ErrorPeticion(Exception):
+    def __init__(self, codigo, mensaje):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+def leer_prioridad(datos, defecto=None):
+    """'prioridad' de la peticion como entero; lanza ErrorPeticion(400) si no lo es"""
+    prioridad = datos.get('prioridad', defecto)
+    if prioridad is None:
+        return defecto
+    if isinstance(prioridad, bool) or not isinstance(prioridad, int):
+        raise ErrorPeticion(400, "'prioridad' debe ser un numero entero")
+    return prioridad
+
+def leer_peso(datos, defecto=None):
+    """'peso' de la peticion como numero positivo: un peso 0 o invalido romperia el reparto del ancho de banda"""
+    peso = datos.get('peso', defecto)
+    if peso is None:
+        return defecto
+    if isinstance(peso, bool) or not isinstance(peso, (int, float)) or not math.isfinite(peso) or peso <= 0:
+        raise ErrorPeticion(400, "'peso' debe ser un numero mayor que 0")
+    return float(peso)
+
+def leer_calidad(datos):
+    """'calidad' de la peticion como objeto de textos (resolucion, fps...); lanza ErrorPeticion(400) si no lo es"""
+    calidad = datos.get('calidad') or {}
+    if not isinstance(calidad, dict) or not all(isinstance(valor, str) for valor in calidad.values()):
+        raise ErrorPeticion(400, "'calidad' debe ser un objeto con valores de texto")
+    return calidad
+
+class ManejadorApi(BaseHTTPRequestHandler):
+    server_version = "3oX-Downloader"
+    
+    def log_message(self, formato, *args):
+        log.debug(formato, *args)
+    
+    @property
+    def servicio(self):
+        return self.server.servicio
+    
+    def do_OPTIONS(self):
+        # Preflight de CORS para los marcadores del navegador
+        self.send_response(204)
+        self.cabeceras_cors()
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PATCH, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Authorization, Content-Type')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def do_GET(self):
+        self.atender('GET')
+    
+    def do_POST(self):
+        self.atender('POST')
+    
+    def do_PATCH(self):
+        self.atender('PATCH')
+    
+    def do_DELETE(self):
+        self.atender('DELETE')
+    
+    def cabeceras_cors(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+    
+    def autorizado(self):
+        if isinstance(self.server, ServidorUnix):
+            return True
+        token = self.headers.get('Authorization', '')
+        return token.startswith('Bearer ') and secrets.compare_digest(token[7:], self.servicio.token)
+    
+    def atender(self, metodo):
+        partes = urlsplit(self.path)
+        consulta = parse_qs(partes.query)
+        ruta = [parte for parte in partes.path.split('/') if parte]
+        try:
+            if not self.autorizado():
+                raise ErrorPeticion(401, "Token invalido")
+            if ruta == ['eventos'] and metodo == 'GET':
+                return self.enviar_eventos()
+            codigo, respuesta = self.servicio.atender(metodo, ruta, consulta, self.leer_cuerpo())
+        except ErrorPeticion as e:
+            codigo, respuesta = e.codigo, {'error': str(e)}
+        except Exception as e:
+            log.exception("Error atendiendo %s %s", metodo, partes.path)
+            codigo, respuesta = 500, {'error': str(e)}
+        self.responder(codigo, respuesta)
+    
+    def leer_cuerpo(self):
+        longitud = int(self.headers.get('Content-Length') or 0)
+        if not longitud:
+            return {}
+        if longitud > MAX_CUERPO:
+            raise ErrorPeticion(413, "Cuerpo demasiado grande")
+        # Se acepta JSON con cualquier Content-Type, no solo application/json
+        try:
+            datos = json.loads(self.rfile.read(longitud).decode('utf-8'))
+        except ValueError:
+            raise ErrorPeticion(400, "El cuerpo no es JSON valido")
+        if not isinstance(datos, dict):
+            raise ErrorPeticion(400, "El cuerpo debe ser un objeto JSON")
+        return datos
+    
+    def responder(self, codigo, respuesta):
+        if isinstance(respuesta, str):
+            cuerpo, tipo = respuesta.encode('utf-8'), 'text/plain; charset=utf-8'
+        else:
+            cuerpo, tipo = json.dumps(respuesta, ensure_ascii=False).encode('utf-8'), 'application/json'
+        self.send_response(codigo)
+        self.cabeceras_cors()
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+    
+    def enviar_eventos(self):
+        self.send_response(200)
+        self.cabeceras_cors()
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        eventos = self.servicio.suscribir()
+        try:
+            while not self.servicio.detenido.is_set():
+                try:
+                    evento, datos = eventos.get(timeout=INTERVALO_LATIDO)
+                except queue.Empty:
+                    # Comentario SSE: mantiene viva la conexion y detecta clientes que se fueron
+                    self.wfile.write(b": latido\n\n")
+                else:
+                    if evento is None:
+                        break
+                    linea = json.dumps(datos, ensure_ascii=False)
+                    self.wfile.write(f"event: {evento}\ndata: {linea}\n\n".encode('utf-8'))
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            self.servicio.desuscribir(eventos)
+
+class ServidorUnix(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    
+    def get_request(self):
+        # BaseHTTPRequestHandler espera una direccion (host, puerto)
+        conexion, _ = super().get_request()
+        return conexion, ('unix', 0)
+
+class ServicioDescargas:
+    """ColaDescargas de larga duracion detras de la API HTTP"""
+    def __init__(self, config, puerto=None, socket_unix=None, archivo_config=CONFIG_FILE):
+        self.config = config
+        self.archivo_config = archivo_config
+        self.puerto = puerto if puerto is not None else config.get('servicio_puerto', PUERTO_POR_DEFECTO)
+        self.socket_unix = socket_unix
+        self.token = leer_token(crear=True)
+        self.lock = threading.Lock()
+        self.suscriptores = set()
+        self.detenido = threading.Event()
+        self.servidores = []
+        self.cola = ColaDescargas(config, al_actualizar=self.al_actualizar)
+    
+    def iniciar(self):
+        servidor = ThreadingHTTPServer(('127.0.0.1', self.puerto), ManejadorApi)
+        servidor.servicio = self
+        self.puerto = servidor.server_address[1]
+        self.servidores.append(servidor)
+        if self.socket_unix:
+            if os.path.exists(self.socket_unix):
+                os.unlink(self.socket_unix)
+            servidor = ServidorUnix(self.socket_unix, ManejadorApi)
+            os.chmod(self.socket_unix, 0o600)
+            servidor.servicio = self
+            self.servidores.append(servidor)
+        for servidor in self.servidores:
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        
+        escribir_privado(ARCHIVO_SERVICIO, json.dumps({
+            'puerto': self.puerto, 'socket': self.socket_unix, 'pid': os.getpid(), 'version': VERSION_API,
+        }))
+        # Lo que antes pagaba cada arranque de la aplicacion se paga una vez aqui
+        precargar_yt_dlp()
+        precargar_ffmpeg(self.config.get('ffmpeg_path', ''))
+        self.cola.reanudar()
+        if self.socket_unix:
+            log.info("Servicio escuchando en http://127.0.0.1:%s y %s", self.puerto, self.socket_unix)
+        else:
+            log.info("Servicio escuchando en http://127.0.0.1:%s", self.puerto)
+        return self
+    
+    def detener(self):
+        if self.detenido.is_set():
+            return
+        self.detenido.set()
+        with self.lock:
+            for eventos in self.suscriptores:
+                eventos.put((None, None))
+        for servidor in self.servidores:
+            servidor.shutdown()
+            servidor.server_close()
+        if self.socket_unix and os.path.exists(self.socket_unix):
+            os.unlink(self.socket_unix)
+        try:
+            with open(ARCHIVO_SERVICIO, 'r') as f:
+                propio = json.load(f).get('pid') == os.getpid()
+            if propio:
+                os.unlink(ARCHIVO_SERVICIO)
+        except (OSError, ValueError):
+            pass
+        # Las descargas en curso quedan en el diario y se reanudan en el proximo arranque
+        self.cola.cerrar()
+        log.info("Servicio detenido")
+    
+    def suscribir(self):
+        """Cola de eventos de un cliente, empezando por el estado actual de cada trabajo"""
+        eventos = queue.Queue(MAX_EVENTOS_PENDIENTES)
+        with self.lock:
+            for trabajo in list(self.cola.trabajos.values()):
+                eventos.put(('trabajo', trabajo.a_dict()))
+            self.suscriptores.add(eventos)
+        return eventos
+    
+    def desuscribir(self, eventos):
+        with self.lock:
+            self.suscriptores.discard(eventos)
+    
+    def publicar(self, evento, datos):
+        with self.lock:
+            for eventos in list(self.suscriptores):
+                try:
+                    eventos.put_nowait((evento, datos))
+                except queue.Full:
+                    log.warning("Cliente de eventos demasiado lento, se desconecta")
+                    self.suscriptores.discard(eventos)
+                    with eventos.mutex:
+                        eventos.queue.clear()
+                    eventos.put_nowait((None, None))
+    
+    def al_actualizar(self, trabajo):
+        self.publicar('trabajo', trabajo.a_dict())
+    
+    def buscar(self, id_texto):
+        try:
+            trabajo = self.cola.trabajos.get(int(id_texto))
+        except ValueError:
+            trabajo = None
+        if trabajo is None:
+            raise ErrorPeticion(404, f"No existe el trabajo {id_texto}")
+        return trabajo
+    
+    def atender(self, metodo, ruta, consulta, datos):
+        """(codigo, respuesta) para una peticion de la API"""
+        if ruta == ['estado'] and metodo == 'GET':
+            return 200, {'version': VERSION_API, 'pid': os.getpid(), 'activos': self.cola.num_activos(),
+                         'trabajos': len(self.cola.trabajos)}
+        if ruta == ['trabajos'] and metodo == 'GET':
+            return 200, [trabajo.a_dict() for trabajo in list(self.cola.trabajos.values())]
+        if ruta == ['trabajos'] and metodo == 'POST':
+            return 201, self.encolar(datos)
+        if len(ruta) == 2 and ruta[0] == 'trabajos':
+            trabajo = self.buscar(ruta[1])
+            if metodo == 'GET':
+                return 200, trabajo.a_dict()
+            if metodo == 'PATCH':
+                self.cola.cambiar_prioridad(trabajo.id, prioridad=leer_prioridad(datos), peso=leer_peso(datos))
+                return 200, trabajo.a_dict()
+            if metodo == 'DELETE':
+                if not self.cola.cancelar(trabajo.id):
+                    raise ErrorPeticion(409, "El trabajo ya termino")
+                return 200, trabajo.a_dict()
+        if ruta == ['limpiar'] and metodo == 'POST':
+            terminados = self.cola.limpiar_terminados()
+            self.publicar('limpiados', {'ids': terminados})
+            return 200, {'ids': terminados}
+        if ruta == ['reanudar'] and metodo == 'POST':
+            return 200, {'ids': [trabajo.id for trabajo in self.cola.reanudar()]}
+        if ruta == ['configuracion'] and metodo == 'POST':
+            self.cola.config.update(cargar_configuracion(self.archivo_config))
+            self.cola.aplicar_configuracion()
+            return 200, {'ok': True}
+        if ruta == ['metricas'] and metodo == 'GET':
+            formato = consulta.get('formato', ['json'])[0]
+            if formato == 'prometheus':
+                return 200, self.cola.metricas.prometheus()
+            if formato == 'resumen':
+                return 200, self.cola.metricas.resumen()
+            return 200, self.cola.metricas.instantanea()
+        raise ErrorPeticion(404, f"{metodo} /{'/'.join(ruta)} no existe")
+    
+    def encolar(self, datos):
+        urls = datos.get('urls') or ([datos['url']] if datos.get('url') else [])
+        if not urls or not all(isinstance(url, str) and '://' in url for url in urls):
+            raise ErrorPeticion(400, "Falta 'url' o 'urls' con direcciones validas")
+        formato = datos.get('formato', 'video')
+        if formato not in ('video', 'audio'):
+            raise ErrorPeticion(400, "'formato' debe ser 'video' o 'audio'")
+        prioridad, peso = leer_prioridad(datos, 0), leer_peso(datos, 1.0)
+        calidad = leer_calidad(datos)
+        carpeta = datos.get('carpeta') or CARPETA_POR_DEFECTO
+        os.makedirs(carpeta, exist_ok=True)
+        ids = []
+        for url in urls:
+            trabajo = self.cola.agregar(url, carpeta, formato, calidad, prioridad=prioridad, peso=peso)
+            ids.append(trabajo.id)
+        return {'ids': ids}
@@ -0,0 +1,157 @@
+"""Instancias de YoutubeDL reutilizables entre trabajos
+
+Crear un YoutubeDL por descarga descarta el pool de conexiones HTTP, el cookie
+jar y los extractores ya inicializados. GestorSesiones guarda instancias
+"calientes" agrupadas por la huella de las opciones que las definen (cabeceras,
+cookies, limite de velocidad, postprocesadores...) y las presta a un solo
+trabajo a la vez. El formato, la plantilla de salida y los hooks se cambian en
+cada prestamo.
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from .nucleo import crear_ydl
+
+log = logging.getLogger(__name__)
+
+# Parametros que se fijan en cada prestamo. El trabajo anterior pudo cambiarlos durante la
+# descarga (el afinador escribe 'concurrent_fragment_downloads' y el reparto del ancho de
+# banda 'participacion_ancho'), asi que se restauran todos, esten o no en las opciones
+PARAMS_POR_TRABAJO = ('match_filter', 'ratelimit', 'al_elegir_formato', 'logger', 'colocar_en',
+                      'concurrent_fragment_downloads', 'participacion_ancho')
+# Opciones que cambian en cada trabajo y no forman parte de la huella. El jar de cookies
+# tampoco: su version va en 'origen_cookies', que si forma parte
+OPCIONES_POR_TRABAJO = ('format', 'outtmpl', 'progress_hooks', 'postprocessor_hooks', 'cookies_compartidas',
+                        *PARAMS_POR_TRABAJO)
+
+def huella_opciones(opciones):
+    estables = {
+        clave: valor for clave, valor in opciones.items()
+        if clave not in OPCIONES_POR_TRABAJO
+    }
+    texto = json.dumps(estables, sort_keys=True, default=repr)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+class SesionYDL:
+    """Un YoutubeDL con hooks fijos que reenvian a los del trabajo que lo tiene prestado"""
+    def __init__(self, opciones):
+        self.hooks_progreso = []
+        self.hooks_postprocesado = []
+        opciones = dict(opciones)
+        opciones['progress_hooks'] = [self.reenviar_progreso]
+        opciones['postprocessor_hooks'] = [self.reenviar_postprocesado]
+        self.ydl = crear_ydl(opciones)
+        self.ultimo_uso = time.monotonic()
+        self.usos = 0
+    
+    def reenviar_progreso(self, d):
+        for hook in self.hooks_progreso:
+            hook(d)
+    
+    def reenviar_postprocesado(self, d):
+        for hook in self.hooks_postprocesado:
+            hook(d)
+    
+    def preparar(self, opciones):
+        """Aplica las opciones propias del trabajo antes de prestar la instancia"""
+        self.hooks_progreso = list(opciones.get('progress_hooks', []))
+        self.hooks_postprocesado = list(opciones.get('postprocessor_hooks', []))
+        formato = opciones.get('format')
+        if formato != self.ydl.params.get('format'):
+            self.ydl.params['format'] = formato
+            # yt-dlp compila el selector de formato una sola vez en __init__
+            if hasattr(self.ydl, 'format_selector'):
+                self.ydl.format_selector = self.ydl.build_format_selector(formato) if formato else None
+        for clave in PARAMS_POR_TRABAJO:
+            if clave in opciones:
+                self.ydl.params[clave] = opciones[clave]
+            else:
+                self.ydl.params.pop(clave, None)
+        plantilla = opciones.get('outtmpl')
+        if plantilla:
+            actual = self.ydl.params.get('outtmpl')
+            if isinstance(actual, dict):
+                self.ydl.params['outtmpl'] = dict(actual, default=plantilla)
+            else:
+                self.ydl.params['outtmpl'] = {'default': plantilla}
+    
+    def liberar(self):
+        self.hooks_progreso = []
+        self.hooks_postprocesado = []
+        self.ultimo_uso = time.monotonic()
+        self.usos += 1
+    
+    def cerrar(self):
+        try:
+            self.ydl.close()
+        except Exception as e:
+            log.warning("Error al cerrar sesion de yt-dlp: %s", e)
+
+class GestorSesiones:
+    def __init__(self, max_libres=4, inactividad_max=600):
+        self.max_libres = max_libres
+        self.inactividad_max = inactividad_max
+        self.libres = {}
+        self.lock = threading.Lock()
+    
+    @contextlib.contextmanager
+    def prestar(self, opciones):
+        """Entrega un YoutubeDL listo para el trabajo; al terminar vuelve al pool.
+        
+        Si el trabajo falla la instancia se descarta, por si quedo en un estado raro.
+        """
+        huella = huella_opciones(opciones)
+        sesion = self.tomar(huella)
+        if sesion is None:
+            sesion = SesionYDL(opciones)
+        else:
+            log.info("Reutilizando sesion de yt-dlp (%s descargas previas)", sesion.usos)
+        sesion.preparar(opciones)
+        try:
+            yield sesion.ydl
+        except BaseException:
+            sesion.cerrar()
+            raise
+        sesion.liberar()
+        self.devolver(huella, sesion)
+    
+    def tomar(self, huella):
+        with self.lock:
+            self.cerrar_inactivas()
+            libres = self.libres.get(huella)
+            if libres:
+                return libres.pop()
+        return None
+    
+    def devolver(self, huella, sesion):
+        with self.lock:
+            libres = self.libres.setdefault(huella, [])
+            if len(libres) < self.max_libres:
+                libres.append(sesion)
+                return
+        sesion.cerrar()
+    
+    def cerrar_inactivas(self):
+        limite = time.monotonic() - self.inactividad_max
+        for huella in list(self.libres):
+            vigentes = []
+            for sesion in self.libres[huella]:
+                if sesion.ultimo_uso < limite:
+                    sesion.cerrar()
+                else:
+                    vigentes.append(sesion)
+            if vigentes:
+                self.libres[huella] = vigentes
+            else:
+                del self.libres[huella]
+    
+    def cerrar(self):
+        with self.lock:
+            for libres in self.libres.values():
+                for sesion in libres:
+                    sesion.cerrar()
+            self.libres = {}
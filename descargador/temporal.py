@@ -0,0 +1,148 @@
+"""Carpeta temporal para las descargas en curso y colocacion del archivo terminado
+
+Sin carpeta temporal los .part, los fragmentos y los intermedios de FFmpeg se
+escriben directamente en la carpeta de destino, que a menudo es un NAS o un
+disco USB lento. Con 'carpeta_temporal' (un tmpfs o un NVMe) todo eso ocurre
+ahi y ColocarArchivoPP lleva solo el resultado final al destino:
+  - en el mismo sistema de archivos con os.replace, atomico y sin copiar nada
+  - entre dispositivos con una copia por bloques a un archivo oculto en el
+    destino, que se renombra al terminar: nunca hay un archivo a medias con el
+    nombre final
+
+Como yt-dlp solo ve la carpeta temporal, filtro_existente (nucleo.py) omite
+el video si el archivo ya esta en el destino, salvo con 'sobrescribir'.
+
+Antes de descargar se comprueba que quepa: el doble del tamano estimado en la
+carpeta temporal (la union de video y audio convive con sus partes) y el
+tamano estimado en el destino cuando hay que copiar.
+"""
+import hashlib
+import logging
+import os
+import shutil
+
+log = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+class EspacioInsuficiente(Exception):
+    """No hay espacio para la descarga en la carpeta temporal o en el destino"""
+
+def carpeta_temporal(config, carpeta):
+    """Carpeta de trabajo para las descargas que van a carpeta, o None si se descarga directo al destino"""
+    raiz = config.get('carpeta_temporal', '')
+    if not raiz:
+        return None
+    raiz = os.path.abspath(os.path.expanduser(raiz))
+    destino = os.path.abspath(carpeta)
+    if raiz == destino:
+        return None
+    # Una subcarpeta por destino: dos videos con el mismo titulo para carpetas distintas no se pisan,
+    # y la ruta no cambia entre ejecuciones, asi que los .part se pueden reanudar
+    subcarpeta = os.path.join(raiz, hashlib.sha1(destino.encode('utf-8')).hexdigest()[:12])
+    try:
+        os.makedirs(subcarpeta, exist_ok=True)
+        libre = shutil.disk_usage(subcarpeta).free
+    except OSError as e:
+        log.warning("No se puede usar la carpeta temporal %s, se descarga directo al destino: %s", raiz, e)
+        return None
+    minimo = config.get('temporal_libre_minimo_mb', 1024) * MB
+    if libre < minimo:
+        log.warning("La carpeta temporal %s solo tiene %s MB libres, se descarga directo al destino", raiz, libre // MB)
+        return None
+    return subcarpeta
+
+def mismo_dispositivo(ruta, carpeta):
+    """True si mover ruta a carpeta es un simple renombrado"""
+    try:
+        return os.stat(ruta).st_dev == os.stat(carpeta).st_dev
+    except OSError:
+        return False
+
+def tamano_estimado(info):
+    """Bytes que ocupara la descarga segun los formatos elegidos, o None si alguno no lo indica"""
+    total = 0
+    for formato in info.get('requested_formats') or [info]:
+        tamano = formato.get('filesize') or formato.get('filesize_approx')
+        if not tamano:
+            return None
+        total += tamano
+    return total
+
+def comprobar_espacio(info, temporal, destino):
+    """Lanza EspacioInsuficiente si la descarga no cabe; sin tamano conocido no se comprueba nada"""
+    tamano = tamano_estimado(info)
+    if not tamano:
+        return
+    necesario = [(temporal, 2 * tamano, "la carpeta temporal")]
+    os.makedirs(destino, exist_ok=True)
+    if not mismo_dispositivo(temporal, destino):
+        necesario.append((destino, tamano, "la carpeta de destino"))
+    for carpeta, bytes_necesarios, nombre in necesario:
+        libre = shutil.disk_usage(carpeta).free
+        if libre < bytes_necesarios:
+            raise EspacioInsuficiente(
+                f"Espacio insuficiente en {nombre} {carpeta}: hacen falta {bytes_necesarios // MB} MB "
+                f"y quedan {libre // MB} MB")
+
+def archivo_existente(ruta, carpeta, extensiones=()):
+    """Archivo de carpeta con el nombre de ruta, con su extension o con alguna de extensiones, o None"""
+    base, ext = os.path.splitext(os.path.basename(ruta))
+    for extension in dict.fromkeys([ext.lstrip('.'), *extensiones]):
+        candidato = os.path.join(carpeta, f"{base}.{extension}")
+        if os.path.isfile(candidato):
+            return candidato
+    return None
+
+def colocar(origen, carpeta):
+    """Mueve el archivo terminado a carpeta y retorna su ruta final; reemplaza el que tuviera el mismo nombre"""
+    os.makedirs(carpeta, exist_ok=True)
+    destino = os.path.join(carpeta, os.path.basename(origen))
+    if mismo_dispositivo(origen, carpeta):
+        os.replace(origen, destino)
+        return destino
+    
+    parcial = os.path.join(carpeta, f".{os.path.basename(destino)}.colocando")
+    try:
+        # copyfile usa sendfile donde el sistema lo permite; si no, copia por bloques
+        shutil.copyfile(origen, parcial)
+        shutil.copystat(origen, parcial)
+        descriptor = os.open(parcial, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+        os.replace(parcial, destino)
+    except BaseException:
+        try:
+            os.remove(parcial)
+        except OSError:
+            pass
+        raise
+    os.remove(origen)
+    return destino
+
+_clase_pp = None
+
+def crear_pp_colocar(ydl):
+    """Postprocesador de yt-dlp que lleva el archivo final a params['colocar_en'], si esta definido"""
+    global _clase_pp
+    if _clase_pp is None:
+        from yt_dlp.postprocessor import PostProcessor
+        
+        class ColocarArchivoPP(PostProcessor):
+            def run(self, info):
+                carpeta = self._downloader.params.get('colocar_en')
+                ruta = info.get('filepath')
+                if not carpeta or not ruta or not os.path.exists(ruta):
+                    return [], info
+                if os.path.dirname(os.path.abspath(ruta)) == os.path.abspath(carpeta):
+                    return [], info
+                destino = colocar(ruta, carpeta)
+                self.to_screen(f'Archivo colocado en "{destino}"')
+                info['filepath'] = destino
+                return [], info
+        
+        _clase_pp = ColocarArchivoPP
+    
+    return _clase_pp(ydl)
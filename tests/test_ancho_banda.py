@@ -0,0 +1,158 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from descargador.ancho_banda import (
+    PresupuestoAncho, repartir_nivel, MINIMO_BYTES, ESTANCADO_SEGUNDOS, RAFAGA_SEGUNDOS
+)
+
+LIMITE = 1_000_000
+
+def participar(presupuesto, prioridad=0, peso=1.0, **params):
+    return presupuesto.participar(dict(params), prioridad, peso)
+
+def test_sin_limite_no_limita():
+    presupuesto = PresupuestoAncho(None)
+    p = participar(presupuesto)
+    assert p.cuota is None
+    assert p.consumir(10 ** 9) == 0
+
+def test_reparto_proporcional_al_peso():
+    presupuesto = PresupuestoAncho(LIMITE)
+    a = participar(presupuesto, peso=3)
+    b = participar(presupuesto, peso=1)
+    assert a.cuota == pytest.approx(750_000)
+    assert b.cuota == pytest.approx(250_000)
+
+def test_abandonar_devuelve_la_parte():
+    presupuesto = PresupuestoAncho(LIMITE)
+    a = participar(presupuesto)
+    b = participar(presupuesto)
+    presupuesto.abandonar(b)
+    assert a.cuota == pytest.approx(LIMITE)
+
+def test_nivel_mas_alto_se_sirve_primero():
+    presupuesto = PresupuestoAncho(LIMITE)
+    alta = participar(presupuesto, prioridad=1)
+    baja = participar(presupuesto, prioridad=0)
+    assert alta.cuota == pytest.approx(LIMITE)
+    # Aunque no le toque nada no se queda parada del todo
+    assert baja.cuota == MINIMO_BYTES
+
+def test_lo_que_no_usa_la_prioridad_alta_pasa_a_la_baja():
+    presupuesto = PresupuestoAncho(LIMITE)
+    alta = participar(presupuesto, prioridad=1)
+    baja = participar(presupuesto, prioridad=0)
+    alta.velocidad = 200_000
+    presupuesto.repartir(forzar=True)
+    assert alta.cuota == pytest.approx(250_000)
+    assert baja.cuota == pytest.approx(750_000)
+
+def test_water_filling_tope_en_la_demanda():
+    presupuesto = PresupuestoAncho(LIMITE)
+    lenta = participar(presupuesto)
+    rapida = participar(presupuesto)
+    # Usa mucho menos de su cuota de 500 KB/s: su demanda es velocidad * 1.25
+    lenta.velocidad = 80_000
+    presupuesto.repartir(forzar=True)
+    assert lenta.cuota == pytest.approx(100_000)
+    assert rapida.cuota == pytest.approx(900_000)
+
+def test_sobrante_se_reparte_si_todos_estan_saciados():
+    presupuesto = PresupuestoAncho(LIMITE)
+    a = participar(presupuesto)
+    b = participar(presupuesto)
+    a.velocidad = b.velocidad = 80_000
+    presupuesto.repartir(forzar=True)
+    assert a.cuota == pytest.approx(500_000)
+    assert b.cuota == pytest.approx(500_000)
+
+def test_descarga_atascada_no_demanda_nada():
+    presupuesto = PresupuestoAncho(LIMITE)
+    atascada = participar(presupuesto)
+    activa = participar(presupuesto)
+    atascada.ultimo_informe = time.monotonic() - ESTANCADO_SEGUNDOS - 1
+    cuotas, sobrante = repartir_nivel(float(LIMITE), [atascada, activa], time.monotonic())
+    assert cuotas[atascada] == 0
+    assert cuotas[activa] == pytest.approx(LIMITE)
+    assert sobrante == 0
+
+def test_cubo_de_fichas_compartido():
+    presupuesto = PresupuestoAncho(LIMITE)
+    p = participar(presupuesto)
+    # Las lecturas de todas las conexiones se suman: cada una espera detras de las anteriores
+    assert p.consumir(LIMITE // 2) == pytest.approx(0.5, abs=0.01)
+    assert p.consumir(LIMITE // 2) == pytest.approx(1.0, abs=0.01)
+    # Tras un rato sin leer solo se acumula una rafaga corta
+    p.repuesto -= 60
+    assert p.consumir(LIMITE * RAFAGA_SEGUNDOS) == pytest.approx(0, abs=0.01)
+
+def test_participar_y_abandonar_marcan_los_params():
+    presupuesto = PresupuestoAncho(LIMITE)
+    params = {}
+    p = presupuesto.participar(params)
+    assert params['participacion_ancho'] is p
+    presupuesto.abandonar(p)
+    assert 'participacion_ancho' not in params
+
+def test_cambiar_prioridad_y_limite_en_caliente():
+    presupuesto = PresupuestoAncho(LIMITE)
+    a = participar(presupuesto)
+    b = participar(presupuesto)
+    presupuesto.cambiar_prioridad(b, prioridad=2)
+    assert b.cuota == pytest.approx(LIMITE)
+    presupuesto.cambiar_limite(None)
+    assert a.cuota is None and b.cuota is None
+
+SEGMENTOS = 16
+TAMANO_SEGMENTO = 128 * 1024
+
+class ManejadorHls(BaseHTTPRequestHandler):
+    """Lista HLS con SEGMENTOS fragmentos de TAMANO_SEGMENTO bytes"""
+    def log_message(self, formato, *args):
+        pass
+    
+    def do_GET(self):
+        if self.path.startswith('/lista.m3u8'):
+            lineas = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:1', '#EXT-X-MEDIA-SEQUENCE:0']
+            for i in range(SEGMENTOS):
+                lineas += ['#EXTINF:1.0,', f'seg{i}.ts']
+            cuerpo = ('\n'.join(lineas + ['#EXT-X-ENDLIST']) + '\n').encode()
+            tipo = 'application/vnd.apple.mpegurl'
+        else:
+            cuerpo, tipo = b'\x47' * TAMANO_SEGMENTO, 'video/mp2t'
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+@pytest.fixture
+def servidor_hls():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManejadorHls)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{servidor.server_address[1]}/lista.m3u8'
+    servidor.shutdown()
+    servidor.server_close()
+
+def test_fragmentos_simultaneos_respetan_el_limite(servidor_hls, tmp_path):
+    pytest.importorskip('yt_dlp')
+    from descargador.nucleo import crear_ydl
+    limite = 1024 * 1024
+    presupuesto = PresupuestoAncho(limite)
+    ydl = crear_ydl({
+        'outtmpl': str(tmp_path / 'video.%(ext)s'), 'quiet': True, 'noprogress': True,
+        'concurrent_fragment_downloads': 8, 'hls_prefer_native': True,
+    })
+    with ydl:
+        participacion = presupuesto.participar(ydl.params)
+        inicio = time.monotonic()
+        ydl.download([servidor_hls])
+        transcurrido = time.monotonic() - inicio
+        presupuesto.abandonar(participacion)
+    total = SEGMENTOS * TAMANO_SEGMENTO
+    assert (tmp_path / 'video.mp4').stat().st_size == total
+    # Sin el cubo compartido cada uno de los 8 hilos iria al limite entero
+    assert transcurrido >= 0.9 * total / limite
@@ -0,0 +1,23 @@
+import pytest
+
+from descargador.audio import crear_pp_audio, decidir_audio
+from descargador.contenedor import ACCION_NINGUNA, ACCION_REMUX, ACCION_RECODIFICAR
+from descargador.ffmpeg import tiene_encoder
+
+def test_decidir_audio():
+    assert decidir_audio({'ext': 'mp3', 'acodec': 'mp3'}, ['mp3'])[0] == ACCION_NINGUNA
+    assert decidir_audio({'ext': 'webm', 'acodec': 'opus'}, ['opus', 'mp3'])[:2] == (ACCION_REMUX, 'opus')
+    assert decidir_audio({'ext': 'webm', 'acodec': 'opus'}, ['mp3'])[:2] == (ACCION_RECODIFICAR, 'mp3')
+
+def test_tiene_encoder():
+    assert tiene_encoder({'encoders': ['aac', 'libmp3lame']}, 'libmp3lame')
+    assert not tiene_encoder({'encoders': ['aac']}, 'libmp3lame')
+    # Si no se pudo listar, el sondeo no sirve para descartar nada
+    assert tiene_encoder({'encoders': []}, 'libmp3lame')
+
+def test_ffmpeg_sin_libmp3lame_da_un_error_claro(tmp_path):
+    yt_dlp = pytest.importorskip('yt_dlp')
+    ffmpeg = {'ruta': '/opt/ffmpeg', 'ffprobe': None, 'muxers': ['mp3'], 'encoders': ['aac', 'libopus']}
+    pp = crear_pp_audio(yt_dlp.YoutubeDL({'quiet': True}), ['mp3'], ffmpeg)
+    with pytest.raises(yt_dlp.utils.PostProcessingError, match='no incluye libmp3lame'):
+        pp.run({'ext': 'webm', 'acodec': 'opus', 'filepath': str(tmp_path / 'a.webm')})
@@ -0,0 +1,124 @@
+import pytest
+
+from descargador import cache_info
+from descargador.cache_info import CacheInfo, expiracion_urls_firmadas, MARGEN_EXPIRACION
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1_700_000_000.0
+    
+    def time(self):
+        return self.ahora
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cache_info, 'time', reloj)
+    return reloj
+
+@pytest.fixture
+def cache(tmp_path, reloj):
+    cache = CacheInfo(tmp_path / 'cache.sqlite3', ttl=3600)
+    yield cache
+    cache.cerrar()
+
+def info_con_url(url, titulo='Video'):
+    return {'title': titulo, 'formats': [{'format_id': '18', 'url': url}]}
+
+def test_guardar_y_obtener(cache):
+    clave = CacheInfo.clave('Youtube', 'https://www.youtube.com/watch?v=abc')
+    assert cache.obtener(clave) is None
+    assert cache.guardar(clave, 'Youtube', 'https://www.youtube.com/watch?v=abc', info_con_url('https://cdn/x.mp4'))
+    assert cache.obtener(clave)['title'] == 'Video'
+
+def test_caduca_con_el_ttl(cache, reloj):
+    clave = CacheInfo.clave('Generic', 'https://ex.com/v')
+    cache.guardar(clave, 'Generic', 'https://ex.com/v', info_con_url('https://cdn/x.mp4'))
+    reloj.ahora += 3599
+    assert cache.obtener(clave) is not None
+    reloj.ahora += 2
+    assert cache.obtener(clave) is None
+    # La entrada caducada se borra al leerla
+    reloj.ahora -= 10
+    assert cache.obtener(clave) is None
+
+def test_url_firmada_caduca_antes_que_el_ttl(cache, reloj):
+    expira = int(reloj.ahora) + 1200
+    clave = CacheInfo.clave('Youtube', 'https://youtu.be/abc')
+    cache.guardar(clave, 'Youtube', 'https://youtu.be/abc',
+                  info_con_url(f'https://rr1.googlevideo.com/videoplayback?expire={expira}&id=1'))
+    reloj.ahora = expira - MARGEN_EXPIRACION - 1
+    assert cache.obtener(clave) is not None
+    reloj.ahora += 2
+    assert cache.obtener(clave) is None
+
+def test_no_guarda_urls_a_punto_de_caducar(cache, reloj):
+    expira = int(reloj.ahora) + MARGEN_EXPIRACION - 1
+    clave = CacheInfo.clave('Generic', 'https://ex.com/v')
+    assert not cache.guardar(clave, 'Generic', 'https://ex.com/v', info_con_url(f'https://cdn/x.mp4?Expires={expira}'))
+    assert cache.obtener(clave) is None
+
+@pytest.mark.parametrize('url, esperado', [
+    ('https://cdn/a.m3u8?expire=1700001000&x=1', 1700001000),
+    ('https://cdn/exp=1700002000~acl=/*~hmac=ff', 1700002000),
+    ('https://cdn/a.mp4?x-expires=1700003000', 1700003000),
+    ('https://cdn/a.mp4?expires=12', None),
+])
+def test_expiracion_urls_firmadas(url, esperado):
+    assert expiracion_urls_firmadas(info_con_url(url)) == esperado
+
+def test_clave_ignora_el_rastreo_y_distingue_el_perfil():
+    base = CacheInfo.clave('Generic', 'https://ex.com/v?id=1')
+    assert CacheInfo.clave('Generic', 'https://www.ex.com/v/?id=1&utm_source=x') == base
+    assert CacheInfo.clave('Generic', 'https://ex.com/v?id=1', perfil='cookies') != base
+
+def test_expulsa_las_menos_usadas(tmp_path, reloj):
+    cache = CacheInfo(tmp_path / 'cache.sqlite3', ttl=3600, max_bytes=10**9)
+    claves = [CacheInfo.clave('Generic', f'https://ex.com/{i}') for i in range(3)]
+    for i, clave in enumerate(claves):
+        reloj.ahora += 1
+        cache.guardar(clave, 'Generic', f'https://ex.com/{i}', info_con_url(f'https://cdn/{i}.mp4'))
+    reloj.ahora += 1
+    cache.obtener(claves[0])
+    tamano = cache.conectar().execute("SELECT MAX(tamano) FROM entradas").fetchone()[0]
+    cache.max_bytes = 2 * tamano
+    reloj.ahora += 1
+    cache.guardar(claves[2], 'Generic', 'https://ex.com/2', info_con_url('https://cdn/2.mp4'))
+    assert cache.obtener(claves[1]) is None
+    assert cache.obtener(claves[0]) is not None
+    assert cache.obtener(claves[2]) is not None
+    cache.cerrar()
+
+def test_invalidar(cache):
+    clave = CacheInfo.clave('Generic', 'https://ex.com/v')
+    cache.guardar(clave, 'Generic', 'https://ex.com/v', info_con_url('https://cdn/x.mp4'))
+    cache.invalidar(clave)
+    assert cache.obtener(clave) is None
+
+def test_solo_reextrae_tras_errores_de_informacion_vieja():
+    pytest.importorskip('yt_dlp')
+    from yt_dlp.utils import DownloadError, DownloadCancelled, ExtractorError, PostProcessingError
+    from yt_dlp.networking.exceptions import HTTPError
+    from descargador.nucleo import error_de_informacion_vieja
+    
+    def envuelto(causa):
+        return DownloadError(str(causa), exc_info=(type(causa), causa, None))
+    
+    assert error_de_informacion_vieja(ExtractorError('sin formatos'))
+    assert error_de_informacion_vieja(DownloadError('ERROR: HTTP Error 403: Forbidden'))
+    assert error_de_informacion_vieja(envuelto(HTTPError(_Respuesta(403))))
+    assert not error_de_informacion_vieja(DownloadError('ERROR: No space left on device'))
+    assert not error_de_informacion_vieja(envuelto(PostProcessingError('ffmpeg fallo')))
+    assert not error_de_informacion_vieja(DownloadCancelled())
+    assert not error_de_informacion_vieja(OSError(28, 'No space left on device'))
+
+class _Respuesta:
+    """Lo minimo que HTTPError de yt-dlp lee de una respuesta"""
+    def __init__(self, status):
+        self.status = status
+        self.reason = 'Forbidden'
+        self.headers = {}
+        self.url = 'https://cdn/x.mp4'
+    
+    def close(self):
+        pass
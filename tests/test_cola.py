@@ -0,0 +1,19 @@
+from descargador.cola import ColaDescargas, TrabajoDescarga
+from descargador.nucleo import ESTADO_COMPLETADO
+
+CONFIG = {
+    'cache_info': False, 'historial': False, 'reanudar_trabajos': False, 'limitador_adaptativo': False,
+    'reutilizar_sesiones': False, 'autoajuste_hilos': False,
+}
+
+def test_limpiar_terminados_olvida_los_hijos_de_la_lista(tmp_path):
+    cola = ColaDescargas(dict(CONFIG))
+    lista = TrabajoDescarga(1, 'https://example.com/lista', str(tmp_path), 'video', {})
+    lista.estado = ESTADO_COMPLETADO
+    otra = TrabajoDescarga(2, 'https://example.com/otra', str(tmp_path), 'video', {})
+    cola.trabajos = {1: lista, 2: otra}
+    cola.hijos = {(1, 'https://example.com/a'), (1, 'https://example.com/b'), (2, 'https://example.com/c')}
+    
+    assert cola.limpiar_terminados() == [1]
+    assert cola.hijos == {(2, 'https://example.com/c')}
+    cola.cerrar()
@@ -0,0 +1,69 @@
+import subprocess
+
+import pytest
+
+from descargador import contenedor
+from descargador.contenedor import decidir, codec_base, ACCION_NINGUNA, ACCION_REMUX, ACCION_RECODIFICAR
+
+@pytest.mark.parametrize('codec, esperado', [
+    ('avc1.640028', 'avc1'),
+    ('OPUS', 'opus'),
+    ('none', None),
+    (None, None),
+])
+def test_codec_base(codec, esperado):
+    assert codec_base(codec) == esperado
+
+def test_ya_en_el_contenedor_destino():
+    assert decidir({'ext': 'mp4', 'vcodec': 'vp8'}) == (ACCION_NINGUNA, "ya es mp4")
+
+@pytest.mark.parametrize('vcodec, acodec', [
+    ('vp09.00.40.08', 'opus'),
+    ('av01.0.08M.08', 'mp4a.40.2'),
+    ('avc1.64001F', 'none'),
+])
+def test_codecs_compatibles_se_remuxan(vcodec, acodec):
+    accion, _ = decidir({'ext': 'webm', 'vcodec': vcodec, 'acodec': acodec})
+    assert accion == ACCION_REMUX
+
+def test_codec_incompatible_se_recodifica():
+    assert decidir({'ext': 'webm', 'vcodec': 'vp8', 'acodec': 'vorbis'}) == (ACCION_RECODIFICAR, "vp8 no cabe en mp4")
+    assert decidir({'ext': 'mkv', 'vcodec': 'avc1', 'acodec': 'vorbis'})[0] == ACCION_RECODIFICAR
+
+def test_codecs_de_los_formatos_pedidos():
+    info = {'ext': 'mkv', 'vcodec': None, 'acodec': None, 'requested_formats': [
+        {'vcodec': 'vp9', 'acodec': 'none'},
+        {'vcodec': 'none', 'acodec': 'opus'},
+    ]}
+    assert decidir(info) == (ACCION_REMUX, "vp9/opus caben en mp4")
+
+def test_codecs_desconocidos_sin_ffprobe():
+    assert decidir({'ext': 'flv'}) == (ACCION_RECODIFICAR, "codecs desconocidos")
+
+def test_codecs_desconocidos_se_leen_con_ffprobe(monkeypatch):
+    llamadas = []
+    
+    def codecs_con_ffprobe(ruta, ffprobe):
+        llamadas.append((ruta, ffprobe))
+        return 'h264', 'aac'
+    
+    monkeypatch.setattr(contenedor, 'codecs_con_ffprobe', codecs_con_ffprobe)
+    assert decidir({'ext': 'ts', 'filepath': '/tmp/v.ts'}, ffprobe='ffprobe')[0] == ACCION_REMUX
+    assert llamadas == [('/tmp/v.ts', 'ffprobe')]
+
+def test_fallo_de_ffprobe_recodifica(monkeypatch):
+    def falla(*args, **kwargs):
+        raise subprocess.TimeoutExpired('ffprobe', 30)
+    
+    monkeypatch.setattr(contenedor.subprocess, 'run', falla)
+    assert decidir({'ext': 'ts', 'filepath': '/tmp/v.ts'}, ffprobe='ffprobe')[0] == ACCION_RECODIFICAR
+
+def test_destino_sin_tabla_de_codecs_solo_remuxa():
+    assert decidir({'ext': 'webm', 'vcodec': 'vp8', 'acodec': 'vorbis'}, destino='mkv')[0] == ACCION_REMUX
+
+def test_ffmpeg_sin_muxer_mp4_da_un_error_claro():
+    yt_dlp = pytest.importorskip('yt_dlp')
+    ffmpeg = {'ruta': '/opt/ffmpeg', 'ffprobe': None, 'muxers': ['matroska', 'webm'], 'encoders': []}
+    pp = contenedor.crear_pp_contenedor(yt_dlp.YoutubeDL({'quiet': True}), 'mp4', ffmpeg)
+    with pytest.raises(yt_dlp.utils.PostProcessingError, match='no incluye el muxer mp4'):
+        pp.run({'ext': 'webm', 'vcodec': 'vp9', 'acodec': 'opus', 'filepath': '/tmp/v.webm'})
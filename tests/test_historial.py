@@ -0,0 +1,100 @@
+import pytest
+
+from descargador.historial import HistorialDescargas, normalizar_titulo
+
+@pytest.fixture
+def historial(tmp_path):
+    historial = HistorialDescargas(tmp_path / 'historial.sqlite3')
+    yield historial
+    historial.cerrar()
+
+def test_normalizar_titulo():
+    assert normalizar_titulo('  Mi Video: Parte 1/2?  ') == 'mi video parte 12'
+    assert normalizar_titulo('\uff26\uff55\uff4c\uff4c\u3000Width') == 'full width'
+
+def test_registrar_y_contiene(historial):
+    historial.registrar('Youtube', 'abc123def45', 'video:1080p|Mejor disponible', 'Titulo', '/v/Titulo.mp4')
+    assert historial.contiene('Youtube', 'abc123def45', 'video:1080p|Mejor disponible')
+    # Otro perfil, otro extractor u otro id son descargas distintas
+    assert not historial.contiene('Youtube', 'abc123def45', 'audio:mp3')
+    assert not historial.contiene('Vimeo', 'abc123def45', 'video:1080p|Mejor disponible')
+    assert not historial.contiene('Youtube', 'otro', 'video:1080p|Mejor disponible')
+    assert not historial.contiene('Youtube', None, 'video:1080p|Mejor disponible')
+
+def test_importar_carpeta(historial, tmp_path):
+    carpeta = tmp_path / 'videos'
+    (carpeta / 'sub').mkdir(parents=True)
+    (carpeta / 'Video con id [dQw4w9WgXcQ].mp4').write_bytes(b'')
+    (carpeta / 'sub' / 'Cancion: en vivo.MP3').write_bytes(b'')
+    (carpeta / 'notas.txt').write_text('no es un video')
+    (carpeta / 'Otro.webm.part').write_bytes(b'')
+    
+    assert historial.importar_carpeta(carpeta) == 2
+    # Por id: vale para cualquier extractor y cualquier perfil de video, no para audio
+    assert historial.contiene('Youtube', 'dQw4w9WgXcQ', 'video:720p|30|Mejor disponible|Mejor disponible')
+    assert not historial.contiene('Youtube', 'dQw4w9WgXcQ', 'audio:mp3')
+    # Por titulo, sin el id y normalizado como el nombre de archivo de yt-dlp
+    assert historial.contiene_titulo('Video con id', 'video:1080p', carpeta)
+    assert historial.contiene_titulo('CANCION en vivo', 'audio:mp3', carpeta / 'sub')
+    assert not historial.contiene_titulo('Cancion en vivo', 'video:1080p', carpeta / 'sub')
+    assert not historial.contiene_titulo('Otro', 'video:1080p', carpeta)
+
+def test_mismo_titulo_en_otra_carpeta_no_se_omite(historial, tmp_path):
+    musica = tmp_path / 'musica'
+    musica.mkdir()
+    (musica / 'Intro.mp4').write_bytes(b'')
+    historial.importar_carpeta(musica)
+    historial.registrar('Youtube', 'aaaaaaaaaaa', 'video:1080p', 'Intro', str(musica / 'Intro.mp4'))
+    # Otro video con el mismo titulo, de otro canal y hacia otra carpeta: no es el mismo
+    assert not historial.contiene('Youtube', 'bbbbbbbbbbb', 'video:1080p')
+    assert not historial.contiene_titulo('Intro', 'video:1080p', tmp_path / 'juegos')
+    assert historial.contiene_titulo('Intro', 'video:1080p', musica)
+
+def test_migra_titulos_sin_carpeta(tmp_path):
+    import sqlite3
+    ruta = tmp_path / 'historial.sqlite3'
+    conexion = sqlite3.connect(ruta)
+    conexion.execute("CREATE TABLE titulos (titulo TEXT, tipo TEXT, ruta TEXT, PRIMARY KEY (titulo, tipo))")
+    conexion.execute("INSERT INTO titulos VALUES ('intro', 'video', ?)", (str(tmp_path / 'v' / 'Intro.mp4'),))
+    conexion.commit()
+    conexion.close()
+    historial = HistorialDescargas(ruta)
+    assert historial.contiene_titulo('Intro', 'video:x', tmp_path / 'v')
+    assert not historial.contiene_titulo('Intro', 'video:x', tmp_path)
+    historial.cerrar()
+
+def test_importar_carpeta_dos_veces_no_duplica(historial, tmp_path):
+    (tmp_path / 'A [abcdefgh].mkv').write_bytes(b'')
+    historial.importar_carpeta(tmp_path)
+    historial.importar_carpeta(tmp_path)
+    filas = historial.conectar().execute("SELECT COUNT(*) FROM descargas").fetchone()[0]
+    assert filas == 1
+
+def test_importar_archivo_ytdlp(historial, tmp_path):
+    archivo = tmp_path / 'archive.txt'
+    archivo.write_text("youtube dQw4w9WgXcQ\nvimeo 76979871\n\nlinea rota con tres\n", encoding='utf-8')
+    assert historial.importar_archivo_ytdlp(archivo) == 2
+    # yt-dlp anota el extractor en minusculas: se acepta con cualquier extractor y perfil
+    assert historial.contiene('Youtube', 'dQw4w9WgXcQ', 'audio:mp3')
+    assert historial.contiene('Vimeo', '76979871', 'video:Mejor disponible')
+
+def test_registrar_info_de_una_lista(historial):
+    info = {'_type': 'playlist', 'entries': [
+        {'id': 'uno', 'extractor_key': 'Youtube', 'title': 'Uno',
+         'requested_downloads': [{'filepath': '/v/Uno.mp4'}]},
+        {'id': 'dos', 'extractor_key': 'Youtube', 'title': 'Dos'},
+        None,
+    ]}
+    historial.registrar_info(info, 'video:x')
+    assert historial.contiene('Youtube', 'uno', 'video:x')
+    # Sin archivo no se descargo: no se registra
+    assert not historial.contiene('Youtube', 'dos', 'video:x')
+
+def test_persiste_entre_instancias(tmp_path):
+    ruta = tmp_path / 'historial.sqlite3'
+    historial = HistorialDescargas(ruta)
+    historial.registrar('Youtube', 'abc', 'audio:mp3')
+    historial.cerrar()
+    historial = HistorialDescargas(ruta)
+    assert historial.contiene('Youtube', 'abc', 'audio:mp3')
+    historial.cerrar()
@@ -0,0 +1,97 @@
+import pytest
+
+from descargador import hosts
+from descargador.hosts import LimitadorHosts, host_de, datos_error_http, TASA_MINIMA, ESPERA_MAXIMA
+
+class Reloj:
+    """Sustituye al modulo time de hosts.py: el tiempo solo avanza a mano o con sleep"""
+    def __init__(self):
+        self.ahora = 1_000_000.0
+        self.dormido = 0.0
+    
+    def time(self):
+        return self.ahora
+    
+    def sleep(self, segundos):
+        self.dormido += segundos
+        self.ahora += segundos
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(hosts, 'time', reloj)
+    return reloj
+
+@pytest.fixture
+def limitador(reloj, tmp_path):
+    return LimitadorHosts(tasa_maxima=2, archivo=tmp_path / 'hosts.json')
+
+def test_host_de():
+    assert host_de('https://WWW.Example.com:8080/a?b=1') == 'www.example.com'
+    assert host_de('') == ''
+
+def test_cubo_de_fichas(limitador, reloj):
+    # Capacidad igual a la tasa: dos peticiones seguidas no esperan, la tercera media ficha
+    assert limitador.reservar('a.com') == 0
+    assert limitador.reservar('a.com') == 0
+    assert limitador.reservar('a.com') == pytest.approx(0.5)
+    reloj.ahora += 10
+    assert limitador.reservar('a.com') == 0
+    # Cada host tiene su propio cubo
+    assert limitador.reservar('b.com') == 0
+
+def test_penalizar_reduce_la_tasa_a_la_mitad(limitador, reloj):
+    limitador.penalizar('a.com', 429)
+    assert limitador.hosts['a.com']['tasa'] == 1.0
+    assert limitador.espera_pendiente('a.com') == pytest.approx(30)
+    for _ in range(10):
+        limitador.penalizar('a.com', 429)
+    assert limitador.hosts['a.com']['tasa'] == TASA_MINIMA
+
+def test_enfriamiento_exponencial_con_tope(limitador, reloj):
+    esperas = []
+    for _ in range(7):
+        limitador.penalizar('a.com', 429)
+        esperas.append(limitador.espera_pendiente('a.com'))
+        reloj.ahora += esperas[-1]
+    assert esperas == [30, 60, 120, 240, 480, ESPERA_MAXIMA, ESPERA_MAXIMA]
+
+def test_403_y_retry_after(limitador, reloj):
+    limitador.penalizar('a.com', 403)
+    assert limitador.espera_pendiente('a.com') == pytest.approx(5)
+    limitador.penalizar('b.com', 429, retry_after=7)
+    assert limitador.espera_pendiente('b.com') == pytest.approx(7)
+
+def test_esperar_respeta_el_enfriamiento(limitador, reloj):
+    limitador.penalizar('a.com', 429, retry_after=12)
+    limitador.esperar('a.com')
+    assert reloj.dormido >= 12
+
+def test_exito_recupera_la_tasa(limitador, reloj):
+    limitador.penalizar('a.com', 429)
+    limitador.penalizar('a.com', 429)
+    assert limitador.hosts['a.com']['tasa'] == 0.5
+    for _ in range(6):
+        limitador.exito('a.com')
+    assert limitador.hosts['a.com']['tasa'] == 2
+    assert limitador.hosts['a.com']['penalizaciones'] == 0
+
+def test_estado_persiste_entre_instancias(limitador, reloj, tmp_path):
+    limitador.penalizar('lento.com', 429)
+    limitador.reservar('rapido.com')
+    limitador.cerrar()
+    nuevo = LimitadorHosts(tasa_maxima=2, archivo=tmp_path / 'hosts.json')
+    assert set(nuevo.hosts) == {'lento.com'}
+    assert nuevo.espera_pendiente('lento.com') == pytest.approx(30)
+    assert nuevo.hosts['lento.com']['tasa'] == 1.0
+
+def test_datos_error_http():
+    class Respuesta:
+        headers = {'Retry-After': '15'}
+    
+    class ErrorHttp(Exception):
+        status = 429
+        response = Respuesta()
+    
+    assert datos_error_http(ErrorHttp()) == (429, 15.0)
+    assert datos_error_http(ValueError()) == (None, None)
@@ -0,0 +1,18 @@
+import pytest
+
+from descargador.metricas import Metricas
+
+def test_cronometro_solo_cuenta_las_fases_que_terminan():
+    metricas = Metricas()
+    with metricas.cronometro('extraccion'):
+        pass
+    with pytest.raises(ValueError):
+        with metricas.cronometro('extraccion'):
+            raise ValueError("fallo")
+    fases = metricas.instantanea()['fases']
+    assert fases['extraccion']['cuenta'] == 1
+
+def test_prometheus_escapa_las_etiquetas():
+    metricas = Metricas()
+    metricas.registrar_resultado('a"b', 'exito')
+    assert 'host="a\\"b"' in metricas.prometheus()
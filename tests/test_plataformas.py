@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from descargador.plataformas import RegistroPlataformas, quitar_rastreo, normalizar_url
+
+VIDEO = 'dQw4w9WgXcQ'
+CANONICA = f'https://www.youtube.com/watch?v={VIDEO}'
+
+@pytest.fixture
+def registro():
+    return RegistroPlataformas(archivo=None)
+
+@pytest.mark.parametrize('url', [
+    f'https://www.youtube.com/watch?v={VIDEO}',
+    f'https://youtu.be/{VIDEO}?si=abc123',
+    f'https://m.youtube.com/shorts/{VIDEO}',
+    f'  https://www.youtube.com/watch?feature=share&v={VIDEO}&t=30  ',
+    f'youtube.com/embed/{VIDEO}?utm_source=x',
+])
+def test_mismo_video_de_youtube(registro, url):
+    assert registro.canonizar(url) == (CANONICA, ('youtube', VIDEO))
+
+def test_youtube_conserva_la_lista(registro):
+    url, medio = registro.canonizar(f'https://youtu.be/{VIDEO}?list=PL123&si=x')
+    assert url == f'{CANONICA}&list=PL123'
+    assert medio == ('youtube', f'{VIDEO}?list=PL123')
+
+def test_sin_url_canonica_se_descarga_la_url_recibida(registro):
+    url = 'https://www.tiktok.com/@alguien/video/7234567890123456789?is_from_webapp=1&sender_device=pc'
+    assert registro.canonizar(url) == (url, ('tiktok', '7234567890123456789'))
+    otra = 'https://tiktok.com/@alguien/video/7234567890123456789'
+    assert registro.canonizar(otra)[1] == ('tiktok', '7234567890123456789')
+
+def test_rastreo_propio_de_una_plataforma_no_afecta_a_otras(registro):
+    # 's' es rastreo en twitter, pero en un sitio cualquiera puede elegir el video
+    assert registro.canonizar('https://x.com/u/status/123?s=20')[1] == ('twitter', '123')
+    assert registro.canonizar('https://ejemplo.com/ver?s=1')[1] != registro.canonizar('https://ejemplo.com/ver?s=2')[1]
+
+def test_sitio_sin_perfil(registro):
+    url = 'https://ex.com/v?abc&x=a%20b#/video/12'
+    assert registro.canonizar(url) == (url, ('ex.com', url))
+    a = registro.canonizar('https://www.ex.com/v/?b=2&a=1&fbclid=zz')[1]
+    b = registro.canonizar('https://ex.com/v?a=1&b=2')[1]
+    assert a[1] == b[1]
+
+def test_perfil_sin_patron_que_coincida(registro):
+    url = 'https://www.facebook.com/watch/live?utm_medium=x'
+    assert registro.canonizar(url) == (url, ('facebook', 'https://facebook.com/watch/live'))
+
+def test_quitar_rastreo_no_recodifica_la_query():
+    assert quitar_rastreo('HTTPS://Ex.COM/a?q=a+b&utm_source=x&fbclid=1&z=%2F#frag') == 'https://ex.com/a?q=a+b&z=%2F#frag'
+    assert quitar_rastreo('ex.com/a?si=1', otros=['si']) == 'https://ex.com/a'
+
+def test_normalizar_url():
+    assert normalizar_url('https://m.ex.com/a/?b=1&a=2') == 'https://ex.com/a?a=2&b=1'
+
+def test_perfil_de_usuario_completa_el_integrado(tmp_path):
+    archivo = tmp_path / 'plataformas.json'
+    archivo.write_text(json.dumps({
+        'youtube': {'parametros_rastreo': ['si', 'feature', 'pp', 'ab_channel']},
+        'vimeo': {'dominios': ['vimeo.com'], 'patrones_id': [r'vimeo\.com/(\d+)']},
+    }))
+    registro = RegistroPlataformas(archivo=archivo)
+    assert registro.canonizar(f'https://youtu.be/{VIDEO}?ab_channel=x')[1] == ('youtube', VIDEO)
+    assert registro.canonizar('https://vimeo.com/76979871?share=copy')[1] == ('vimeo', '76979871')
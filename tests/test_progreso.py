@@ -0,0 +1,57 @@
+import threading
+import time
+
+from descargador.progreso import LimitadorEventos, datos_desde_hook, formatear_eta
+
+def esperar(condicion, limite=2.0):
+    fin = time.monotonic() + limite
+    while not condicion() and time.monotonic() < fin:
+        time.sleep(0.005)
+    return condicion()
+
+def test_datos_desde_hook():
+    datos = datos_desde_hook({'downloaded_bytes': 50, 'total_bytes': 200, 'speed': 10.0}, 'descargando')
+    assert datos['porcentaje'] == 25.0 and datos['total'] == 200
+    datos = datos_desde_hook({'fragment_index': 3, 'fragment_count': 4}, 'descargando')
+    assert datos['porcentaje'] == 75.0
+
+def test_formatear_eta():
+    assert formatear_eta(None) == "N/A"
+    assert formatear_eta(75) == "01:15"
+    assert formatear_eta(3725) == "1:02:05"
+
+def test_emite_lo_ultimo_de_cada_intervalo_con_un_solo_hilo():
+    emitidos, hilos = [], set()
+    limitador = None
+    
+    def emitir(datos):
+        # Los hilos de fragmentos no deben quedar esperando a que termine emitir
+        assert not limitador.lock.locked()
+        emitidos.append(datos)
+        hilos.add(threading.current_thread().name)
+    
+    limitador = LimitadorEventos(emitir, max_por_segundo=50)
+    for i in range(30):
+        limitador.publicar(i)
+        time.sleep(0.004)
+    assert esperar(lambda: emitidos and emitidos[-1] == 29)
+    assert emitidos == sorted(emitidos)
+    assert len(emitidos) < 30
+    assert hilos - {threading.current_thread().name} == {'progreso'}
+    assert sum(1 for hilo in threading.enumerate() if hilo.name == 'progreso') == 1
+    limitador.cerrar()
+    assert esperar(lambda: limitador.hilo is None)
+
+def test_forzado_pasa_y_cerrar_descarta_el_pendiente():
+    emitidos = []
+    limitador = LimitadorEventos(emitidos.append, max_por_segundo=20)
+    limitador.publicar('a')
+    limitador.publicar('b', forzar=True)
+    limitador.publicar('c')
+    limitador.cerrar()
+    time.sleep(0.1)
+    assert emitidos == ['a', 'b']
+    # El mismo limitador sirve para la descarga siguiente
+    limitador.publicar('d')
+    assert esperar(lambda: emitidos[-1] == 'd')
+    limitador.cerrar()
@@ -0,0 +1,66 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from descargador.segmentado import MB, tamano_pieza, clase_fd
+
+TOTAL = 6 * MB
+CONTENIDO = bytes(i % 251 for i in range(TOTAL))
+
+class ManejadorRangos(BaseHTTPRequestHandler):
+    """Sirve CONTENIDO por rangos con el ETag de server.etag y anota los rangos pedidos"""
+    def log_message(self, formato, *args):
+        pass
+    
+    def do_GET(self):
+        inicio, fin = self.headers['Range'].split('=')[1].split('-')
+        inicio, fin = int(inicio), int(fin or TOTAL - 1)
+        self.server.pedidos.append(inicio)
+        self.send_response(206)
+        self.send_header('Content-Range', f'bytes {inicio}-{fin}/{TOTAL}')
+        self.send_header('Content-Length', str(fin - inicio + 1))
+        self.send_header('ETag', self.server.etag)
+        self.end_headers()
+        self.wfile.write(CONTENIDO[inicio:fin + 1])
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManejadorRangos)
+    servidor.pedidos, servidor.etag = [], '"v2"'
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+def test_tamano_pieza():
+    assert tamano_pieza(6 * MB, 2) == MB
+    assert tamano_pieza(10 ** 10, 4) == 32 * MB
+    assert tamano_pieza(64 * MB, 1, limite=2 * MB) == 2 * MB
+
+def descargar_con_parcial(servidor, tmp_path, etag_anterior, hechas):
+    """Descarga con un .part previo lleno de basura cuyas piezas hechas se anotaron con etag_anterior"""
+    yt_dlp = pytest.importorskip('yt_dlp')
+    destino = tmp_path / 'video.mp4'
+    (tmp_path / 'video.mp4.part').write_bytes(b'x' * TOTAL)
+    (tmp_path / 'video.mp4.part.segmentos').write_text(json.dumps({
+        'total': TOTAL, 'pieza': MB, 'hechas': hechas,
+        'validadores': {'etag': etag_anterior, 'last_modified': None},
+    }))
+    with yt_dlp.YoutubeDL({'quiet': True, 'noprogress': True, 'conexiones_por_archivo': 2}) as ydl:
+        fd = clase_fd()(ydl, ydl.params)
+        url = f'http://127.0.0.1:{servidor.server_address[1]}/video.mp4'
+        assert fd.download(str(destino), {'url': url, 'http_headers': {}})
+    return destino.read_bytes()
+
+def test_reanuda_las_piezas_hechas_si_el_archivo_no_cambio(servidor, tmp_path):
+    datos = descargar_con_parcial(servidor, tmp_path, '"v2"', [0])
+    assert datos[:MB] == b'x' * MB
+    assert datos[MB:] == CONTENIDO[MB:]
+    assert 0 not in servidor.pedidos[1:]
+
+def test_empieza_de_cero_si_cambio_el_etag(servidor, tmp_path):
+    datos = descargar_con_parcial(servidor, tmp_path, '"v1"', list(range(0, TOTAL, MB)))
+    assert datos == CONTENIDO
+    assert not (tmp_path / 'video.mp4.part.segmentos').exists()
@@ -0,0 +1,20 @@
+import pytest
+
+from descargador.servicio import ErrorPeticion, leer_calidad, leer_peso, leer_prioridad
+
+def test_leer_calidad():
+    assert leer_calidad({}) == {}
+    assert leer_calidad({'calidad': {'resolucion': '1080p'}}) == {'resolucion': '1080p'}
+
+@pytest.mark.parametrize('calidad', ['1080p', ['1080p'], {'resolucion': 1080}, {'fps': None}])
+def test_calidad_invalida_es_un_400(calidad):
+    with pytest.raises(ErrorPeticion) as error:
+        leer_calidad({'calidad': calidad})
+    assert error.value.codigo == 400
+
+def test_prioridad_y_peso():
+    assert leer_prioridad({}, 0) == 0
+    assert leer_peso({'peso': 2}) == 2.0
+    for datos, leer in (({'prioridad': True}, leer_prioridad), ({'peso': 0}, leer_peso), ({'peso': 'x'}, leer_peso)):
+        with pytest.raises(ErrorPeticion):
+            leer(datos)